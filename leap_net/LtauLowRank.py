@@ -0,0 +1,90 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import tensorflow as tf
+from tensorflow.keras.layers import Layer
+
+
+@tf.keras.utils.register_keras_serializable(package="leap_net")
+class LtauLowRank(Layer):
+    """
+    This layer implements a Ltau layer where the `e` and `d` matrices are of rank at most `rank`.
+
+    It computes, from its input `x`: `x + d.(e.x * tau)` (or only `d.(e.x * tau)` if `add_input` is ``False``, as
+    :class:`LtauNoAdd`) where `.` denotes the matrix multiplication and `*` the elementwise multiplication, with
+    `e = e_v.e_u` and `d = d_v.d_u`.
+
+    The number of parameters (and of operations) is then `2 * rank * (dim_x + dim_tau)` instead of
+    `2 * dim_x * dim_tau`, which matters when tau is large (for example the topology of a big grid).
+
+    If `rank` is higher than `min(dim_x, dim_tau)` the layer can represent the same functions as :class:`Ltau` (but
+    with more parameters).
+
+    """
+    def __init__(self, rank, initializer='glorot_uniform', use_bias=True, add_input=True, trainable=True, name=None,
+                 **kwargs):
+        super(LtauLowRank, self).__init__(trainable=trainable, name=name, **kwargs)
+        self.rank = int(rank)
+        if self.rank <= 0:
+            raise RuntimeError(f"The rank of a LtauLowRank layer should be > 0 (found {rank})")
+        self.initializer = initializer
+        self.use_bias = use_bias
+        self.add_input = add_input
+        self.e_u = None
+        self.e_v = None
+        self.e_bias = None
+        self.d_u = None
+        self.d_v = None
+
+    def build(self, input_shape):
+        is_x, is_tau = input_shape
+        dim_x = int(is_x[-1])
+        dim_tau = int(is_tau[-1])
+        self.e_u = self.add_weight(name="e_u",
+                                   shape=(dim_x, self.rank),
+                                   initializer=self.initializer,
+                                   trainable=self.trainable)
+        self.e_v = self.add_weight(name="e_v",
+                                   shape=(self.rank, dim_tau),
+                                   initializer=self.initializer,
+                                   trainable=self.trainable)
+        if self.use_bias:
+            self.e_bias = self.add_weight(name="e_bias",
+                                          shape=(dim_tau,),
+                                          initializer="zeros",
+                                          trainable=self.trainable)
+        self.d_u = self.add_weight(name="d_u",
+                                   shape=(dim_tau, self.rank),
+                                   initializer=self.initializer,
+                                   trainable=self.trainable)
+        self.d_v = self.add_weight(name="d_v",
+                                   shape=(self.rank, dim_x),
+                                   initializer=self.initializer,
+                                   trainable=self.trainable)
+        super(LtauLowRank, self).build(input_shape)
+
+    def get_config(self):
+        config = super().get_config().copy()
+        config.update({
+            'rank': int(self.rank),
+            'initializer': self.initializer,
+            'use_bias': self.use_bias,
+            'add_input': self.add_input
+        })
+        return config
+
+    def call(self, inputs, **kwargs):
+        x, tau = inputs
+        tmp = tf.matmul(tf.matmul(x, self.e_u), self.e_v)
+        if self.use_bias:
+            tmp = tf.nn.bias_add(tmp, self.e_bias)
+        tmp = tmp * tau  # element wise multiplication
+        res = tf.matmul(tf.matmul(tmp, self.d_u), self.d_v)
+        if self.add_input:
+            res = x + res
+        return res
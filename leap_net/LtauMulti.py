@@ -0,0 +1,131 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Layer
+
+
+class LtauMulti(Layer):
+    """
+    This layer implements, in a single block, multiple :class:`LtauNoAdd` layers sharing the same input `x`, one
+    for each tau vector.
+
+    If the inputs are `[x, tau_1, ..., tau_n]` it computes: `d_1.(e_1.x * tau_1) + ... + d_n.(e_n.x * tau_n)` where
+    `.` denotes the matrix multiplication and `*` the elementwise multiplication (as for :class:`LtauNoAdd` the
+    input `x` is not added back).
+
+    This is done with only 2 matrix multiplications: all the `e_i` are concatenated in a single matrix `e`, all the
+    tau in a single vector `tau` and all the `d_i` are stacked in a single matrix `d` so that the result is
+    `d.(e.x * tau)`.
+
+    The weights of `n` :class:`LtauNoAdd` layers can be converted to this layer (and back) with
+    :func:`LtauMulti.set_ltau_weights` and :func:`LtauMulti.get_ltau_weights`.
+
+    Notes
+    -----
+    With the default "glorot_uniform" initializer, the initial weights are not distributed exactly as the ones of
+    `n` :class:`LtauNoAdd` layers (the size of `e` is the sum of the sizes of the tau vectors).
+
+    """
+    def __init__(self, initializer='glorot_uniform', use_bias=True, trainable=True, name=None, **kwargs):
+        super(LtauMulti, self).__init__(trainable=trainable, name=name, **kwargs)
+        self.initializer = initializer
+        self.use_bias = use_bias
+        self.e_kernel = None
+        self.e_bias = None
+        self.d_kernel = None
+        self.sizes_tau = None
+
+    def build(self, input_shape):
+        is_x, *is_taus = input_shape
+        if not is_taus:
+            raise RuntimeError("LtauMulti should receive at least one tau vector, its inputs are [x, tau_1, ...]")
+        self.sizes_tau = [int(is_tau[-1]) for is_tau in is_taus]
+        dim_x = int(is_x[-1])
+        dim_tau = sum(self.sizes_tau)
+        self.e_kernel = self.add_weight(name="e_kernel",
+                                        shape=(dim_x, dim_tau),
+                                        initializer=self.initializer,
+                                        trainable=self.trainable)
+        if self.use_bias:
+            self.e_bias = self.add_weight(name="e_bias",
+                                          shape=(dim_tau,),
+                                          initializer="zeros",
+                                          trainable=self.trainable)
+        self.d_kernel = self.add_weight(name="d_kernel",
+                                        shape=(dim_tau, dim_x),
+                                        initializer=self.initializer,
+                                        trainable=self.trainable)
+        super(LtauMulti, self).build(input_shape)
+
+    def get_config(self):
+        config = super().get_config().copy()
+        config.update({
+            'initializer': self.initializer,
+            'use_bias': self.use_bias
+        })
+        return config
+
+    def call(self, inputs, **kwargs):
+        x, *taus = inputs
+        if len(taus) == 1:
+            tau = taus[0]
+        else:
+            tau = tf.concat(taus, axis=-1)
+        tmp = tf.matmul(x, self.e_kernel)
+        if self.use_bias:
+            tmp = tf.nn.bias_add(tmp, self.e_bias)
+        tmp = tmp * tau  # element wise multiplication
+        res = tf.matmul(tmp, self.d_kernel)  # no addition of x
+        return res
+
+    def set_ltau_weights(self, ltau_weights):
+        """
+        Set the weights of this layer from the weights of :class:`LtauNoAdd` layers (one per tau vector, in the same
+        order as the tau inputs).
+
+        Parameters
+        ----------
+        ltau_weights: ``list``
+            For each tau vector, the :class:`LtauNoAdd` layer or its weights (the output of its `get_weights()`
+            method, *ie* `[e_kernel, e_bias, d_kernel]` or `[e_kernel, d_kernel]` if it does not use biases)
+
+        """
+        if self.sizes_tau is None:
+            raise RuntimeError("The layer should be built before its weights are set.")
+        ltau_weights = [el.get_weights() if isinstance(el, Layer) else el for el in ltau_weights]
+        if len(ltau_weights) != len(self.sizes_tau):
+            raise RuntimeError(f"{len(ltau_weights)} LtauNoAdd layers are given but this layer has "
+                               f"{len(self.sizes_tau)} tau inputs.")
+        nb_weights = 3 if self.use_bias else 2
+        for weights in ltau_weights:
+            if len(weights) != nb_weights:
+                raise RuntimeError(f"Each LtauNoAdd layer should have {nb_weights} weights, found {len(weights)} "
+                                   f"(the LtauNoAdd and LtauMulti layers should use the same \"use_bias\")")
+        res = [np.concatenate([weights[0] for weights in ltau_weights], axis=1)]
+        if self.use_bias:
+            res.append(np.concatenate([weights[1] for weights in ltau_weights], axis=0))
+        res.append(np.concatenate([weights[-1] for weights in ltau_weights], axis=0))
+        self.set_weights(res)
+
+    def get_ltau_weights(self):
+        """
+        Get the weights of this layer in the :class:`LtauNoAdd` layout: one list of weights per tau vector, that
+        can be given to the `set_weights` method of the corresponding :class:`LtauNoAdd` layer.
+        """
+        if self.sizes_tau is None:
+            raise RuntimeError("The layer should be built before its weights are retrieved.")
+        weights = self.get_weights()
+        split_ = np.cumsum(self.sizes_tau)[:-1]
+        e_kernels = np.split(weights[0], split_, axis=1)
+        d_kernels = np.split(weights[-1], split_, axis=0)
+        if self.use_bias:
+            e_biases = np.split(weights[1], split_, axis=0)
+            return [[e_k, e_b, d_k] for e_k, e_b, d_k in zip(e_kernels, e_biases, d_kernels)]
+        return [[e_k, d_k] for e_k, d_k in zip(e_kernels, d_kernels)]
@@ -6,22 +6,24 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
+import tensorflow as tf
 from tensorflow.keras.layers import Layer
 from tensorflow.keras.layers import Dense
-from tensorflow.keras.layers import Activation
 from tensorflow.keras.layers import add as tfk_add
 
 
-import tensorflow as tf
-
-import pdb
-
-
+@tf.keras.utils.register_keras_serializable(package="leap_net")
 class ResNetLayer(Layer):
     """
     This layer implements a "ResNet block". If inputs are `x` the "resnet block" here produce the outputs:
     `y` = `x` + `act( Dense(dim_x)(act(Dense(layer_size)(x))) )`
 
+    The activation function is retrieved once, when the layer is built. The layer is registered as a keras
+    serializable object (under the name "leap_net>ResNetLayer") so models using it can be saved and reloaded.
+
+    If `fused` is ``True`` the whole block is computed in a single `tf.function` (compiled with XLA when possible)
+    instead of a succession of keras layers. Both implementations give the same results and have the same weights.
+
     This is experimental, and any usage of another resnet implementation is probably better suited than this one.
 
     """
@@ -32,15 +34,19 @@ class ResNetLayer(Layer):
                  trainable=True,
                  name=None,
                  activation="linear",
+                 fused=False,
                  **kwargs):
         super(ResNetLayer, self).__init__(trainable=trainable, name=name, **kwargs)
         self.initializer = initializer
         self.use_bias = use_bias
         self.units = int(units)
         self.activation = activation
+        self.fused = bool(fused)
 
         self.e = None
         self.d = None
+        self._act = None
+        self._fused_call = None
 
     def build(self, input_shape):
         nm_e = "e"
@@ -59,6 +65,13 @@ class ResNetLayer(Layer):
                        use_bias=self.use_bias,
                        trainable=self.trainable,
                        name=nm_d)
+        self.e.build(input_shape)
+        self.d.build(tuple(input_shape[:-1]) + (self.units,))
+        if self.activation is not None:
+            self._act = tf.keras.activations.get(self.activation)
+        if self.fused:
+            self._fused_call = self._make_fused_call()
+        super(ResNetLayer, self).build(input_shape)
 
     def get_config(self):
         config = super(ResNetLayer, self).get_config().copy()
@@ -66,16 +79,41 @@ class ResNetLayer(Layer):
             'initializer': str(self.initializer),
             'use_bias': bool(self.use_bias),
             "units": int(self.units),
-            "activation": str(self.activation)
+            "activation": None if self.activation is None else str(self.activation),
+            "fused": bool(self.fused)
         })
         return config
 
     def call(self, inputs, **kwargs):
+        if self._fused_call is not None:
+            return self._fused_call(inputs)
         tmp = self.e(inputs)
-        if self.activation is not None:
-            tmp = Activation(self.activation)(tmp)
+        if self._act is not None:
+            tmp = self._act(tmp)
         tmp = self.d(tmp)
-        if self.activation is not None:
-            tmp = Activation(self.activation)(tmp)
+        if self._act is not None:
+            tmp = self._act(tmp)
         res = tfk_add([inputs, tmp])
         return res
+
+    def _resnet_block(self, inputs):
+        """the whole block, with tensorflow operations only (used for the fused implementation)"""
+        tmp = tf.matmul(inputs, self.e.kernel)
+        if self.use_bias:
+            tmp = tf.nn.bias_add(tmp, self.e.bias)
+        if self._act is not None:
+            tmp = self._act(tmp)
+        tmp = tf.matmul(tmp, self.d.kernel)
+        if self.use_bias:
+            tmp = tf.nn.bias_add(tmp, self.d.bias)
+        if self._act is not None:
+            tmp = self._act(tmp)
+        return inputs + tmp
+
+    def _make_fused_call(self):
+        """compile the block in a single tf.function (with XLA if the tensorflow version supports it)"""
+        try:
+            return tf.function(self._resnet_block, jit_compile=True)
+        except TypeError:
+            # older tensorflow versions
+            return tf.function(self._resnet_block, experimental_compile=True)
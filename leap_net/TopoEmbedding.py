@@ -0,0 +1,137 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Layer
+
+
+@tf.keras.utils.register_keras_serializable(package="leap_net")
+class TopoEmbedding(Layer):
+    """
+    This layer encodes a topology vector into a (small) tau vector that can be used by the leap layers
+    (:class:`Ltau`, :class:`LtauNoAdd`...).
+
+    Its input is the topology, as stored by :func:`leap_net.generate_dataset` with `expe_type="topo"`: for each
+    element of the grid (in the order of the grid2op `topo_vect`, *ie* grouped by substation) 1 if it is connected
+    to bus 2 and anything else (0 for bus 1, -2 for a disconnected element) otherwise.
+
+    The bus assignment of the elements of each substation is mapped to a configuration id. Swapping the two buses
+    gives the same configuration, so a substation with `n` elements has `2**(n-1)` possible configurations. If this is
+    more than `max_config` the ids are taken modulo `max_config` (different configurations then share the same
+    embedding). The embedding of each substation is looked up in a learned table, the embedding of the reference
+    configuration (all elements on the same bus) is always 0 so that the reference topology is encoded as
+    `tau = 0` (the leap layers then do nothing).
+
+    The embeddings of all the substations are then summed (`combine="sum"`, the output has `embedding_dim`
+    components) or concatenated (`combine="concat"`, the output has `n_sub * embedding_dim` components).
+
+    If `from_ids` is ``True`` the inputs are directly the configuration ids of the substations (as computed by
+    :func:`TopoEmbedding.get_config_ids`) so the datasets only need to store `n_sub` integers per row instead of
+    `dim_topo`.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        tau = Input(shape=(env.dim_topo,), name="tau")
+        tau_emb = TopoEmbedding(env.sub_info, embedding_dim=16)(tau)
+        res = Ltau()((x, tau_emb))
+
+    """
+    MAX_ELEMENT = 25  # the configuration ids are computed with float32 so they are exact below 2**24
+
+    def __init__(self,
+                 sub_info,
+                 embedding_dim,
+                 max_config=1024,
+                 combine="sum",
+                 from_ids=False,
+                 initializer="uniform",
+                 trainable=True,
+                 name=None,
+                 **kwargs):
+        super(TopoEmbedding, self).__init__(trainable=trainable, name=name, **kwargs)
+        self.sub_info = [int(el) for el in sub_info]
+        self.embedding_dim = int(embedding_dim)
+        self.max_config = int(max_config)
+        self.combine = str(combine)
+        self.from_ids = bool(from_ids)
+        self.initializer = initializer
+        if self.combine not in ("sum", "concat"):
+            raise RuntimeError(f"Unknown combine \"{combine}\", it should be \"sum\" or \"concat\"")
+        if min(self.sub_info) <= 0:
+            raise RuntimeError("Each substation should count at least one element")
+        if max(self.sub_info) > self.MAX_ELEMENT:
+            raise RuntimeError(f"TopoEmbedding does not support substations with more than {self.MAX_ELEMENT} "
+                               f"elements (found {max(self.sub_info)})")
+        self.table = None
+
+        # constants used to compute the ids of the configurations
+        n_sub = len(self.sub_info)
+        self.dim_topo = int(np.sum(self.sub_info))
+        self._first_elem = np.concatenate(([0], np.cumsum(self.sub_info)[:-1])).astype(np.int32)
+        self._sub_of_elem = np.repeat(np.arange(n_sub), self.sub_info).astype(np.int32)
+        # the bus of the first element is the reference, the other elements are the bits of the id
+        pos_in_sub = np.arange(self.dim_topo) - self._first_elem[self._sub_of_elem]
+        self._powers = np.zeros((self.dim_topo, n_sub), dtype=np.float32)
+        is_bit = pos_in_sub > 0
+        self._powers[is_bit, self._sub_of_elem[is_bit]] = 2. ** (pos_in_sub[is_bit] - 1)
+        self._nb_config = np.minimum(2 ** (np.array(self.sub_info, dtype=np.int64) - 1),
+                                     self.max_config).astype(np.int32)
+        self._offsets = np.concatenate(([0], np.cumsum(self._nb_config)[:-1])).astype(np.int32)
+
+    def build(self, input_shape):
+        expected_ = len(self.sub_info) if self.from_ids else self.dim_topo
+        if input_shape[-1] is not None and int(input_shape[-1]) != expected_:
+            raise RuntimeError(f"The input of TopoEmbedding should have {expected_} components "
+                               f"(found {input_shape[-1]})")
+        self.table = self.add_weight(name="table",
+                                     shape=(int(np.sum(self._nb_config)), self.embedding_dim),
+                                     initializer=self.initializer,
+                                     trainable=self.trainable)
+        super(TopoEmbedding, self).build(input_shape)
+
+    def get_config(self):
+        config = super().get_config().copy()
+        config.update({
+            'sub_info': [int(el) for el in self.sub_info],
+            'embedding_dim': int(self.embedding_dim),
+            'max_config': int(self.max_config),
+            'combine': self.combine,
+            'from_ids': self.from_ids,
+            'initializer': self.initializer
+        })
+        return config
+
+    def get_config_ids(self, topo):
+        """
+        Configuration ids of each substation (between 0 and `min(2**(n-1), max_config)` excluded) for each row of
+        `topo` (a numpy array of shape `(n_row, dim_topo)`), as computed by the layer.
+
+        These ids can be stored instead of the topology and given to a layer built with `from_ids=True`.
+        """
+        on_bus_2 = (np.asarray(topo) == 1).astype(np.float32)
+        ref_bus = on_bus_2[:, self._first_elem][:, self._sub_of_elem]
+        codes = np.abs(on_bus_2 - ref_bus) @ self._powers
+        return np.mod(codes.astype(np.int64), self._nb_config).astype(np.int32)
+
+    def call(self, inputs, **kwargs):
+        if self.from_ids:
+            ids = tf.cast(inputs, tf.int32)
+        else:
+            on_bus_2 = tf.cast(tf.equal(inputs, tf.cast(1, inputs.dtype)), tf.float32)
+            ref_bus = tf.gather(tf.gather(on_bus_2, self._first_elem, axis=1), self._sub_of_elem, axis=1)
+            codes = tf.matmul(tf.abs(on_bus_2 - ref_bus), self._powers)
+            ids = tf.math.floormod(tf.cast(codes, tf.int32), self._nb_config)
+        emb = tf.gather(self.table, ids + self._offsets)  # (batch, n_sub, embedding_dim)
+        emb = emb - tf.gather(self.table, self._offsets)  # the reference configuration is encoded by 0
+        if self.combine == "sum":
+            return tf.reduce_sum(emb, axis=1)
+        return tf.reshape(emb, (-1, len(self.sub_info) * self.embedding_dim))
@@ -7,10 +7,14 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
 from leap_net.Ltau import Ltau
+from leap_net.LtauNoAdd import LtauNoAdd
+from leap_net.LtauMulti import LtauMulti
+from leap_net.LtauLowRank import LtauLowRank
 from leap_net.ResNetLayer import ResNetLayer
+from leap_net.TopoEmbedding import TopoEmbedding
 
 __version__ = "0.0.2"
-__all__ = ["Ltau", "ResNetLayer", "LtauNoAdd"]
+__all__ = ["Ltau", "ResNetLayer", "LtauNoAdd", "LtauMulti", "LtauLowRank", "TopoEmbedding"]
 
 try:
     from leap_net.generate_data import generate_dataset
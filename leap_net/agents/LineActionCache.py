@@ -0,0 +1,71 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+from collections import OrderedDict
+
+import numpy as np
+from grid2op.dtypes import dt_int
+
+
+class LineActionCache:
+    """
+    Cache of the actions used by the random agents (:class:`RandomN1`, :class:`RandomN2`, :class:`RandomNN1` and
+    :class:`RandomNk`): "disconnect exactly the powerlines `ids`, and reconnect (on bus 1) all the others".
+
+    Building a grid2op action is costly compared to the rest of a step of these agents, so each action is built
+    only once:
+
+    - the "reset" action (all the powerlines are connected) and the `n_line` N-1 actions are built when the cache is
+      created
+    - the other ones (N-2, N-k) are built the first time they are asked and kept in a least recently used cache of
+      at most `max_size` actions
+
+    **NB** the same action object is returned each time the same powerlines are disconnected, it should not be
+    modified.
+    """
+    def __init__(self, action_space, max_size=1024):
+        self.action_space = action_space
+        self.n_line = int(action_space.n_line)
+        self.max_size = int(max_size)
+        self.reset_action = self._build(())
+        self.n1_actions = [self._build((id_,)) for id_ in range(self.n_line)]
+        self._lru = OrderedDict()
+
+    def _build(self, ids):
+        """the action disconnecting the powerlines `ids` (and reconnecting all the others)"""
+        arr_ = np.ones(self.n_line, dtype=dt_int)
+        arr_[list(ids)] = -1
+        li_bus = [(i, el) for i, el in enumerate(arr_)]
+        return self.action_space({"set_line_status": arr_,
+                                  "set_bus": {"lines_or_id": li_bus,
+                                              "lines_ex_id": li_bus},
+                                  })
+
+    def get(self, ids):
+        """action disconnecting exactly the powerlines `ids` (an iterable of distinct powerline ids)"""
+        key_ = tuple(sorted(int(el) for el in ids))
+        if not key_:
+            return self.reset_action
+        if len(key_) == 1:
+            return self.n1_actions[key_[0]]
+        res = self._lru.get(key_)
+        if res is not None:
+            self._lru.move_to_end(key_)
+            return res
+        res = self._build(key_)
+        if self.max_size > 0:
+            self._lru[key_] = res
+            if len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+        return res
+
+    def get_many(self, ids):
+        """actions disconnecting the powerlines of each row of `ids` (a matrix of shape `(nb_action, k)`)"""
+        return [self.get(row) for row in ids]
+
+    def __len__(self):
+        return 1 + self.n_line + len(self._lru)
@@ -6,9 +6,9 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
-import numpy as np
 from grid2op.Agent import BaseAgent
-from grid2op.dtypes import dt_int, dt_float
+
+from leap_net.agents.LineActionCache import LineActionCache
 
 
 class RandomN1(BaseAgent):
@@ -16,22 +16,23 @@ class RandomN1(BaseAgent):
     This "agent" will randomly disconnect exactly 1 powerline from the grid.
 
     **NB** Every powerline that is not chosen at random to be disconnected will be reconnected by force.
+
+    The `n_line` possible actions are built once (see :class:`LineActionCache`), the same action objects are
+    returned at each call.
     """
 
-    def __init__(self, action_space):
+    def __init__(self, action_space, action_cache=None):
         super(RandomN1, self).__init__(action_space)
         if not "set_line_status" in action_space.subtype.authorized_keys:
             raise NotImplementedError("Impossible to have a RandomN1 agent if you cannot set the status or powerline")
 
-        # represent the action "exactly one powerline is disconnected
-        self.powerline_actions = 1 - 2 * np.eye(action_space.n_line, dtype=dt_int)
+        self.action_cache = action_cache if action_cache is not None else LineActionCache(action_space)
 
     def act(self, obs, reward, done):
         id_ = self.space_prng.choice(self.action_space.n_line)
-        arr_ = self.powerline_actions[id_, :]
-        li_bus = [(i, el) for i, el in enumerate(arr_)]
-        return self.action_space({"set_line_status": arr_,
-                                  "set_bus": {"lines_or_id": li_bus,
-                                              "lines_ex_id": li_bus},
-                                  }
-                                 )
\ No newline at end of file
+        return self.action_cache.n1_actions[id_]
+
+    def sample_many(self, k):
+        """`k` actions drawn at random (as `k` calls to `act`, but the random numbers are drawn at once)"""
+        ids = self.space_prng.choice(self.action_space.n_line, size=int(k))
+        return [self.action_cache.n1_actions[id_] for id_ in ids]
@@ -8,40 +8,42 @@
 
 import numpy as np
 from grid2op.Agent import BaseAgent
-from grid2op.dtypes import dt_int, dt_float
+
+from leap_net.agents.LineActionCache import LineActionCache
 
 
 class RandomN2(BaseAgent):
     """
-    This "agent" will randomly disconnect exactly 1 powerline from the grid.
+    This "agent" will randomly disconnect exactly 2 powerlines from the grid.
 
     **NB** Every powerline that is not chosen at random to be disconnected will be reconnected by force.
 
     This agent will modify the status of all powerlines at every steps!
+
+    The actions are built the first time they are used and kept in a cache of at most `max_cache` actions (see
+    :class:`LineActionCache`).
     """
 
-    def __init__(self, action_space):
+    def __init__(self, action_space, max_cache=1024, action_cache=None):
         super(RandomN2, self).__init__(action_space)
         if not "set_line_status" in action_space.subtype.authorized_keys:
             raise NotImplementedError("Impossible to have a RandomN1 agent if you cannot set the status or powerline")
 
-        # represent the action "exactly one powerline is disconnected
-        self.powerline_actions = np.ones(action_space.n_line, dtype=dt_int)
-        self.tmp_arr = np.ones(action_space.n_line, dtype=dt_int)
+        self.action_cache = action_cache if action_cache is not None else LineActionCache(action_space,
+                                                                                           max_size=max_cache)
+
+    def _draw_ids(self, size=None):
+        id_1 = self.space_prng.choice(self.action_space.n_line, size=size)
+        id_2 = self.space_prng.choice(self.action_space.n_line - 1, size=size)
+        # this procedure is to be sure not to "disconnect twice" the same powerline
+        id_2 = id_2 + (id_2 >= id_1)
+        return id_1, id_2
 
     def act(self, obs, reward, done):
-        id_1 = self.space_prng.choice(self.action_space.n_line)
-        id_2 = self.space_prng.choice(self.action_space.n_line - 1)
-        if id_2 >= id_1:
-            # this procedure is to be sure not to "disconnect twice" the same powerline
-            id_2 += 1
-        self.tmp_arr[:] = self.powerline_actions
-        self.tmp_arr[id_1] = -1
-        self.tmp_arr[id_2] = -1
-        li_bus = [(i, el) for i, el in enumerate(self.tmp_arr)]
-        act = self.action_space({"set_line_status": self.tmp_arr,
-                                 "set_bus": {"lines_or_id": li_bus,
-                                             "lines_ex_id": li_bus},
-                                 }
-                                )
-        return act
+        id_1, id_2 = self._draw_ids()
+        return self.action_cache.get((id_1, id_2))
+
+    def sample_many(self, k):
+        """`k` actions drawn at random (as `k` calls to `act`, but the random numbers are drawn at once)"""
+        id_1, id_2 = self._draw_ids(size=int(k))
+        return self.action_cache.get_many(np.stack((id_1, id_2), axis=1))
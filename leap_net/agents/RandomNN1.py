@@ -6,10 +6,10 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
-import numpy as np
 from grid2op.Agent import BaseAgent
-from grid2op.dtypes import dt_int, dt_float
-import pdb
+from grid2op.dtypes import dt_float
+
+from leap_net.agents.LineActionCache import LineActionCache
 
 
 class RandomNN1(BaseAgent):
@@ -19,8 +19,11 @@ class RandomNN1(BaseAgent):
     
     **NB** the output distribution is heavily biased: all the powerline are connected with proba `1-p`, but if you
     consider the odds of having powerline line `l` disconnected it's equal to `p / (nb_line)`.
+
+    The `n_line + 1` possible actions are built once (see :class:`LineActionCache`), the same action objects are
+    returned at each call.
     """
-    def __init__(self, action_space, p):
+    def __init__(self, action_space, p, action_cache=None):
         super(RandomNN1, self).__init__(action_space)
         if not "set_line_status" in action_space.subtype.authorized_keys:
             raise NotImplementedError("Impossible to have a RandomN1 agent if you cannot set the status or powerline")
@@ -28,21 +31,21 @@ class RandomNN1(BaseAgent):
             raise RuntimeError("Impossible to have p lower than 0.")
         self.p = dt_float(p)
         self._1_p = 1. - self.p
-        # represent the action "no powerline are disconnected
-        self.reset_all = np.ones(action_space.n_line, dtype=dt_int)
-        # represent the action "exactly one powerline is disconnected
-        self.powerline_actions = 1 - 2*np.eye(action_space.n_line, dtype=dt_int)
+        self.action_cache = action_cache if action_cache is not None else LineActionCache(action_space)
 
     def act(self, obs, reward, done):
         ur = self.space_prng.uniform()
         if ur < self._1_p:
-            arr_ = self.reset_all
-        else:
-            id_ = self.space_prng.choice(self.action_space.n_line)
-            arr_ = self.powerline_actions[id_, :]
-        li_bus = [(i, el) for i, el in enumerate(arr_)]
-        act = self.action_space({"set_line_status": arr_,
-                                 "set_bus": {"lines_or_id": li_bus,
-                                             "lines_ex_id": li_bus},
-                                 })
-        return act
+            return self.action_cache.reset_action
+        id_ = self.space_prng.choice(self.action_space.n_line)
+        return self.action_cache.n1_actions[id_]
+
+    def sample_many(self, k):
+        """
+        `k` actions drawn at random (with the same distribution as `act`, but the random numbers are drawn at once)
+        """
+        k = int(k)
+        is_reset = self.space_prng.uniform(size=k) < self._1_p
+        ids = self.space_prng.choice(self.action_space.n_line, size=k)
+        return [self.action_cache.reset_action if reset_ else self.action_cache.n1_actions[id_]
+                for reset_, id_ in zip(is_reset, ids)]
@@ -0,0 +1,55 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import numpy as np
+from grid2op.Agent import BaseAgent
+
+from leap_net.agents.LineActionCache import LineActionCache
+
+
+class RandomNk(BaseAgent):
+    """
+    This "agent" will randomly disconnect exactly `k` powerlines from the grid (all the sets of `k` powerlines have
+    the same probability).
+
+    **NB** Every powerline that is not chosen at random to be disconnected will be reconnected by force.
+
+    With `k=0` it always reconnects all the powerlines, with `k=1` it behaves as :class:`RandomN1` and with `k=2` as
+    :class:`RandomN2` (but the random numbers are not drawn the same way, so the actions are not the same for the
+    same seed).
+
+    The actions are built the first time they are used and kept in a cache of at most `max_cache` actions (see
+    :class:`LineActionCache`, the reset action and the N-1 actions are always kept).
+    """
+
+    def __init__(self, action_space, k, max_cache=1024, action_cache=None):
+        super(RandomNk, self).__init__(action_space)
+        if not "set_line_status" in action_space.subtype.authorized_keys:
+            raise NotImplementedError("Impossible to have a RandomNk agent if you cannot set the status or powerline")
+        self.k = int(k)
+        if self.k < 0 or self.k > action_space.n_line:
+            raise RuntimeError(f"Impossible to disconnect {k} powerlines on a grid with {action_space.n_line} "
+                               f"powerlines.")
+        self.action_cache = action_cache if action_cache is not None else LineActionCache(action_space,
+                                                                                           max_size=max_cache)
+
+    def act(self, obs, reward, done):
+        ids = self.space_prng.choice(self.action_space.n_line, size=self.k, replace=False)
+        return self.action_cache.get(ids)
+
+    def sample_many(self, k):
+        """
+        `k` actions drawn at random (with the same distribution as `act`, but the random numbers are drawn at once)
+        """
+        k = int(k)
+        if self.k == 0:
+            return [self.action_cache.reset_action for _ in range(k)]
+        # the indexes of the `self.k` smallest of `n_line` uniform random numbers are a random subset of the lines
+        rand_ = self.space_prng.uniform(size=(k, self.action_space.n_line))
+        ids = np.argpartition(rand_, self.k - 1, axis=1)[:, :self.k]
+        return self.action_cache.get_many(ids)
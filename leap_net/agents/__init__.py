@@ -6,8 +6,10 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
-__all__ = ["RandomNN1", "RandomN2", "RandomN1"]
+__all__ = ["RandomNN1", "RandomN2", "RandomN1", "RandomNk", "LineActionCache"]
 
 from leap_net.agents.RandomNN1 import RandomNN1
 from leap_net.agents.RandomN1 import RandomN1
 from leap_net.agents.RandomN2 import RandomN2
+from leap_net.agents.RandomNk import RandomNk
+from leap_net.agents.LineActionCache import LineActionCache
@@ -0,0 +1,339 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import json
+
+import numpy as np
+
+
+class DatasetReader:
+    """
+    Read a dataset generated by :func:`leap_net.generate_dataset` by chunks, without loading it in memory.
+
+    A dataset is a directory with one ".npy" file per array (all with the same number of rows) and a "header.json"
+    file (see :func:`DatasetReader.write_header`) that gives the shape and the dtype of each array as well as the
+    mean, standard deviation, min and max of each of their columns. The rows are grouped in chunks of `chunk_size`
+    contiguous rows, that are read directly from the memory mapped ".npy" files.
+
+    The inputs (arrays `attr_x`) and the outputs (arrays `attr_y`) are scaled to have a mean of 0 and a variance of
+    1 (as a `sklearn.preprocessing.StandardScaler`), with the statistics of the dataset itself or (`scaler_header`)
+    of another dataset, typically the training set when reading a validation set. The arrays `attr_tau` are not
+    scaled.
+
+    The batches are shuffled by reading the chunks in a random order, and by mixing the rows of `nb_chunk_shuffle`
+    chunks together. The memory used then only depends on the size of the chunks, not on the size of the dataset.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        reader_train = DatasetReader("training_set")
+        reader_val = DatasetReader("validation_set", scaler_header=reader_train.header)
+        model.fit(reader_train.get_tf_dataset(batch_size=32, seed=0), epochs=10)
+
+        # batches (not shuffled) of the scaled inputs and the unscaled outputs
+        for x, y in reader_val.iter_batches(1024, shuffle=False, scale_y=False):
+            y_hat = model.predict_on_batch(x)
+
+    """
+    HEADER_FILE = "header.json"
+    CHUNK_SIZE = 4096
+    ATTR_X = ("prod_p", "prod_v", "load_p", "load_q")
+    ATTR_TAU = ("tau",)
+    ATTR_Y = ("flow_a", "flow_p", "line_v")
+
+    def __init__(self,
+                 path,
+                 attr_x=ATTR_X,
+                 attr_tau=ATTR_TAU,
+                 attr_y=ATTR_Y,
+                 scaler_header=None,
+                 dtype=np.float32):
+        self.path = os.path.abspath(path)
+        self.attr_x = tuple(attr_x)
+        self.attr_tau = tuple(attr_tau)
+        self.attr_y = tuple(attr_y)
+        self.dtype = np.dtype(dtype)
+        all_attr = self.attr_x + self.attr_tau + self.attr_y
+        self.header = self.read_header(self.path, all_attr)
+        scaler_header = scaler_header if scaler_header is not None else self.header
+
+        self._arrays = {}
+        self._means = {}
+        self._scales = {}
+        for attr_nm in all_attr:
+            if attr_nm not in self.header["arrays"]:
+                raise RuntimeError(f"There is no array \"{attr_nm}\" in the dataset \"{self.path}\"")
+            self._arrays[attr_nm] = np.load(os.path.join(self.path, "{}.npy".format(attr_nm)), mmap_mode="r")
+            if attr_nm in self.attr_tau:
+                continue
+            if attr_nm not in scaler_header["arrays"]:
+                raise RuntimeError(f"There are no statistics for the array \"{attr_nm}\" in the scaler header")
+            stats = scaler_header["arrays"][attr_nm]
+            scale = np.array(stats["std"], dtype=np.float64)
+            scale[scale == 0.] = 1.  # same as sklearn for the constant columns
+            self._means[attr_nm] = np.array(stats["mean"], dtype=self.dtype)
+            self._scales[attr_nm] = scale.astype(self.dtype)
+        self.nb_rows = int(self.header["nb_rows"])
+        self.chunk_size = int(self.header["chunk_size"])
+
+    @staticmethod
+    def compute_header(path, names, chunk_size=CHUNK_SIZE):
+        """
+        Compute the header of the dataset in `path` (made of the arrays `names`): shape, dtype, and mean, standard
+        deviation, min and max of each column.
+
+        The statistics are computed chunk by chunk (and accumulated in float64) so the arrays are never loaded
+        completely in memory.
+        """
+        arrays = {}
+        nb_rows = None
+        for arr_n in names:
+            arr = np.load(os.path.join(path, "{}.npy".format(arr_n)), mmap_mode="r")
+            if len(arr.shape) != 2:
+                raise RuntimeError(f"The array \"{arr_n}\" should be a matrix (found shape {arr.shape})")
+            if nb_rows is None:
+                nb_rows = arr.shape[0]
+            elif arr.shape[0] != nb_rows:
+                raise RuntimeError("All the arrays of a dataset should have the same number of rows")
+
+            nb_col = arr.shape[1]
+            count = 0
+            mean = np.zeros(nb_col, dtype=np.float64)
+            m2 = np.zeros(nb_col, dtype=np.float64)
+            min_ = np.full(nb_col, np.inf, dtype=np.float64)
+            max_ = np.full(nb_col, -np.inf, dtype=np.float64)
+            for beg_ in range(0, arr.shape[0], chunk_size):
+                chunk = np.asarray(arr[beg_:(beg_ + chunk_size)], dtype=np.float64)
+                nb_chunk = chunk.shape[0]
+                mean_chunk = np.mean(chunk, axis=0)
+                m2_chunk = np.sum((chunk - mean_chunk) ** 2, axis=0)
+                # merge the statistics of the chunk with the previous ones (Chan et al.)
+                delta = mean_chunk - mean
+                tot_ = count + nb_chunk
+                mean += delta * (nb_chunk / tot_)
+                m2 += m2_chunk + delta ** 2 * (count * nb_chunk / tot_)
+                count = tot_
+                min_ = np.minimum(min_, np.min(chunk, axis=0))
+                max_ = np.maximum(max_, np.max(chunk, axis=0))
+            std = np.sqrt(m2 / count) if count else m2
+            arrays[arr_n] = {"shape": [int(el) for el in arr.shape],
+                             "dtype": arr.dtype.str,
+                             "mean": [float(el) for el in mean],
+                             "std": [float(el) for el in std],
+                             "min": [float(el) for el in min_],
+                             "max": [float(el) for el in max_]}
+        return {"nb_rows": int(nb_rows) if nb_rows is not None else 0,
+                "chunk_size": int(chunk_size),
+                "arrays": arrays}
+
+    @staticmethod
+    def write_header(path, names, chunk_size=CHUNK_SIZE):
+        """compute the header of the dataset in `path` (see :func:`DatasetReader.compute_header`) and save it"""
+        header = DatasetReader.compute_header(path, names, chunk_size)
+        header_path = os.path.join(path, DatasetReader.HEADER_FILE)
+        tmp_path = header_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, fp=f, indent=4, sort_keys=True)
+        os.replace(tmp_path, header_path)
+        return header
+
+    @staticmethod
+    def read_header(path, names):
+        """
+        header of the dataset in `path` (computed, but not saved, if the dataset was generated without header)
+        """
+        header_path = os.path.join(path, DatasetReader.HEADER_FILE)
+        if os.path.exists(header_path):
+            with open(header_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        if os.path.exists(os.path.join(path, "progress.json")):
+            raise RuntimeError(f"The generation of the dataset \"{path}\" is not finished")
+        return DatasetReader.compute_header(path, names)
+
+    def get_size(self, attr_nm):
+        """number of columns of the array `attr_nm`"""
+        return int(self.header["arrays"][attr_nm]["shape"][1])
+
+    def transform(self, attr_nm, arr):
+        """scale `arr` (values of the array `attr_nm`) to have a mean of 0 and a variance of 1"""
+        if attr_nm in self.attr_tau:
+            return np.asarray(arr, dtype=self.dtype)
+        return (np.asarray(arr, dtype=self.dtype) - self._means[attr_nm]) / self._scales[attr_nm]
+
+    def inverse_transform(self, attr_nm, arr):
+        """opposite of :func:`DatasetReader.transform`"""
+        if attr_nm in self.attr_tau:
+            return np.asarray(arr, dtype=self.dtype)
+        return np.asarray(arr, dtype=self.dtype) * self._scales[attr_nm] + self._means[attr_nm]
+
+    def _get_rows(self, beg_, end_, rows=None):
+        """rows `beg_` to `end_` (excluded) of all the arrays (only the ones in `rows` if not None), read from the
+        files"""
+        if rows is None:
+            return {attr_nm: np.array(arr[beg_:end_]) for attr_nm, arr in self._arrays.items()}
+        sel = rows[np.searchsorted(rows, beg_):np.searchsorted(rows, end_)]
+        return {attr_nm: np.array(arr[sel]) for attr_nm, arr in self._arrays.items()}
+
+    def get_subsample(self, max_rows, seed=None):
+        """
+        Draw a random subsample of at most `max_rows` rows of the dataset (see the `rows` argument of
+        :func:`DatasetReader.iter_batches`)
+
+        Returns
+        -------
+        res: ``numpy.ndarray``
+            The sorted indices of the rows
+        """
+        max_rows = int(max_rows)
+        if max_rows <= 0:
+            raise RuntimeError("The number of rows of a subsample should be > 0")
+        if max_rows >= self.nb_rows:
+            return np.arange(self.nb_rows)
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(self.nb_rows, size=max_rows, replace=False))
+
+    def _make_batch(self, data, scale_x, scale_y):
+        x = [self.transform(attr_nm, data[attr_nm]) if scale_x else np.asarray(data[attr_nm], dtype=self.dtype)
+             for attr_nm in self.attr_x]
+        x += [np.asarray(data[attr_nm], dtype=self.dtype) for attr_nm in self.attr_tau]
+        y = [self.transform(attr_nm, data[attr_nm]) if scale_y else np.asarray(data[attr_nm], dtype=self.dtype)
+             for attr_nm in self.attr_y]
+        return x, y
+
+    def iter_batches(self,
+                     batch_size,
+                     shuffle=True,
+                     seed=None,
+                     nb_chunk_shuffle=4,
+                     drop_remainder=False,
+                     scale_x=True,
+                     scale_y=True,
+                     rows=None):
+        """
+        Iterate once through the dataset, by batches of `batch_size` rows.
+
+        Parameters
+        ----------
+        batch_size: ``int``
+            Number of rows of each batch (the last one can be smaller, unless `drop_remainder` is ``True``)
+
+        shuffle: ``bool``
+            Whether to shuffle the rows. If ``False`` the rows are given in the order of the dataset.
+
+        seed: ``int``
+            Seed used to shuffle the rows
+
+        nb_chunk_shuffle: ``int``
+            Number of chunks whose rows are mixed together (more chunks shuffle better but use more memory)
+
+        drop_remainder: ``bool``
+            Whether to drop the last batch if it has less than `batch_size` rows
+
+        scale_x: ``bool``
+            Whether to scale the inputs
+
+        scale_y: ``bool``
+            Whether to scale the outputs
+
+        rows: ``numpy.ndarray``
+            If not ``None``, only these rows (sorted indices, see :func:`DatasetReader.get_subsample`) are used
+
+        Yields
+        ------
+        x: ``list``
+            The inputs (arrays `attr_x` then arrays `attr_tau`)
+
+        y: ``list``
+            The outputs (arrays `attr_y`)
+
+        """
+        batch_size = int(batch_size)
+        if batch_size <= 0:
+            raise RuntimeError("The batch size should be > 0")
+        nb_chunk_shuffle = max(int(nb_chunk_shuffle), 1)
+        rng = np.random.default_rng(seed)
+        chunk_begs = np.arange(0, self.nb_rows, self.chunk_size)
+        if shuffle:
+            rng.shuffle(chunk_begs)
+        else:
+            nb_chunk_shuffle = 1
+
+        leftover = None  # rows of the previous chunks that did not fill a batch
+        for id_group in range(0, len(chunk_begs), nb_chunk_shuffle):
+            li_data = [self._get_rows(beg_, min(beg_ + self.chunk_size, self.nb_rows), rows)
+                       for beg_ in chunk_begs[id_group:(id_group + nb_chunk_shuffle)]]
+            if shuffle and len(li_data) > 1:
+                data = {attr_nm: np.concatenate([el[attr_nm] for el in li_data]) for attr_nm in self._arrays}
+            else:
+                data = li_data[0]
+            if shuffle:
+                perm = rng.permutation(data[self.attr_x[0]].shape[0])
+                data = {attr_nm: arr[perm] for attr_nm, arr in data.items()}
+            if leftover is not None:
+                data = {attr_nm: np.concatenate((leftover[attr_nm], arr)) for attr_nm, arr in data.items()}
+            nb_row = data[self.attr_x[0]].shape[0]
+            nb_full = nb_row - nb_row % batch_size
+            for beg_ in range(0, nb_full, batch_size):
+                yield self._make_batch({attr_nm: arr[beg_:(beg_ + batch_size)] for attr_nm, arr in data.items()},
+                                       scale_x, scale_y)
+            leftover = {attr_nm: arr[nb_full:] for attr_nm, arr in data.items()}
+
+        if leftover is not None and leftover[self.attr_x[0]].shape[0] and not drop_remainder:
+            yield self._make_batch(leftover, scale_x, scale_y)
+
+    def get_tf_dataset(self,
+                       batch_size,
+                       shuffle=True,
+                       seed=None,
+                       nb_chunk_shuffle=4,
+                       drop_remainder=False,
+                       cache=False,
+                       max_rows=None):
+        """
+        `tf.data.Dataset` of the (scaled) batches of the dataset (see :func:`DatasetReader.iter_batches`), that can
+        be given directly to `model.fit`, `model.evaluate` or `model.predict`.
+
+        The rows are shuffled differently at each iteration over the dataset (*ie* at each epoch).
+
+        For the datasets that are evaluated multiple times (for example by
+        :class:`leap_net.kerasutils.MultipleDasetCallBacks` at the end of each epoch), `max_rows` restricts the
+        dataset to a random subsample (always the same, drawn with `seed`) of at most `max_rows` rows and `cache`
+        keeps the batches in memory after the first iteration, so that the files are read (and the rows scaled)
+        only once. A cached dataset cannot be shuffled.
+        """
+        import tensorflow as tf
+
+        if cache and shuffle:
+            raise RuntimeError("A cached dataset would give the same batches at each epoch, it cannot be shuffled.")
+        seed_seq = np.random.SeedSequence(seed)
+        rows = self.get_subsample(max_rows, seed=seed) if max_rows is not None else None
+
+        def generator():
+            # a new seed at each epoch
+            seed_epoch = int(seed_seq.spawn(1)[0].generate_state(1)[0]) if shuffle else None
+            for x, y in self.iter_batches(batch_size, shuffle=shuffle, seed=seed_epoch,
+                                          nb_chunk_shuffle=nb_chunk_shuffle, drop_remainder=drop_remainder,
+                                          rows=rows):
+                yield tuple(x), tuple(y)
+
+        tf_dtype = tf.as_dtype(self.dtype)
+        signature = (tuple(tf.TensorSpec(shape=(None, self.get_size(attr_nm)), dtype=tf_dtype)
+                           for attr_nm in self.attr_x + self.attr_tau),
+                     tuple(tf.TensorSpec(shape=(None, self.get_size(attr_nm)), dtype=tf_dtype)
+                           for attr_nm in self.attr_y))
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=signature)
+        # the number of batches is known (keras then knows the size of an epoch)
+        nb_rows = len(rows) if rows is not None else self.nb_rows
+        nb_batch = nb_rows // batch_size if drop_remainder else -(-nb_rows // batch_size)
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(nb_batch))
+        if cache:
+            dataset = dataset.cache()
+        return dataset.prefetch(tf.data.experimental.AUTOTUNE)
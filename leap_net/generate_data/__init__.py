@@ -7,5 +7,6 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
 from leap_net.generate_data.generate_dataset import generate_dataset
+from leap_net.generate_data.DatasetReader import DatasetReader
 
-__all__ = ["generate_dataset"]
\ No newline at end of file
+__all__ = ["generate_dataset", "DatasetReader"]
\ No newline at end of file
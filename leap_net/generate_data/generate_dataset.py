@@ -7,6 +7,12 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
 import os
+import json
+import multiprocessing
+import queue
+import traceback
+import warnings
+
 import grid2op
 import numpy as np
 from tqdm import tqdm
@@ -15,7 +21,14 @@ from grid2op.Agent import DoNothingAgent
 from grid2op.Parameters import Parameters
 from grid2op.dtypes import dt_float, dt_int
 from grid2op.Rules import AlwaysLegal
-from leap_net.agents import RandomNN1, RandomN1, RandomN2
+from leap_net.agents import RandomNN1, RandomN1, RandomN2, RandomNk
+from leap_net.generate_data.DatasetReader import DatasetReader
+
+# name of the arrays that are generated
+ARRAY_NAMES = ("prod_p", "prod_v", "load_p", "load_q", "tau", "flow_a", "flow_p", "flow_q", "line_v")
+PROGRESS_FREQ = 100  # the arrays are flushed and the progress is saved every PROGRESS_FREQ rows
+PROGRESS_FILE = "progress.json"  # progress of an unfinished generation (removed once it is finished)
+PROGRESS_TIMEOUT = 1.  # time (in seconds) between two checks that the worker processes are still alive
 
 
 def get_agent(env, agent_name, **kwargsagent):
@@ -27,62 +40,83 @@ def get_agent(env, agent_name, **kwargsagent):
         res = RandomN1(env.action_space, **kwargsagent)
     elif agent_name == "random_n2":
         res = RandomN2(env.action_space, **kwargsagent)
+    elif agent_name == "random_nk":
+        res = RandomNk(env.action_space, **kwargsagent)
     else:
         raise NotImplementedError()
     return res
 
 
-def generate_dataset(name_env,
-                     nb_rows,
-                     dir_out="training_dataset",
-                     agent_type="do_nothing",
-                     expe_type="powerline",
-                     verbose=True,
-                     **kwargsagent):
-    # TODO seed for reproductible expriments
+def get_env(name_env, kwargs_make=None):
+    """create the environment used to generate the data"""
     # TODO remove thermal limits
     param = Parameters()
     param.NO_OVERFLOW_DISCONNECTION = True
+    if kwargs_make is None:
+        kwargs_make = {}
     if isinstance(name_env, str):
-        env = grid2op.make(dataset=name_env, param=param, gamerules_class=AlwaysLegal)
+        env = grid2op.make(dataset=name_env, param=param, gamerules_class=AlwaysLegal, **kwargs_make)
     else:
         raise NotImplementedError()
+    return env
 
-    if isinstance(agent_type, str):
-        agent = get_agent(env, agent_type, **kwargsagent)
-    else:
-        raise NotImplementedError()
-
-    dir_out_abs = os.path.abspath(dir_out)
-    if not os.path.exists(dir_out_abs):
-        os.mkdir(dir_out_abs)
 
-    # input X
-    prod_p = np.full((nb_rows, env.n_gen), fill_value=np.NaN, dtype=dt_float)
-    prod_v = np.full((nb_rows, env.n_gen), fill_value=np.NaN, dtype=dt_float)
-    load_p = np.full((nb_rows, env.n_load), fill_value=np.NaN, dtype=dt_float)
-    load_q = np.full((nb_rows, env.n_load), fill_value=np.NaN, dtype=dt_float)
-
-    # input tau
+def get_array_shapes(env, nb_rows, expe_type):
+    """shape and type of each of the arrays generated"""
     if expe_type == "powerline":
-        tau = np.full((nb_rows, env.n_line), fill_value=np.NaN, dtype=dt_int)
+        dim_tau = env.n_line
     elif expe_type == "topo":
-        tau = np.full((nb_rows, env.dim_topo), fill_value=np.NaN, dtype=dt_int)
+        dim_tau = env.dim_topo
     else:
         raise NotImplementedError()
+    sizes = {"prod_p": env.n_gen, "prod_v": env.n_gen, "load_p": env.n_load, "load_q": env.n_load, "tau": dim_tau,
+             "flow_a": env.n_line, "flow_p": env.n_line, "flow_q": env.n_line, "line_v": env.n_line}
+    return {arr_n: ((nb_rows, int(sizes[arr_n])), np.dtype(dt_int) if arr_n == "tau" else np.dtype(dt_float))
+            for arr_n in ARRAY_NAMES}
+
+
+def get_shard_seeds(seed, nb_shard, nb_done=None):
+    """
+    seeds of the environment and agent of each shard (None if `seed` is None)
+
+    A shard that is resumed after `nb_done[id_shard]` rows gets another seed, otherwise it would generate again the
+    rows it already generated.
+    """
+    if seed is None:
+        return [None for _ in range(nb_shard)]
+    # grid2op only accepts seeds that fit in an int32
+    max_seed = np.iinfo(np.int32).max
+    res = [int(el) % max_seed for el in np.random.SeedSequence(seed).generate_state(nb_shard)]
+    if nb_done is not None:
+        for id_shard, nb_done_shard in enumerate(nb_done):
+            if nb_done_shard:
+                seq_ = np.random.SeedSequence([seed, id_shard, nb_done_shard])
+                res[id_shard] = int(seq_.generate_state(1)[0]) % max_seed
+    return res
 
-    # output
-    flow_a = np.full((nb_rows, env.n_line), fill_value=np.NaN, dtype=dt_float)
-    line_v = np.full((nb_rows, env.n_line), fill_value=np.NaN, dtype=dt_float)
-    flow_p = np.full((nb_rows, env.n_line), fill_value=np.NaN, dtype=dt_float)
-    flow_q = np.full((nb_rows, env.n_line), fill_value=np.NaN, dtype=dt_float)
 
+def _set_chronics_shard(env, id_shard, nb_shard):
+    """each shard uses a different subset of the chronics (if there are enough chronics)"""
+    if nb_shard == 1:
+        return
+    real_data = env.chronics_handler.real_data
+    if not hasattr(real_data, "subpaths"):
+        return
+    paths = sorted(real_data.subpaths)
+    if len(paths) < nb_shard:
+        return
+    shard_paths = set(paths[id_shard::nb_shard])
+    env.chronics_handler.set_filter(lambda path: path in shard_paths)
+    env.chronics_handler.reset()
+
+
+def _generate_rows(env, agent, arrays, expe_type, callback=None):
+    """fill all the rows of `arrays` with the observations obtained when `agent` acts on `env`"""
+    nb_rows = arrays["prod_p"].shape[0]
     obs = env.reset()
     reward = env.reward_range[0]
     done = False
     t = 0
-    if verbose:
-        pbar = tqdm(total=nb_rows)
     while t < nb_rows:
         act = agent.act(obs, reward, done)
         obs, reward, done, info = env.step(act)
@@ -96,26 +130,322 @@ def generate_dataset(name_env,
             continue
 
         # so action is valid, i store the results
-        prod_p[t, :] = obs.prod_p
-        prod_v[t, :] = obs.prod_v
-        load_p[t, :] = obs.load_p
-        load_q[t, :] = obs.load_q
+        arrays["prod_p"][t, :] = obs.prod_p
+        arrays["prod_v"][t, :] = obs.prod_v
+        arrays["load_p"][t, :] = obs.load_p
+        arrays["load_q"][t, :] = obs.load_q
         if expe_type == "powerline":
-            tau[t, :] = 1 - obs.line_status  # 0 = connected, 1 = disconnected
+            arrays["tau"][t, :] = 1 - obs.line_status  # 0 = connected, 1 = disconnected
         elif expe_type == "topo":
-            tau[t, :] = obs.topo_vect - 1  # 0 = on bus 1, 1 = on bus 2
-        flow_a[t, :] = obs.a_or
-        line_v[t, :] = obs.v_or
-        flow_p[t, :] = obs.p_or
-        flow_q[t, :] = obs.q_or
+            arrays["tau"][t, :] = obs.topo_vect - 1  # 0 = on bus 1, 1 = on bus 2
+        arrays["flow_a"][t, :] = obs.a_or
+        arrays["line_v"][t, :] = obs.v_or
+        arrays["flow_p"][t, :] = obs.p_or
+        arrays["flow_q"][t, :] = obs.q_or
         t += 1
-        if verbose:
-            pbar.update(1)
+        if callback is not None:
+            callback(t)
+
+
+def _read_progress(dir_out_abs):
+    """progress of an unfinished generation in `dir_out_abs` (None if there is none)"""
+    path = os.path.join(dir_out_abs, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_progress(dir_out_abs, progress):
+    """save the progress marker (atomically, so that it is valid even if the process is killed while writing it)"""
+    path = os.path.join(dir_out_abs, PROGRESS_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, fp=f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _describe_kwargs(kwargs):
+    """
+    description of key word arguments that can be saved in the progress marker (json). The objects that json cannot
+    save (classes, backends...) are described by their type only.
+    """
+    def describe(obj):
+        type_ = obj if isinstance(obj, type) else type(obj)
+        return f"{type_.__module__}.{type_.__qualname__}"
+    return json.loads(json.dumps(kwargs if kwargs is not None else {}, default=describe, sort_keys=True))
+
+
+def _get_progress_params(name_env, nb_rows, agent_type, expe_type, seed, kwargs_make, kwargsagent):
+    """parameters of a generation, stored in its progress marker, that must be the same to resume it"""
+    return {"name_env": name_env, "nb_rows": nb_rows, "agent_type": agent_type, "expe_type": expe_type,
+            "seed": seed, "kwargs_make": _describe_kwargs(kwargs_make), "kwargsagent": _describe_kwargs(kwargsagent)}
+
+
+def _check_progress(progress, params):
+    """check that the unfinished generation can be resumed with these parameters"""
+    for key_, val_ in params.items():
+        if key_ not in progress or progress[key_] != val_:
+            raise RuntimeError(f"Impossible to resume the generation of the dataset: it was started with "
+                               f"{key_}={progress.get(key_)} but {key_}={val_} is given. Use `resume=False` to start "
+                               f"a new one.")
+
+
+def _create_arrays(dir_out_abs, shapes):
+    """create the (memory mapped) ".npy" files of the dataset, not generated rows are NaN for the float arrays"""
+    for arr_n, (shape, dtype) in shapes.items():
+        arr = np.lib.format.open_memmap(os.path.join(dir_out_abs, "{}.npy".format(arr_n)),
+                                        mode="w+", dtype=dtype, shape=shape)
+        if dtype.kind == "f":
+            arr[:] = np.nan
+        arr.flush()
+        del arr
+
+
+def _open_arrays(dir_out_abs, beg_, end_):
+    """rows `beg_` to `end_` (excluded) of the ".npy" files of the dataset, memory mapped (and writable)"""
+    return {arr_n: np.load(os.path.join(dir_out_abs, "{}.npy".format(arr_n)), mmap_mode="r+")[beg_:end_]
+            for arr_n in ARRAY_NAMES}
+
+
+def _flush_arrays(arrays):
+    for arr in arrays.values():
+        arr.flush()
+
+
+def _generate_shard(name_env, kwargs_make, agent_type, kwargsagent, expe_type, arrays, id_shard, nb_shard, seed,
+                    callback=None):
+    """generate the rows of one shard in `arrays`, with its own environment, agent and chronics"""
+    env = get_env(name_env, kwargs_make)
+    try:
+        agent = get_agent(env, agent_type, **kwargsagent)
+        _set_chronics_shard(env, id_shard, nb_shard)
+        if seed is not None:
+            env.seed(seed)
+            agent.seed(seed)
+        _generate_rows(env, agent, arrays, expe_type, callback)
+    finally:
+        env.close()
 
-    if verbose:
-        pbar.close()
 
-    for arr_, arr_n in zip([prod_p, prod_v, load_p, load_q, tau, flow_a, flow_p, flow_q, line_v],
-                           ["prod_p", "prod_v", "load_p", "load_q", "tau", "flow_a", "flow_p", "flow_q", "line_v"]):
-        tmp_nm = os.path.join(dir_out_abs, "{}.npy".format(arr_n))
-        np.save(file=tmp_nm, arr=arr_)
+def _generate_shard_worker(progress_queue, parent_pid, dir_out_abs, beg_, end_, id_shard, nb_shard, seed, kwargs):
+    """
+    generate the rows `beg_` to `end_` (excluded) of the dataset, directly in the ".npy" files of `dir_out_abs`
+    (run in a separate process)
+    """
+    try:
+        arrays = _open_arrays(dir_out_abs, beg_, end_)
+        last_ = [0]
+
+        def callback(t):
+            if os.getppid() != parent_pid:
+                # the main process was killed, the generation will be resumed from the last progress saved
+                raise RuntimeError("The main process is dead")
+            if t % PROGRESS_FREQ == 0 or t == end_ - beg_:
+                _flush_arrays(arrays)
+                progress_queue.put(("progress", id_shard, t - last_[0]))
+                last_[0] = t
+        _generate_shard(arrays=arrays, id_shard=id_shard, nb_shard=nb_shard, seed=seed, callback=callback, **kwargs)
+        del arrays
+        progress_queue.put(("done", id_shard, 0))
+    except Exception:
+        progress_queue.put(("error", id_shard, traceback.format_exc()))
+
+
+def _generate_sequential(dir_out_abs, progress, seeds, kwargs, verbose):
+    """generate the (remaining rows of the) dataset in the current process"""
+    bounds = progress["bounds"]
+    beg_ = bounds[0] + progress["done"][0]
+    arrays = _open_arrays(dir_out_abs, beg_, bounds[1])
+    nb_rows = bounds[1] - beg_
+    if nb_rows == 0:
+        # already finished
+        return
+
+    def callback(t):
+        pbar.update(1)
+        if t % PROGRESS_FREQ == 0 or t == nb_rows:
+            _flush_arrays(arrays)
+            progress["done"][0] = beg_ - bounds[0] + t
+            _write_progress(dir_out_abs, progress)
+
+    with tqdm(total=bounds[-1], initial=sum(progress["done"]), disable=not verbose) as pbar:
+        _generate_shard(arrays=arrays, id_shard=0, nb_shard=1, seed=seeds[0], callback=callback, **kwargs)
+    del arrays
+
+
+def _generate_parallel(dir_out_abs, progress, seeds, kwargs, verbose):
+    """generate the (remaining rows of the) dataset with one process per shard, each filling its rows of the files"""
+    bounds = progress["bounds"]
+    nb_shard = len(bounds) - 1
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    processes = {}  # id of the shard -> process generating it (until it is finished)
+    try:
+        for id_shard in range(nb_shard):
+            beg_ = bounds[id_shard] + progress["done"][id_shard]
+            if beg_ >= bounds[id_shard + 1]:
+                # this shard is already finished
+                continue
+            process = ctx.Process(target=_generate_shard_worker,
+                                  args=(progress_queue, os.getpid(), dir_out_abs, beg_, bounds[id_shard + 1],
+                                        id_shard, nb_shard, seeds[id_shard], kwargs),
+                                  name=f"leap_net_generate_{id_shard}")
+            process.start()
+            processes[id_shard] = process
+
+        running = dict(processes)
+        dead = []
+        with tqdm(total=bounds[-1], initial=sum(progress["done"]), disable=not verbose) as pbar:
+            while running:
+                try:
+                    kind, id_shard, value = progress_queue.get(timeout=PROGRESS_TIMEOUT)
+                except queue.Empty:
+                    # a worker is considered stopped if it was already dead before waiting (so all the
+                    # messages it sent have been read)
+                    for id_shard in dead:
+                        if id_shard in running:
+                            raise RuntimeError(f"The worker generating the shard {id_shard} stopped unexpectedly "
+                                               f"(exit code {running[id_shard].exitcode}). The rows generated so "
+                                               f"far are saved: call this function again with the same parameters "
+                                               f"to resume the generation.")
+                    dead = [id_shard for id_shard, process in running.items() if not process.is_alive()]
+                    continue
+                if kind == "progress":
+                    progress["done"][id_shard] += value
+                    _write_progress(dir_out_abs, progress)
+                    pbar.update(value)
+                elif kind == "done":
+                    del running[id_shard]
+                else:
+                    raise RuntimeError(f"Error while generating the dataset in a worker:\n{value}")
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def generate_dataset(name_env,
+                     nb_rows,
+                     dir_out="training_dataset",
+                     agent_type="do_nothing",
+                     expe_type="powerline",
+                     verbose=True,
+                     nb_process=1,
+                     seed=None,
+                     kwargs_make=None,
+                     resume=True,
+                     chunk_size=DatasetReader.CHUNK_SIZE,
+                     **kwargsagent):
+    """
+    Generate a dataset by running an agent on an environment, and save it in `dir_out` (one ".npy" file per array,
+    see `ARRAY_NAMES`)
+
+    The ".npy" files are created at the beginning and the rows are written directly in them (they are memory
+    mapped) so that the memory used does not depend on `nb_rows`. Every `PROGRESS_FREQ` rows the files are flushed
+    and the number of rows generated is saved in a "progress.json" file, that is removed once the dataset is
+    complete. If the generation is interrupted (crash, job killed...), calling this function again with the same
+    parameters resumes it from the last rows saved (unless `resume` is ``False``). The parameters of the generation
+    (including `seed`, `kwargs_make` and `kwargsagent`) are saved in "progress.json" and it is not resumed (an error
+    is raised) if they are different.
+
+    Once the dataset is complete, a "header.json" file with the shape, the dtype and the statistics (mean, standard
+    deviation, min and max) of each column of each array is saved (see :class:`DatasetReader`, that can read the
+    dataset by chunks of `chunk_size` rows).
+
+    The rows can be generated by `nb_process` processes: each process generates a contiguous part of the rows (a
+    "shard") with its own environment, its own agent and (if the environment has enough chronics) its own subset of
+    the chronics, and writes them directly at their place in the files.
+
+    If `seed` is not ``None`` the environment and the agent of each shard are seeded with seeds derived from it, so
+    that the dataset is the same for the same `seed` and the same `nb_process` (if it is not resumed).
+
+    Parameters
+    ----------
+    name_env: ``str``
+        Name of the environment (given to `grid2op.make`)
+
+    nb_rows: ``int``
+        Number of rows to generate
+
+    dir_out: ``str``
+        Directory where the arrays are saved
+
+    agent_type: ``str``
+        Type of agent used (see :func:`get_agent`)
+
+    expe_type: ``str``
+        What tau represents: "powerline" (the powerline status) or "topo" (the topology)
+
+    verbose: ``bool``
+        Whether to display a progress bar
+
+    nb_process: ``int``
+        Number of processes used to generate the rows (when a generation is resumed, the number of processes it was
+        started with is used)
+
+    seed: ``int``
+        Seed used for the environments and the agents (``None`` to not seed them)
+
+    kwargs_make: ``dict``
+        Other key word arguments given to `grid2op.make`
+
+    resume: ``bool``
+        Whether to resume the unfinished generation in `dir_out` (if any). If ``False`` it is started again from
+        scratch.
+
+    chunk_size: ``int``
+        Number of rows of the chunks read by :class:`DatasetReader` (the statistics are also computed by chunks of
+        this size)
+
+    kwargsagent:
+        Key word arguments used to build the agent
+    """
+    nb_rows = int(nb_rows)
+    nb_process = max(min(int(nb_process), nb_rows), 1)
+    if seed is not None:
+        seed = int(seed)
+    if not isinstance(agent_type, str):
+        raise NotImplementedError()
+
+    dir_out_abs = os.path.abspath(dir_out)
+    if not os.path.exists(dir_out_abs):
+        os.mkdir(dir_out_abs)
+
+    params = _get_progress_params(name_env, nb_rows, agent_type, expe_type, seed, kwargs_make, kwargsagent)
+    progress = _read_progress(dir_out_abs) if resume else None
+    if progress is not None:
+        _check_progress(progress, params)
+        if len(progress["bounds"]) - 1 != nb_process:
+            warnings.warn(f"The generation is resumed with the {len(progress['bounds']) - 1} process(es) it was "
+                          f"started with.")
+    else:
+        env = get_env(name_env, kwargs_make)
+        try:
+            shapes = get_array_shapes(env, nb_rows, expe_type)
+            if nb_process > 1:
+                real_data = env.chronics_handler.real_data
+                if not hasattr(real_data, "subpaths") or len(real_data.subpaths) < nb_process:
+                    warnings.warn("There are less chronics than processes, all the processes will use all the "
+                                  "chronics.")
+        finally:
+            env.close()
+        progress = dict(params)
+        progress["bounds"] = [int(el) for el in np.linspace(0, nb_rows, nb_process + 1).astype(int)]
+        progress["done"] = [0 for _ in range(nb_process)]
+        # the marker is written once all the files are created (otherwise the generation starts again from scratch)
+        _create_arrays(dir_out_abs, shapes)
+        _write_progress(dir_out_abs, progress)
+
+    nb_shard = len(progress["bounds"]) - 1
+    seeds = get_shard_seeds(seed, nb_shard, progress["done"])
+    kwargs = {"name_env": name_env, "kwargs_make": kwargs_make, "agent_type": agent_type,
+              "kwargsagent": kwargsagent, "expe_type": expe_type}
+    if nb_shard == 1:
+        _generate_sequential(dir_out_abs, progress, seeds, kwargs, verbose)
+    else:
+        _generate_parallel(dir_out_abs, progress, seeds, kwargs, verbose)
+    # the dataset is complete
+    DatasetReader.write_header(dir_out_abs, ARRAY_NAMES, chunk_size=chunk_size)
+    os.remove(os.path.join(dir_out_abs, PROGRESS_FILE))
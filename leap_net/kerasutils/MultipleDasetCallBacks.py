@@ -6,7 +6,9 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 import os
+import threading
 
+import numpy as np
 from tensorflow import keras
 import tensorflow as tf
 
@@ -16,6 +18,18 @@ class MultipleDasetCallBacks(keras.callbacks.Callback):
     This class allows to save the loss (in tensorboard) for multiple dataset during training.
 
     It uses 1 saver per dataset,
+
+    Each dataset is converted once (when the callback is created) into a batched and cached `tf.data.Dataset`, so the
+    numpy arrays are not converted again at each evaluation. To make the evaluations cheaper, they can be done only
+    every `eval_freq` epochs (and at the end of the training) and / or on a fixed random subsample of at most
+    `max_rows` rows of each dataset.
+
+    If `async_eval` is ``True`` the evaluations are done in a background thread, on a copy of the neural network
+    (compiled with the same losses, metrics and loss weights) with the weights of the end of the epoch, so that the
+    training continues while the losses are computed (only one evaluation is done at a time: the next one waits for
+    the previous one to be finished). The results are recorded (history, csv and tensorboard) by the training thread
+    once the evaluation is over.
+
     Examples
     --------
     # training dataset
@@ -47,29 +61,58 @@ class MultipleDasetCallBacks(keras.callbacks.Callback):
               )
 
     """
-    def __init__(self, validation_sets, log_dir, verbose=0, savecsv=True, batch_size=None):
+    DEFAULT_BATCH_SIZE = 32  # same as keras
+
+    def __init__(self,
+                 validation_sets,
+                 log_dir,
+                 verbose=0,
+                 savecsv=True,
+                 batch_size=None,
+                 eval_freq=1,
+                 max_rows=None,
+                 async_eval=False,
+                 seed=0):
         """
         thank @https://stackoverflow.com/questions/47731935/using-multiple-validation-sets-with-keras
 
         :param validation_sets:
         a list of 3-tuples (validation_set_name, validation_data, validation_targets)
         or 4-tuples (validation_set_name, validation_data, validation_targets, sample_weights)
+        or 2-tuples (validation_set_name, dataset) where dataset is a batched `tf.data.Dataset` (used as is: it is
+        neither cached nor subsampled by the callback, for datasets that do not fit in memory, see the `cache` and
+        `max_rows` arguments of :func:`leap_net.generate_data.DatasetReader.get_tf_dataset`)
 
         :param verbose:
         verbosity mode, 1 or 0
 
         :param batch_size:
         batch size to be used when evaluating on the additional datasets
+
+        :param eval_freq:
+        the datasets are evaluated every `eval_freq` epochs (and at the end of the training)
+
+        :param max_rows:
+        if not None, each dataset is evaluated on a random subsample (always the same) of at most `max_rows` rows
+
+        :param async_eval:
+        evaluate the datasets in a background thread, on a copy of the weights
+
+        :param seed:
+        seed used to draw the subsamples
         """
         super(MultipleDasetCallBacks, self).__init__()
         self.validation_sets = validation_sets
         for validation_set in self.validation_sets:
-            if len(validation_set) not in [2, 3]:
+            if len(validation_set) not in [2, 3, 4]:
                 raise ValueError()
         self.epoch = []
         self.history = {}
         self.verbose = verbose
         self.batch_size = batch_size
+        self.eval_freq = max(int(eval_freq), 1)
+        self.max_rows = max_rows
+        self.async_eval = async_eval
 
         self.tf_writer = {dsn: tf.summary.create_file_writer(os.path.join(log_dir, dsn), name=dsn)
                           for dsn, *_ in validation_sets}
@@ -78,9 +121,37 @@ class MultipleDasetCallBacks(keras.callbacks.Callback):
         self.savecsv = savecsv
         self.res_csv = {dsn: {"epoch": []} for dsn, *_ in validation_sets}
 
+        rng = np.random.default_rng(seed)
+        self.datasets = [(validation_set[0], self._make_dataset(validation_set[1:], rng))
+                         for validation_set in self.validation_sets]
+        self._last_evaluated = None
+        self._shadow_model = None
+        self._thread = None
+        self._error = None
+        self._results = None
+
+    def _make_dataset(self, data, rng):
+        """cached and batched dataset from the data (inputs, targets and possibly the weights) of a validation set"""
+        if len(data) == 1:
+            # already a dataset
+            return data[0]
+        # keras takes lists of arrays for the models with multiple inputs / outputs, tf.data needs tuples
+        data = tuple(tuple(el) if isinstance(el, list) else el for el in data)
+        if data[-1] is None:
+            # no sample weights
+            data = data[:-1]
+        nb_row = len(tf.nest.flatten(data)[0])
+        if self.max_rows is not None and nb_row > self.max_rows:
+            rows = np.sort(rng.choice(nb_row, size=int(self.max_rows), replace=False))
+            data = tf.nest.map_structure(lambda arr: np.asarray(arr)[rows], data)
+        batch_size = self.batch_size if self.batch_size is not None else self.DEFAULT_BATCH_SIZE
+        dataset = tf.data.Dataset.from_tensor_slices(data).batch(batch_size).cache()
+        return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
     def on_train_begin(self, logs=None):
         self.epoch = []
         self.history = {}
+        self._last_evaluated = None
 
     def on_epoch_end(self, epoch, logs=None):
         logs = logs or {}
@@ -91,36 +162,84 @@ class MultipleDasetCallBacks(keras.callbacks.Callback):
             self.history.setdefault(k, []).append(v)
 
         # evaluate on the additional validation sets
-        for id_, validation_set in enumerate(self.validation_sets):
-            if len(validation_set) == 3:
-                validation_set_name, validation_data, validation_targets = validation_set
-                sample_weights = None
-            elif len(validation_set) == 4:
-                validation_set_name, validation_data, validation_targets, sample_weights = validation_set
-            else:
-                raise ValueError()
+        if (epoch + 1) % self.eval_freq == 0:
+            self._evaluate(epoch)
+
+    def _evaluate(self, epoch):
+        """evaluate all the validation sets (in a background thread if `async_eval`)"""
+        self._last_evaluated = epoch
+        if not self.async_eval:
+            self._record(epoch, self._evaluate_all(self.model))
+            return
+
+        self.wait()
+        if self._shadow_model is None:
+            self._shadow_model = tf.keras.models.clone_model(self.model)
+            self._compile_like_model(self._shadow_model)
+        self._shadow_model.set_weights(self.model.get_weights())
+        self._thread = threading.Thread(target=self._evaluate_background,
+                                        args=(epoch, ),
+                                        name="leap_net_validation")
+        self._thread.start()
+
+    def _compile_like_model(self, shadow_model):
+        """compile `shadow_model` with the losses, metrics and loss weights of the model being trained"""
+        if hasattr(self.model, "get_compile_config"):
+            # keras >= 3 (the metrics are deserialized: the shadow model does not share their states)
+            shadow_model.compile_from_config(self.model.get_compile_config())
+            return
+
+        def copy_metric(metric):
+            if isinstance(metric, keras.metrics.Metric):
+                return metric.__class__.from_config(metric.get_config())
+            return metric
+        compile_args = self.model._get_compile_args()
+        compile_args.pop("optimizer", None)  # the shadow model is never trained
+        for nm in ("metrics", "weighted_metrics"):
+            compile_args[nm] = tf.nest.map_structure(copy_metric, compile_args.get(nm))
+        shadow_model.compile(**compile_args)
+
+    def _evaluate_background(self, epoch):
+        # the results are recorded by the training thread (see `wait`)
+        try:
+            self._results = (epoch, self._evaluate_all(self._shadow_model))
+        except Exception as exc_:
+            self._error = exc_
+
+    def wait(self):
+        """
+        wait for the evaluation in the background (if any) to be finished, record its results and raise its error
+        (if any)
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._results is not None:
+            epoch, results = self._results
+            self._results = None
+            self._record(epoch, results)
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise RuntimeError("Error while evaluating the validation sets") from error
+
+    def _evaluate_all(self, model):
+        """the results (a dictionary "name" -> "value") of `model` on each validation set"""
+        return [(validation_set_name, model.evaluate(dataset, verbose=self.verbose, return_dict=True))
+                for validation_set_name, dataset in self.datasets]
 
-            results = self.model.evaluate(x=validation_data,
-                                          y=validation_targets,
-                                          verbose=self.verbose,
-                                          sample_weight=sample_weights,
-                                          batch_size=self.batch_size)
-
-            for i, result in enumerate(results):
-                if i == 0:
-                    valuename = 'epoch_loss'
-                    colname_csv = 'loss'
-                else:
-                    valuename = 'epoch_{}_loss'.format(self.model.output_names[i-1])
-                    colname_csv = '{}_loss'.format(self.model.output_names[i-1])
+    def _record(self, epoch, results):
+        """record the results of the evaluation of an epoch in the history, the summaries and the CSV"""
+        for validation_set_name, res_dict in results:
+            self.res_csv[validation_set_name]["epoch"].append(epoch)
+            for colname_csv, result in res_dict.items():
+                valuename = 'epoch_{}'.format(colname_csv)
                 self.history.setdefault(valuename, []).append(result)
 
                 with self.tf_writer[validation_set_name].as_default():
                     tf.summary.scalar(valuename, data=result, step=epoch)
 
                 # save the CSV
-                if i == 0:
-                    self.res_csv[validation_set_name]["epoch"].append(epoch)
                 if not colname_csv in self.res_csv[validation_set_name]:
                     self.res_csv[validation_set_name][colname_csv] = []
                 self.res_csv[validation_set_name][colname_csv].append(result)
@@ -137,5 +256,8 @@ class MultipleDasetCallBacks(keras.callbacks.Callback):
                 df.to_csv(os.path.join(self.log_dir, "{}.csv".format(tab_name)), index=False, sep=";")
 
     def on_train_end(self, logs=None):
+        if self.epoch and self._last_evaluated != self.epoch[-1]:
+            # the last epoch is always evaluated
+            self._evaluate(self.epoch[-1])
+        self.wait()
         self._save_csv()
-
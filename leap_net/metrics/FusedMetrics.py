@@ -0,0 +1,153 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from leap_net.metrics.MetricAccumulators import MSEAccumulator, MAEAccumulator, NRMSEAccumulator, PearsonRAccumulator
+
+
+class FusedMetrics:
+    """
+    Compute the MSE, the MAE, the NRMSE and the pearson correlation coefficient of a pair `(y_true, y_pred)` in a
+    single pass over the data.
+
+    Each chunk of rows is read (and converted to float64) once, its residuals `y_true - y_pred` are computed once
+    and given to the accumulators of all the metrics (see
+    :func:`leap_net.metrics.BaseMetricAccumulator.update_from_residual`). By default, chunks have around `CHUNK_NB_ELEMENT`
+    elements so that the temporary arrays stay in the cache of the processor.
+
+    The results (for each column) can then be aggregated with :func:`FusedMetrics.get` to have the same values as:
+
+    - `sklearn.metrics.mean_squared_error(y_true, y_pred, multioutput=...)` for "MSE"
+    - `sklearn.metrics.mean_absolute_error(y_true, y_pred, multioutput=...)` for "MAE"
+    - `leap_net.metrics.nrmse(y_true, y_pred, multioutput=..., threshold=threshold_nrmse)` for "NRMSE"
+    - `leap_net.metrics.pearson_r(y_true, y_pred, multioutput=..., threshold=threshold_pearson)` for "pearson_r"
+
+    These are the values of the accumulators, so they are equal to the ones of these functions up to the rounding
+    errors described in :class:`leap_net.metrics.BaseMetricAccumulator` (all the statistics are accumulated in
+    float64).
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        fused = FusedMetrics()
+        res = fused.compute(y_true, y_pred)
+        mse_avg = fused.get(res, "MSE", multioutput="uniform_average")
+        pearson_r = fused.get(res, "pearson_r", multioutput="raw_values")
+
+    """
+    KINDS = ("MSE", "MAE", "NRMSE", "pearson_r")
+    CHUNK_NB_ELEMENT = 65536
+
+    def __init__(self, threshold_nrmse=1., threshold_pearson=1., chunk_size=None):
+        self.threshold_nrmse = float(threshold_nrmse)
+        self.threshold_pearson = float(threshold_pearson)
+        if self.threshold_nrmse < 0. or self.threshold_pearson < 0.:
+            raise RuntimeError("The threshold should be a positive floating point value.")
+        self.chunk_size = int(chunk_size) if chunk_size is not None else None
+        if self.chunk_size is not None and self.chunk_size <= 0:
+            raise RuntimeError("The chunk size should be > 0.")
+
+    def get_accumulators(self, multioutput="raw_values"):
+        """
+        Get a new accumulator for each metric
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the `KINDS` of metrics, values are the accumulators (that have not seen any data)
+        """
+        return {"MSE": MSEAccumulator(multioutput=multioutput),
+                "MAE": MAEAccumulator(multioutput=multioutput),
+                "NRMSE": NRMSEAccumulator(multioutput=multioutput, threshold=self.threshold_nrmse),
+                "pearson_r": PearsonRAccumulator(multioutput=multioutput, threshold=self.threshold_pearson)}
+
+    def compute(self, y_true, y_pred):
+        """
+        Compute all the metrics for each column
+
+        Parameters
+        ----------
+        y_true: ``numpy.ndarray``
+            The true values. Each rows is an example, each column is a variable.
+
+        y_pred: ``numpy.ndarray``
+            The predicted values. Its shape should match the one from `y_true`
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the `KINDS` of metrics, values are vectors with as many components as the number of columns.
+
+        """
+        if y_true.shape != y_pred.shape:
+            raise RuntimeError("The metrics can only be computed if y_true and y_pred have the same shape")
+        if len(y_true.shape) != 2:
+            raise RuntimeError("The metrics can only be computed on matrices")
+        nb_row, nb_col = y_true.shape
+        if nb_row == 0:
+            raise RuntimeError("The metrics cannot be computed without any data")
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(self.CHUNK_NB_ELEMENT // max(nb_col, 1), 1)
+
+        accumulators = self.get_accumulators()
+        for beg_ in range(0, nb_row, chunk_size):
+            # the chunk is read, converted and subtracted once for all the metrics
+            true_ = np.asarray(y_true[beg_:(beg_ + chunk_size)], dtype=np.float64)
+            pred_ = np.asarray(y_pred[beg_:(beg_ + chunk_size)], dtype=np.float64)
+            resid_ = true_ - pred_
+            for acc in accumulators.values():
+                acc.update_from_residual(resid_, true_, pred_)
+        return {kind: acc.result() for kind, acc in accumulators.items()}
+
+    def compute_many(self, li_y_true, li_y_pred, nb_thread=1):
+        """
+        Compute all the metrics for multiple pairs `(y_true, y_pred)` (for example one per output of a proxy).
+
+        If `nb_thread` > 1 the pairs are processed in parallel by a pool of threads (numpy releases the GIL for
+        the heavy computations).
+
+        Returns
+        -------
+        res: ``list``
+            One dictionary (see :func:`FusedMetrics.compute`) per pair
+        """
+        li_y_true = list(li_y_true)
+        li_y_pred = list(li_y_pred)
+        if nb_thread <= 1 or len(li_y_true) <= 1:
+            return [self.compute(y_true, y_pred) for y_true, y_pred in zip(li_y_true, li_y_pred)]
+        with ThreadPoolExecutor(max_workers=min(int(nb_thread), len(li_y_true))) as executor:
+            return list(executor.map(self.compute, li_y_true, li_y_pred))
+
+    @staticmethod
+    def get(res, kind, multioutput):
+        """
+        Get the value of a metric, aggregated like the original metric function would do.
+
+        Parameters
+        ----------
+        res: ``dict``
+            The results of :func:`FusedMetrics.compute`
+
+        kind: ``str``
+            One of `FusedMetrics.KINDS`
+
+        multioutput: ``str``
+            "raw_values" for the value of each column, otherwise the average (for "NRMSE" and "pearson_r", only
+            "uniform" is averaged, like in `nrmse` and `pearson_r`)
+
+        """
+        if kind not in res:
+            raise RuntimeError(f"Unknown metric \"{kind}\", available metrics are {FusedMetrics.KINDS}")
+        # the accumulators aggregate the columns like the original metric functions
+        acc = FusedMetrics().get_accumulators(multioutput=multioutput)[kind]
+        return acc._aggregate(np.array(res[kind]))
@@ -0,0 +1,401 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+import copy
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class BaseMetricAccumulator(ABC):
+    """
+    Base class of the "accumulators": they compute a metric chunk by chunk, without having to store the complete
+    `y_true` and `y_pred` matrices in memory.
+
+    Only some "sufficient statistics" (number of rows, sums, min, max etc.) are stored. All the statistics are
+    accumulated in float64, whatever the type of the data.
+
+    The results are not bit for bit identical to the ones of the corresponding metric functions:
+
+    - compared with the metric function computed on float64 data, the additions are made in another order (by
+      chunks), the relative difference is of the order of 1e-15 (tested with a tolerance of 1e-12)
+    - for float32 data, the metric functions add the rows in float32: their rounding errors grow with the number
+      of rows (relative difference of the order of 1e-6 on 1e3 rows, 1e-5 on 1e5 rows). The accumulators are then
+      the more precise ones.
+
+    Accumulators computed on different parts of the data (for example by different processes) can be merged with
+    :func:`BaseMetricAccumulator.merge`.
+
+    An accumulator can also be used as a regular metric function: `acc(y_true, y_pred)` computes the metric
+    on the whole matrices (processed by chunks of `CHUNK_SIZE` rows), without modifying `acc`.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        acc = NRMSEAccumulator(multioutput="raw_values")
+        for y_true_chunk, y_pred_chunk in ...:
+            acc.update(y_true_chunk, y_pred_chunk)
+        res = acc.result()  # same as nrmse(y_true, y_pred, multioutput="raw_values")
+
+    """
+    CHUNK_SIZE = 8192
+
+    def __init__(self, multioutput):
+        self.multioutput = multioutput
+        self.nb_row = 0
+        self.nb_col = None
+
+    @abstractmethod
+    def _update(self, y_true, y_pred, resid):
+        """update the statistics with a chunk of (float64) data, with at least one row (`resid` is
+        `y_true - y_pred`, it should not be modified)"""
+        pass
+
+    @abstractmethod
+    def _merge(self, other):
+        """merge the statistics of `other` into `self` (both are not empty)"""
+        pass
+
+    @abstractmethod
+    def _result(self):
+        """compute the value of the metric for each column"""
+        pass
+
+    @abstractmethod
+    def _aggregate(self, res):
+        """aggregate the results of each column, depending on `multioutput`"""
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """remove all the data seen by the accumulator"""
+        pass
+
+    def new(self):
+        """
+        Get an accumulator of the same type, with the same parameters, but that has not seen any data
+
+        Returns
+        -------
+        res: :class:`BaseMetricAccumulator`
+            The new accumulator
+        """
+        res = copy.copy(self)
+        res.reset()
+        return res
+
+    def update(self, y_true, y_pred):
+        """
+        Update the metric with new rows
+
+        Parameters
+        ----------
+        y_true: ``numpy.ndarray``
+            The true values. Each rows is an example, each column is a variable.
+
+        y_pred: ``numpy.ndarray``
+            The predicted values. Its shape should match the one from `y_true`
+
+        """
+        if not self._check_data(y_true, y_pred):
+            return
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        self._update(y_true, y_pred, y_true - y_pred)
+
+    def update_from_residual(self, resid, y_true, y_pred):
+        """
+        Same as :func:`BaseMetricAccumulator.update`, when the residuals `y_true - y_pred` have already been
+        computed (for example to share them between the accumulators of different metrics, see
+        :class:`leap_net.metrics.FusedMetrics`).
+
+        Parameters
+        ----------
+        resid: ``numpy.ndarray``
+            The residuals `y_true - y_pred` (in float64). They are not modified.
+
+        y_true: ``numpy.ndarray``
+            The true values (in float64).
+
+        y_pred: ``numpy.ndarray``
+            The predicted values (in float64).
+
+        """
+        if not self._check_data(y_true, y_pred):
+            return
+        if resid.shape != y_true.shape:
+            raise RuntimeError(f"{type(self).__name__}: the residuals should have the same shape as y_true")
+        self._update(np.asarray(y_true, dtype=np.float64),
+                     np.asarray(y_pred, dtype=np.float64),
+                     np.asarray(resid, dtype=np.float64))
+
+    def _check_data(self, y_true, y_pred):
+        """check the shapes of a chunk of data, returns whether it has at least one row"""
+        if y_true.shape != y_pred.shape:
+            raise RuntimeError(f"{type(self).__name__} can only be computed if y_true and y_pred have the same "
+                               f"shape")
+        if len(y_true.shape) != 2:
+            raise RuntimeError(f"{type(self).__name__} can only be used with matrices")
+        if self.nb_col is not None and y_true.shape[1] != self.nb_col:
+            raise RuntimeError(f"{type(self).__name__} has been used with data with {self.nb_col} columns, "
+                               f"it cannot be updated with data with {y_true.shape[1]} columns.")
+        if y_true.shape[0] == 0:
+            return False
+        self.nb_col = y_true.shape[1]
+        return True
+
+    def merge(self, other):
+        """
+        Merge another accumulator (of the same type, with the same parameters) into this one. After this call,
+        `self` represents the data seen by both accumulators.
+
+        Parameters
+        ----------
+        other: :class:`BaseMetricAccumulator`
+            The other accumulator
+
+        """
+        if type(other) is not type(self):
+            raise RuntimeError(f"Impossible to merge a {type(other).__name__} into a {type(self).__name__}")
+        if other.nb_row == 0:
+            return
+        if self.nb_row == 0:
+            self.__dict__.update(copy.deepcopy(other.__dict__))
+            return
+        if other.nb_col != self.nb_col:
+            raise RuntimeError("Impossible to merge accumulators computed on data with different number of "
+                               "columns")
+        self._merge(other)
+
+    def result(self):
+        """
+        Compute the value of the metric on all the data seen so far.
+
+        Returns
+        -------
+        res: ``float`` or ``numpy.ndarray``
+            Same as the one returned by the corresponding metric function.
+
+        """
+        if self.nb_row == 0:
+            raise RuntimeError(f"Impossible to compute the {type(self).__name__} without any data.")
+        return self._aggregate(self._result())
+
+    def __call__(self, y_true, y_pred):
+        acc = self.new()
+        for beg_ in range(0, y_true.shape[0], self.CHUNK_SIZE):
+            acc.update(y_true[beg_:(beg_ + self.CHUNK_SIZE)], y_pred[beg_:(beg_ + self.CHUNK_SIZE)])
+        return acc.result()
+
+    def _check_threshold(self, threshold):
+        """same checks as the one performed by the `nrmse` and `pearson_r` functions"""
+        try:
+            threshold = float(threshold)
+        except Exception as exc_:
+            raise exc_
+        if threshold < 0.:
+            raise RuntimeError("The threshold should be a positive floating point value.")
+        return threshold
+
+
+class _SumAccumulator(BaseMetricAccumulator):
+    """accumulator for the metrics that are the average of a function of the error (used for MSE and MAE)"""
+    def __init__(self, multioutput="uniform_average"):
+        super().__init__(multioutput)
+        self._sum = None
+
+    @abstractmethod
+    def _sum_error(self, resid):
+        """sum (over the rows) of the error of each column (`resid` should not be modified)"""
+        pass
+
+    def reset(self):
+        self.nb_row = 0
+        self.nb_col = None
+        self._sum = None
+
+    def _update(self, y_true, y_pred, resid):
+        tmp = self._sum_error(resid)
+        if self._sum is None:
+            self._sum = tmp
+        else:
+            self._sum += tmp
+        self.nb_row += y_true.shape[0]
+
+    def _merge(self, other):
+        self._sum = self._sum + other._sum
+        self.nb_row += other.nb_row
+
+    def _result(self):
+        return self._sum / self.nb_row
+
+    def _aggregate(self, res):
+        # same convention as scikit learn
+        if self.multioutput == "raw_values":
+            return res
+        return float(np.mean(res))
+
+
+class MSEAccumulator(_SumAccumulator):
+    """
+    Accumulator for the mean squared error, the result is the same as
+    `sklearn.metrics.mean_squared_error(y_true, y_pred, multioutput=multioutput)`
+    (only "raw_values" and "uniform_average" are supported).
+    """
+    def _sum_error(self, resid):
+        return np.einsum("ij,ij->j", resid, resid)
+
+
+class MAEAccumulator(_SumAccumulator):
+    """
+    Accumulator for the mean absolute error, the result is the same as
+    `sklearn.metrics.mean_absolute_error(y_true, y_pred, multioutput=multioutput)`
+    (only "raw_values" and "uniform_average" are supported).
+    """
+    def _sum_error(self, resid):
+        return np.sum(np.abs(resid), axis=0)
+
+
+class NRMSEAccumulator(_SumAccumulator):
+    """
+    Accumulator for the "normalized RMSE", the result is the same as
+    `leap_net.metrics.nrmse(y_true, y_pred, multioutput=multioutput, threshold=threshold)`.
+
+    It stores the sum of the squared errors as well as the min and the max of `y_true` for each column.
+    """
+    def __init__(self, multioutput="uniform", threshold=1.):
+        super().__init__(multioutput)
+        self.threshold = self._check_threshold(threshold)
+        self._min_true = None
+        self._max_true = None
+
+    def _sum_error(self, resid):
+        return np.einsum("ij,ij->j", resid, resid)
+
+    def reset(self):
+        super().reset()
+        self._min_true = None
+        self._max_true = None
+
+    def _update(self, y_true, y_pred, resid):
+        min_ = np.min(y_true, axis=0)
+        max_ = np.max(y_true, axis=0)
+        if self._min_true is None:
+            self._min_true = min_
+            self._max_true = max_
+        else:
+            np.minimum(self._min_true, min_, out=self._min_true)
+            np.maximum(self._max_true, max_, out=self._max_true)
+        super()._update(y_true, y_pred, resid)
+
+    def _merge(self, other):
+        self._min_true = np.minimum(self._min_true, other._min_true)
+        self._max_true = np.maximum(self._max_true, other._max_true)
+        super()._merge(other)
+
+    def _result(self):
+        rmse = np.sqrt(self._sum / self.nb_row)
+        norm_ = self._max_true - self._min_true
+        norm_[norm_ <= self.threshold] = self.threshold
+        return rmse / norm_
+
+    def _aggregate(self, res):
+        if self.multioutput == "uniform":
+            return np.mean(res)
+        return res
+
+
+class PearsonRAccumulator(BaseMetricAccumulator):
+    """
+    Accumulator for the pearson correlation coefficient, the result is the same as
+    `leap_net.metrics.pearson_r(y_true, y_pred, multioutput=multioutput, threshold=threshold)`.
+
+    For each column it stores the means, the sums of squared deviations, the sum of the cross products of the
+    deviations (updated and merged with the formulas of Chan et al. to avoid numerical instabilities) and the
+    min and max of both `y_true` and `y_pred`.
+    """
+    def __init__(self, multioutput="uniform", threshold=1.):
+        super().__init__(multioutput)
+        self.threshold = self._check_threshold(threshold)
+        self._mean_true = None
+        self._mean_pred = None
+        self._m2_true = None
+        self._m2_pred = None
+        self._cross = None
+        self._min_true = None
+        self._max_true = None
+        self._min_pred = None
+        self._max_pred = None
+
+    def reset(self):
+        self.nb_row = 0
+        self.nb_col = None
+        self._mean_true = None
+        self._mean_pred = None
+        self._m2_true = None
+        self._m2_pred = None
+        self._cross = None
+        self._min_true = None
+        self._max_true = None
+        self._min_pred = None
+        self._max_pred = None
+
+    def _update(self, y_true, y_pred, resid):
+        # (the residuals are not needed, only the deviations from the means)
+        other = self.new()
+        other.nb_row = y_true.shape[0]
+        other.nb_col = y_true.shape[1]
+        other._mean_true = np.mean(y_true, axis=0)
+        other._mean_pred = np.mean(y_pred, axis=0)
+        dev_true = y_true - other._mean_true
+        dev_pred = y_pred - other._mean_pred
+        other._m2_true = np.einsum("ij,ij->j", dev_true, dev_true)
+        other._m2_pred = np.einsum("ij,ij->j", dev_pred, dev_pred)
+        other._cross = np.einsum("ij,ij->j", dev_true, dev_pred)
+        other._min_true = np.min(y_true, axis=0)
+        other._max_true = np.max(y_true, axis=0)
+        other._min_pred = np.min(y_pred, axis=0)
+        other._max_pred = np.max(y_pred, axis=0)
+        self.merge(other)
+
+    def _merge(self, other):
+        nb_row = self.nb_row + other.nb_row
+        delta_true = other._mean_true - self._mean_true
+        delta_pred = other._mean_pred - self._mean_pred
+        coeff = self.nb_row * other.nb_row / nb_row
+        self._m2_true = self._m2_true + other._m2_true + delta_true ** 2 * coeff
+        self._m2_pred = self._m2_pred + other._m2_pred + delta_pred ** 2 * coeff
+        self._cross = self._cross + other._cross + delta_true * delta_pred * coeff
+        self._mean_true = self._mean_true + delta_true * other.nb_row / nb_row
+        self._mean_pred = self._mean_pred + delta_pred * other.nb_row / nb_row
+        self._min_true = np.minimum(self._min_true, other._min_true)
+        self._max_true = np.maximum(self._max_true, other._max_true)
+        self._min_pred = np.minimum(self._min_pred, other._min_pred)
+        self._max_pred = np.maximum(self._max_pred, other._max_pred)
+        self.nb_row = nb_row
+
+    def _result(self):
+        # don't count some value considered "constant"
+        is_ko_true = np.abs(self._max_true - self._min_true) <= self.threshold
+        is_ko_pred = np.abs(self._max_pred - self._min_pred) <= self.threshold
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = self._cross / np.sqrt(self._m2_true * self._m2_pred)
+        rs = np.clip(rs, -1., 1.)
+        rs[is_ko_true | is_ko_pred] = np.nan
+        return rs
+
+    def _aggregate(self, rs):
+        if self.multioutput == "uniform":
+            if np.all(~np.isfinite(rs)):
+                # if everything is Nan then the returned value is Nan
+                rs = np.nan
+            else:
+                # don't take into account the nan there
+                rs = np.nanmean(rs)
+        return rs
@@ -7,8 +7,10 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 import numpy as np
 
+CHUNK_SIZE = 8192
 
-def nrmse(y_true, y_pred, multioutput="uniform", threshold=1.):
+
+def nrmse(y_true, y_pred, multioutput="uniform", threshold=1., chunk_size=CHUNK_SIZE, accumulator_dtype=None):
     """
     Computes the "normalized RMSE" norm.
 
@@ -31,6 +33,22 @@ def nrmse(y_true, y_pred, multioutput="uniform", threshold=1.):
 
     The shapes of y_true and y_pred should match.
 
+    The rows are processed by chunks of `chunk_size` rows, so the temporary arrays never have more than `chunk_size`
+    rows: y_true and y_pred can be (large) `numpy.memmap` (for example the predictions stored on the hard drive by
+    a streaming evaluation), they are read one chunk at a time.
+
+    The squared errors of each chunk are added (row after row) to an accumulator. By default its type is the one
+    numpy uses to compute a mean (float64 for float64 or integer data, float32 for float32 data). For matrices
+    stored row by row ("C" order, with more than one column) numpy also adds the rows one after the other, so the
+    results are exactly the same (bit for bit) as the ones computed on the whole matrices at once. For the other
+    inputs (a single column, a vector or a matrix stored column by column, for example in "Fortran" order) numpy
+    uses a pairwise summation instead: to give the same results, these inputs are not processed by chunks (the
+    whole matrices are read at once).
+
+    Set `accumulator_dtype` to `np.float64` to accumulate float32 data in float64 (more precise on many rows, the
+    inputs are then always processed by chunks, but the results are slightly different: of the order of the float32
+    precision, 1e-7 relative).
+
     Parameters
     ----------
     y_true: ``numpy.ndarray``
@@ -45,6 +63,12 @@ def nrmse(y_true, y_pred, multioutput="uniform", threshold=1.):
     threshold: ``float``
         The the section "Notes" for more information. This should be a floating point number >= 0.
 
+    chunk_size: ``int``
+        Number of rows processed at once
+
+    accumulator_dtype: ``numpy.dtype``
+        Type used to accumulate the squared errors (``None`` for the type used by numpy to compute a mean)
+
     Returns
     -------
     nrmse_: ``float`` or ``numpy.ndarray``
@@ -62,12 +86,85 @@ def nrmse(y_true, y_pred, multioutput="uniform", threshold=1.):
     if threshold < 0.:
         raise RuntimeError("The threshold should be a positive floating point value.")
 
-    se_ = (y_true - y_pred)**2
-    mse = np.mean(se_, axis=0)
+    chunk_size = int(chunk_size)
+    if chunk_size <= 0:
+        raise RuntimeError("The chunk size should be > 0")
+    nb_row = y_true.shape[0]
+    if nb_row == 0:
+        raise RuntimeError("nrmse cannot be computed without any row")
+
+    se_dtype = np.result_type(y_true.dtype, y_pred.dtype)
+    if accumulator_dtype is None:
+        if not (_is_row_major(y_true) and _is_row_major(y_pred)):
+            # numpy would use a pairwise summation (see the notes)
+            return _nrmse_whole(y_true, y_pred, multioutput, threshold)
+        accumulator_dtype = _get_mean_dtype(se_dtype)
+    # the first row of the buffer is the accumulator, the others the squared errors of the current chunk: reducing
+    # it along the first axis adds the rows one after the other, in the same order as np.mean on the whole matrix
+    buffer = np.zeros((min(chunk_size, nb_row) + 1,) + y_true.shape[1:], dtype=accumulator_dtype)
+    sum_se = buffer[0]
+    max_true = None
+    min_true = None
+    for beg_ in range(0, nb_row, chunk_size):
+        true_chunk = np.asarray(y_true[beg_:(beg_ + chunk_size)])
+        pred_chunk = np.asarray(y_pred[beg_:(beg_ + chunk_size)])
+        se_chunk = buffer[1:(true_chunk.shape[0] + 1)]
+        if se_dtype == accumulator_dtype:
+            np.subtract(true_chunk, pred_chunk, out=se_chunk)
+            np.square(se_chunk, out=se_chunk)
+        else:
+            se_chunk[:] = (true_chunk - pred_chunk)**2
+        np.add.reduce(buffer[:(true_chunk.shape[0] + 1)], axis=0, out=sum_se)
+        if max_true is None:
+            max_true = np.max(true_chunk, axis=0)
+            min_true = np.min(true_chunk, axis=0)
+        else:
+            np.maximum(max_true, np.max(true_chunk, axis=0), out=max_true)
+            np.minimum(min_true, np.min(true_chunk, axis=0), out=min_true)
+
+    mse = np.true_divide(sum_se, nb_row)
+    if np.issubdtype(se_dtype, np.floating) and mse.dtype != se_dtype:
+        # np.mean returns the type of the data for floating points
+        mse = mse.astype(se_dtype)
+    return _normalize(mse, max_true - min_true, multioutput, threshold)
+
+
+def _nrmse_whole(y_true, y_pred, multioutput, threshold):
+    """nrmse computed on the whole matrices at once"""
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    mse = np.mean((y_true - y_pred)**2, axis=0)
+    return _normalize(mse, np.max(y_true, axis=0) - np.min(y_true, axis=0), multioutput, threshold)
+
+
+def _normalize(mse, norm_, multioutput, threshold):
+    """divide the rmse by the (thresholded) 'max - min' of each column"""
     rmse = np.sqrt(mse)
-    norm_ = (np.max(y_true, axis=0) - np.min(y_true, axis=0))
+    norm_ = np.asarray(norm_)
     norm_[norm_ <= threshold] = threshold
     nrmse_ = rmse / norm_
     if multioutput == "uniform":
         nrmse_ = np.mean(nrmse_)
     return nrmse_
+
+
+def _is_row_major(arr):
+    """
+    whether numpy adds the rows of `arr` one after the other when it computes `np.mean(arr, axis=0)` (a matrix
+    with more than one column, whose rows are not stored contiguously)
+    """
+    arr = np.asarray(arr) if not hasattr(arr, "strides") else arr
+    if arr.ndim != 2 or arr.shape[1] <= 1:
+        return False
+    if arr.shape[0] <= 1:
+        return True
+    return abs(arr.strides[0]) >= abs(arr.strides[1])
+
+
+def _get_mean_dtype(dtype):
+    """type of the intermediate results of np.mean for data of type `dtype`"""
+    if np.issubdtype(dtype, np.floating):
+        if dtype == np.float16:
+            return np.dtype(np.float32)
+        return np.dtype(dtype)
+    return np.dtype(np.float64)
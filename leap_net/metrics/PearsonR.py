@@ -6,7 +6,9 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 import numpy as np
-from scipy.stats import pearsonr
+
+# number of rows processed at once (bounds the memory used by the float64 temporary arrays)
+ROW_CHUNK_SIZE = 1024
 
 
 def pearson_r(y_true, y_pred, multioutput="uniform", threshold=1.0):
@@ -24,6 +26,10 @@ def pearson_r(y_true, y_pred, multioutput="uniform", threshold=1.0):
     When multioutput is not "uniform" the average is computed only on the "non nan" variables. Nan component are
     ignored.
 
+    All the columns are processed at once, with two passes over the rows (one for the means, one for the
+    centered products) made by chunks of `ROW_CHUNK_SIZE` rows. The sums are accumulated in float64, even if the
+    inputs are float32.
+
     Parameters
     ----------
     y_true: ``numpy.ndarray``
@@ -50,24 +56,57 @@ def pearson_r(y_true, y_pred, multioutput="uniform", threshold=1.0):
     if len(y_true.shape) != 2:
         raise RuntimeError("pearson_r can only be used with matrices")
 
-    rs = np.zeros(y_true.shape[1])
-    for col_id in range(y_true.shape[1]):
-        true_tmp = y_true[:, col_id]
-        pred_tmp = y_pred[:, col_id]
+    nb_row = y_true.shape[0]
+    nb_col = y_true.shape[1]
+    if nb_row == 0:
+        raise RuntimeError("pearson_r cannot be computed without any data")
 
-        # don't count some value considered "constant"
-        is_ko_true = np.abs(np.max(true_tmp) - np.min(true_tmp)) <= threshold
-        is_ko_pred = np.abs(np.max(pred_tmp) - np.min(pred_tmp)) <= threshold
-        if is_ko_true or is_ko_pred:
-            tmp_r = np.NaN
+    # first pass: means, min and max of each column (min and max are computed in the type of the inputs to
+    # have exactly the same "constant" columns whatever the precision)
+    sum_true = np.zeros(nb_col, dtype=np.float64)
+    sum_pred = np.zeros(nb_col, dtype=np.float64)
+    min_true = max_true = min_pred = max_pred = None
+    for beg_ in range(0, nb_row, ROW_CHUNK_SIZE):
+        true_tmp = y_true[beg_:(beg_ + ROW_CHUNK_SIZE)]
+        pred_tmp = y_pred[beg_:(beg_ + ROW_CHUNK_SIZE)]
+        sum_true += np.sum(true_tmp, axis=0, dtype=np.float64)
+        sum_pred += np.sum(pred_tmp, axis=0, dtype=np.float64)
+        if min_true is None:
+            min_true = np.min(true_tmp, axis=0)
+            max_true = np.max(true_tmp, axis=0)
+            min_pred = np.min(pred_tmp, axis=0)
+            max_pred = np.max(pred_tmp, axis=0)
         else:
-            tmp_r, *_ = pearsonr(true_tmp, pred_tmp)
-        rs[col_id] = tmp_r
+            np.minimum(min_true, np.min(true_tmp, axis=0), out=min_true)
+            np.maximum(max_true, np.max(true_tmp, axis=0), out=max_true)
+            np.minimum(min_pred, np.min(pred_tmp, axis=0), out=min_pred)
+            np.maximum(max_pred, np.max(pred_tmp, axis=0), out=max_pred)
+    mean_true = sum_true / nb_row
+    mean_pred = sum_pred / nb_row
+
+    # second pass: (co)variances
+    cov_ = np.zeros(nb_col, dtype=np.float64)
+    var_true = np.zeros(nb_col, dtype=np.float64)
+    var_pred = np.zeros(nb_col, dtype=np.float64)
+    for beg_ in range(0, nb_row, ROW_CHUNK_SIZE):
+        true_tmp = y_true[beg_:(beg_ + ROW_CHUNK_SIZE)] - mean_true
+        pred_tmp = y_pred[beg_:(beg_ + ROW_CHUNK_SIZE)] - mean_pred
+        cov_ += np.einsum("ij,ij->j", true_tmp, pred_tmp)
+        var_true += np.einsum("ij,ij->j", true_tmp, true_tmp)
+        var_pred += np.einsum("ij,ij->j", pred_tmp, pred_tmp)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.clip(cov_ / np.sqrt(var_true * var_pred), -1., 1.)
+
+    # don't count some value considered "constant"
+    is_ko_true = np.abs(max_true - min_true) <= threshold
+    is_ko_pred = np.abs(max_pred - min_pred) <= threshold
+    rs[is_ko_true | is_ko_pred] = np.nan
 
     if multioutput == "uniform":
         if np.all(~np.isfinite(rs)):
             # if everything is Nan then the returned value is Nan
-            rs = np.NaN
+            rs = np.nan
         else:
             # don't take into account the nan there
             rs = np.nanmean(rs)
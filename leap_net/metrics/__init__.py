@@ -7,4 +7,10 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
 from leap_net.metrics.PearsonR import pearson_r
-from leap_net.metrics.NRMSE import nrmse
\ No newline at end of file
+from leap_net.metrics.NRMSE import nrmse
+from leap_net.metrics.MetricAccumulators import BaseMetricAccumulator
+from leap_net.metrics.MetricAccumulators import MSEAccumulator
+from leap_net.metrics.MetricAccumulators import MAEAccumulator
+from leap_net.metrics.MetricAccumulators import NRMSEAccumulator
+from leap_net.metrics.MetricAccumulators import PearsonRAccumulator
+from leap_net.metrics.FusedMetrics import FusedMetrics
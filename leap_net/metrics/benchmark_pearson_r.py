@@ -0,0 +1,89 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import time
+import numpy as np
+from scipy.stats import pearsonr
+
+from leap_net.metrics.PearsonR import pearson_r
+
+
+def pearson_r_loop(y_true, y_pred, multioutput="uniform", threshold=1.0):
+    """previous implementation of :func:`leap_net.metrics.pearson_r`: one call to scipy per column"""
+    rs = np.zeros(y_true.shape[1])
+    for col_id in range(y_true.shape[1]):
+        true_tmp = y_true[:, col_id]
+        pred_tmp = y_pred[:, col_id]
+
+        # don't count some value considered "constant"
+        is_ko_true = np.abs(np.max(true_tmp) - np.min(true_tmp)) <= threshold
+        is_ko_pred = np.abs(np.max(pred_tmp) - np.min(pred_tmp)) <= threshold
+        if is_ko_true or is_ko_pred:
+            tmp_r = np.nan
+        else:
+            tmp_r, *_ = pearsonr(true_tmp, pred_tmp)
+        rs[col_id] = tmp_r
+
+    if multioutput == "uniform":
+        if np.all(~np.isfinite(rs)):
+            rs = np.nan
+        else:
+            rs = np.nanmean(rs)
+    return rs
+
+
+def _time_fun(fun, y_true, y_pred, nb_repeat):
+    """returns the best time (in s) over `nb_repeat` run, and the result"""
+    best_time = np.inf
+    res = None
+    for _ in range(nb_repeat):
+        beg_ = time.perf_counter()
+        res = fun(y_true, y_pred, multioutput="raw_values")
+        best_time = min(best_time, time.perf_counter() - beg_)
+    return best_time, res
+
+
+def main(nb_row=131072,
+         nb_col=186,  # number of powerlines of the case 118
+         nb_attr=10,  # number of output attributes in the case 118 proxies
+         nb_constant=10,  # number of columns that are constant (and are not taken into account)
+         nb_repeat=3,
+         seed=0,
+         verbose=1):
+    """
+    Compare the time needed to compute the pearson correlation coefficients with the vectorized
+    :func:`leap_net.metrics.pearson_r` and with the previous implementation (one call to scipy per column), on
+    float32 data similar to the outputs of a proxy on the case 118.
+    """
+    rng = np.random.default_rng(seed)
+    y_true = (100. * rng.normal(size=(nb_row, nb_col))).astype(np.float32)
+    y_pred = (y_true + 10. * rng.normal(size=(nb_row, nb_col))).astype(np.float32)
+    y_true[:, :nb_constant] = 1.
+
+    time_loop, res_loop = _time_fun(pearson_r_loop, y_true, y_pred, nb_repeat)
+    time_vect, res_vect = _time_fun(pearson_r, y_true, y_pred, nb_repeat)
+    ok_ = np.isfinite(res_loop)
+    if np.any(np.isfinite(res_vect) != ok_):
+        raise RuntimeError("Both implementations do not ignore the same columns")
+    max_diff = float(np.max(np.abs(res_loop[ok_] - res_vect[ok_]))) if np.any(ok_) else 0.
+
+    res = {"loop_s": float(time_loop),
+           "vectorized_s": float(time_vect),
+           "max_abs_diff": max_diff,
+           "estimated_loop_s_per_output": float(time_loop * nb_attr),
+           "estimated_vectorized_s_per_output": float(time_vect * nb_attr)}
+    if verbose:
+        print(f"{nb_row} rows x {nb_col} columns: loop {time_loop:.3f}s, vectorized {time_vect:.3f}s "
+              f"(speed up {time_loop / time_vect:.1f}), max difference {max_diff:.2e}")
+        print(f"for {nb_attr} attributes: loop {time_loop * nb_attr:.2f}s, "
+              f"vectorized {time_vect * nb_attr:.2f}s")
+    return res
+
+
+if __name__ == "__main__":
+    main()
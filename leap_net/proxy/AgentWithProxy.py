@@ -8,68 +8,32 @@
 import os
 import json
 import re
+import shutil
+import tempfile
 
 import numpy as np
 import tensorflow as tf
 from tqdm import tqdm
 
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from grid2op.Agent import BaseAgent
 
 from leap_net.proxy.ProxyLeapNet import ProxyLeapNet
-import numpy as np
-
-try:
-    import matplotlib.pyplot as plt
-    MATPLOT_OK = True
-except ImportError:
-    MATPLOT_OK = False
+from leap_net.proxy.ParallelCollector import ParallelCollector
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
+from leap_net.proxy.RecordedDataset import RecordedDataset
+from leap_net.proxy.PlotErrorOnGrid import PlotErrorOnGrid
+from leap_net.proxy.TensorboardSink import TensorboardSink
+from leap_net.proxy.InitDataset import InitDataset
+from leap_net.metrics.MetricAccumulators import BaseMetricAccumulator
+from leap_net.metrics.FusedMetrics import FusedMetrics
+from leap_net.proxy.utils import FUSED_METRICS, reboot
 
 # TODO merge "reproducible exp" as a method of AgentWithProxy
 # TODO implement a "I have gathered enough data, now let me learn without gathering more"
 
 
-class PlotErrorOnGrid:
-    """
-    TODO move this class in this own file
-    this class is used to "project" on the grid the metrics / errors of some proxies.
-
-    it just ensure the projection, and as of creation (October, 26th 2020) it requires a development version
-    of grid2op found at https://github.com/BDonnot/Grid2Op
-
-    """
-    def __init__(self, env):
-        from grid2op.PlotGrid import PlotMatplot
-        self.plot_helper = PlotMatplot(env.observation_space)
-        self._line_attr = {"a_or", "a_ex", "p_or", "p_ex", "q_or", "q_ex", "v_or", "v_ex"}
-        self._load_attr = {"load_p", "load_q", "load_v"}
-        self._prod_attr = {"prod_p", "prod_q", "prod_v"}
-
-    def get_fig(self, attr_nm, metrics):
-        fig = None
-        try:
-            # only floating point values are supported at the moment
-            metrics = metrics.astype(np.float)
-        except Exception as exc_:
-            return None
-
-        if np.all(~np.isfinite(metrics)):
-            # no need to plot a "all nan" vector
-            return None
-
-        if attr_nm in self._prod_attr:
-            # deals generator attributes
-            self.plot_helper.assign_gen_palette(increase_gen_size=1.5)
-            fig = self.plot_helper.plot_info(gen_values=metrics, coloring="gen")
-            self.plot_helper.restore_gen_palette()
-        elif attr_nm in self._line_attr:
-            # deals with lines attributes
-            self.plot_helper.assign_line_palette()
-            fig = self.plot_helper.plot_info(line_values=metrics, coloring="line")
-            self.plot_helper.restore_line_palette()
-        return fig
-
-
 class AgentWithProxy(BaseAgent):
     """
     This class allows to easily manipulate an proxy (training et evaluating) coupled with "an actor" that allows
@@ -85,6 +49,15 @@ class AgentWithProxy(BaseAgent):
                  save_freq=int(1024)*int(64),  # model is saved every save_freq training iterations
                  ext=".h5",  # extension of the file in which you want to save the proxy
                  nb_obs_init=256,  # number of observations that are sent to the proxy to be initialized
+                 async_save=True,  # model is saved (during training) in a background thread
+                 nb_checkpoint_kept=1,  # number of checkpoints kept on the hard drive
+                 nb_thread_metrics=1,  # number of threads used to compute the metrics at the end of an evaluation
+                 nb_process_plot=0,  # number of processes used to plot the errors on the grid (0 = no other process)
+                 timing=False,  # record the time spent in each stage of the training / evaluation (see StageTimer)
+                 async_tensorboard=True,  # losses are aggregated and written in tensorboard in a background thread
+                 save_graph=True,  # save the computation graph of the proxy in tensorboard
+                 save_database=False,  # the database of the proxy is saved with the checkpoints (to resume training)
+                 fused_metrics=False,  # the default metrics are computed in one pass, in float64 (see FusedMetrics)
                  ):
         BaseAgent.__init__(self, actor.action_space)
         self.actor = actor
@@ -98,6 +71,9 @@ class AgentWithProxy(BaseAgent):
 
         # proxy part
         self._proxy = proxy
+        if timing:
+            # the timings are stored with the proxy (and saved in its metadata)
+            self._proxy.stage_timer.enabled = True
 
         # tensorboard (should be initialized after the proxy)
         if logdir is not None:
@@ -106,6 +82,13 @@ class AgentWithProxy(BaseAgent):
         else:
             self._tf_writer = None
         self.update_tensorboard = update_tensorboard
+        # if async_tensorboard, the mean / min / max of the losses over the last "update_tensorboard" training
+        # iterations are written, otherwise only the losses of the last one
+        self._tensorboard_sink = None
+        if self._tf_writer is not None and async_tensorboard:
+            self._tensorboard_sink = TensorboardSink(self._tf_writer)
+        # writer given to the proxy when it is trained (only used to save its computation graph)
+        self._graph_writer = self._tf_writer if save_graph else None
         self.save_freq = int(save_freq)
 
         # save / load
@@ -115,8 +98,16 @@ class AgentWithProxy(BaseAgent):
         else:
             self.ext = ext
         self.save_path = None
+        self.async_save = async_save
+        self.save_database = save_database
+        self._checkpoint_writer = CheckpointWriter(nb_kept=nb_checkpoint_kept)
+
+        # evaluation
+        self.nb_thread_metrics = int(nb_thread_metrics)
+        self.nb_process_plot = int(nb_process_plot)
+        self.fused_metrics = fused_metrics
 
-    def init(self, env):
+    def init(self, env, init_data=None):
         """
         Initialize this object.
 
@@ -127,33 +118,46 @@ class AgentWithProxy(BaseAgent):
         ----------
         env:
             The grid2op environment
+
+        init_data: :class:`InitDataset`
+            If not ``None``, the proxy is initialized with these data instead of running the environment (they
+            should contain all the attributes of :func:`BaseProxy.get_attr_database`)
         """
         if self.__is_init:
             return
         # if the model is in "training mode" then when need to update the proxy with some observations of the
         # environment (basically to compute the scalers for the data)
         if self.is_training:
-            # generate a few observation to init the proxy
-            obss = []
-            nb_obs = 0
-            while nb_obs <= self._nb_obs_init:
-                done = False
-                reward = env.reward_range[0]
-                obs = env.reset()
-                while not done:
-                    act = self.actor.act(obs, reward, done)
-                    obs, reward, done, info = env.step(act)
-                    if not done:
-                        nb_obs += 1
-                        obss.append(obs)
-
+            if init_data is None:
+                init_data = self._get_init_data(env, self._proxy.get_attr_database(), self._proxy._extract_obs)
             # now build the poxy
-            self._proxy.init(obss)
+            self._proxy.init(init_data)
 
         # build the model
         self._proxy.build_model()
         self.__is_init = True
 
+    def _is_init(self):
+        """whether this object (and its proxy) has been initialized"""
+        return self.__is_init
+
+    def _get_init_data(self, env, attr_names, extract_fun):
+        """
+        generate a few observation to init the proxy (only the attributes `attr_names`, extracted with
+        `extract_fun`, are kept)
+        """
+        init_data = InitDataset(attr_names, extract_fun=extract_fun, nb_row=self._nb_obs_init + 1)
+        while len(init_data) <= self._nb_obs_init:
+            done = False
+            reward = env.reward_range[0]
+            obs = env.reset()
+            while not done:
+                act = self.actor.act(obs, reward, done)
+                obs, reward, done, info = env.step(act)
+                if not done:
+                    init_data.add(obs)
+        return init_data
+
     # agent interface
     def act(self, obs, reward, done=False):
         """
@@ -181,15 +185,18 @@ class AgentWithProxy(BaseAgent):
         act: `grid2op.Action`
             The action chosen by the actor (remember the proxy does not take any decisions here)
         """
+        timer = self._proxy.stage_timer
         self.global_iter += 1
         self._store_obs(obs)
         if self.is_training:
-            batch_losses = self._proxy.train(tf_writer=self._tf_writer)
+            batch_losses = self._proxy.train(tf_writer=self._graph_writer)
             if batch_losses is not None:
                 self.train_iter += 1
                 self._save_tensorboard(batch_losses)
                 self._save_model()
-        return self.actor.act(obs, reward, done)
+        with timer.time("actor_act"):
+            res = self.actor.act(obs, reward, done)
+        return res
 
     def train(self, env, total_training_step, save_path=None, load_path=None, verbose=1):
         """
@@ -229,6 +236,9 @@ class AgentWithProxy(BaseAgent):
         self.is_training = True
         if not self.__is_init:
             self.init(env)
+        if load_path is not None:
+            self._load_database(load_path)
+        timer = self._proxy.stage_timer
         with tqdm(total=total_training_step, disable=verbose == 0) as pbar:
             # update the progress bar
             pbar.update(self.global_iter)
@@ -238,7 +248,8 @@ class AgentWithProxy(BaseAgent):
                 act = self.act(obs, reward, done)
                 # TODO handle multienv here
                 if not self._proxy.DEBUG or self.global_iter <= self._proxy.train_batch_size:
-                    obs, reward, done, info = env.step(act)
+                    with timer.time("env_step"):
+                        obs, reward, done, info = env.step(act)
                     if done:
                         obs = self._reboot(env)
                         done = False
@@ -249,10 +260,113 @@ class AgentWithProxy(BaseAgent):
                     break
 
         # save the model at the end
+        self._wait_tensorboard()
+        self.save(self.save_path)
+
+    def train_parallel(self,
+                       env,
+                       total_training_step,
+                       env_fun,
+                       actor_class,
+                       env_kwargs=None,
+                       actor_kwargs=None,
+                       nb_process=2,
+                       seed=0,
+                       chunk_size=64,
+                       save_path=None,
+                       load_path=None,
+                       verbose=1,
+                       **kwargs_collector):
+        """
+        Same as :func:`AgentWithProxy.train` but the data are generated by `nb_process` copies of the environment,
+        each running in its own process with its own actor (see :class:`ParallelCollector`).
+
+        The data extracted from the observations are stored by chunks in the database of the proxy, and the proxy
+        is trained as many times as it would have been if the data had been received one by one.
+
+        Parameters
+        ----------
+        env:
+            The environment (used in this process only to initialize the proxy).
+
+        total_training_step:
+            Total number of data that will be seen during training (see :func:`AgentWithProxy.train`)
+
+        env_fun:
+            Function used by each worker to create its environment with `env_fun(**env_kwargs)`, for example
+            :func:`leap_net.proxy.utils.create_env`. It must be picklable.
+
+        actor_class:
+            Class of the actor, each worker builds its own with `actor_class(env.action_space, **actor_kwargs)`
+
+        env_kwargs: ``dict``
+            Key word arguments used to create the environments
+
+        actor_kwargs: ``dict``
+            Key word arguments used to create the actors
+
+        nb_process: ``int``
+            Number of environments (and processes) used to generate the data
+
+        seed: ``int``
+            The worker `i` seeds its environment and its actor with `seed + i` (set to ``None`` to deactivate)
+
+        chunk_size: ``int``
+            Number of data sent at once by a worker
+
+        save_path: ``str``
+            Path where the proxy and some other data from this instance will be saved. (``None`` to deactivate it)
+
+        load_path: ``str``
+            If it is not None, data stored at the location "path" will be loaded back.
+
+        verbose: ``int``
+            Degree of verbosity. The more verbose the more information will be plotted on the command line
+
+        kwargs_collector:
+            Other key word arguments given to :class:`ParallelCollector`
+
+        """
+        self.save_path = save_path
+        if self.save_path is not None:
+            if not os.path.exists(self.save_path):
+                os.mkdir(self.save_path)
+        if load_path is not None:
+            self.load(load_path)
+        self.is_training = True
+        if not self.__is_init:
+            self.init(env)
+        if load_path is not None:
+            self._load_database(load_path)
+
+        collector = ParallelCollector(env_fun=env_fun,
+                                      env_kwargs=env_kwargs,
+                                      actor_class=actor_class,
+                                      actor_kwargs=actor_kwargs,
+                                      attr_names=self._proxy.get_attr_database(),
+                                      nb_process=nb_process,
+                                      seed=seed,
+                                      chunk_size=chunk_size,
+                                      dtype=self._proxy.dtype,
+                                      extract_fun=self._proxy.get_extract_fun(),
+                                      **kwargs_collector)
+        with collector, tqdm(total=total_training_step, disable=verbose == 0) as pbar:
+            # update the progress bar
+            pbar.update(self.global_iter)
+            while self.global_iter < total_training_step:
+                with self._proxy.stage_timer.time("collect"):
+                    data = collector.get()
+                nb_row = min(self._proxy.get_batch_size(data), total_training_step - self.global_iter)
+                data = {attr_nm: arr_[:nb_row] for attr_nm, arr_ in data.items()}
+                self._store_batch(data)
+                pbar.update(nb_row)
+
+        # save the model at the end
+        self._wait_tensorboard()
         self.save(self.save_path)
 
     def evaluate(self, env, total_evaluation_step, load_path, save_path=None, metrics=None,
-                 verbose=0, save_values=True):
+                 verbose=0, save_values=True, streaming=False):
         """
         This is a function to evaluate the performance of a proxy.
 
@@ -271,7 +385,9 @@ class AgentWithProxy(BaseAgent):
 
         metrics:
             dictionary of function, with keys being the metrics name, and values the function that compute
-            this metric (on the whole output) that should be `metric_fun(y_true, y_pred)`
+            this metric (on the whole output) that should be `metric_fun(y_true, y_pred)`. Values can also be
+            :class:`leap_net.metrics.BaseMetricAccumulator` (see `leap_net.proxy.STREAMING_METRICS`), in this
+            case the metric is updated after each batch of predictions and never computed on the whole arrays.
 
         save_path: ``str``
             Path where the results of the models are stored. This is not the same as the "save_path" argument
@@ -283,6 +399,13 @@ class AgentWithProxy(BaseAgent):
         save_values: ``bool``
             Do you save the computed values (prediction of the proxy AND ground truth) or just the metrics
 
+        streaming: ``bool``
+            If ``True`` the predictions and the ground truth are not kept in memory but are written, as they
+            are computed, in ".npy" files that are memory mapped (directly in `save_path` if the values are
+            saved, in a temporary directory otherwise). Combined with a proxy whose database is small (
+            for example `max_row_training_set=eval_batch_size=1024`) the memory used by the evaluation
+            does not depend on `total_evaluation_step`.
+
         Returns
         -------
         res: ``dict``
@@ -305,11 +428,14 @@ class AgentWithProxy(BaseAgent):
         self.load(load_path)
         self.global_iter = 0
         self.train_iter = 0
+        # only the timings of this evaluation are reported
+        timer = self._proxy.stage_timer
+        timer.reset()
 
-        # TODO find a better approach for more general proxy that can adapt to grid of different size
-        sizes = self._proxy.get_output_sizes()
-        true_val = [np.zeros((total_evaluation_step, el), dtype=self._proxy.dtype) for el in sizes]
-        pred_val = [np.zeros((total_evaluation_step, el), dtype=self._proxy.dtype) for el in sizes]
+        pred_val, true_val, path_tmp = self._get_result_arrays(total_evaluation_step, save_path, save_values,
+                                                               streaming)
+
+        accumulators = self._get_accumulators(metrics)
 
         if not self.__is_init:
             self.init(env)
@@ -323,7 +449,8 @@ class AgentWithProxy(BaseAgent):
                 act = self.act(obs, reward, done)
 
                 # save the predictions and the reference
-                predictions = self._proxy.predict(force=self.global_iter == total_evaluation_step)
+                with timer.time("predict"):
+                    predictions = self._proxy.predict(force=self.global_iter == total_evaluation_step)
                 if predictions is not None:
                     for arr_, pred_ in zip(pred_val, predictions):
                         sz = pred_.shape[0]
@@ -334,8 +461,13 @@ class AgentWithProxy(BaseAgent):
                 for arr_, ref_ in zip(true_val, reality):
                     arr_[self.global_iter-1, :] = ref_.reshape(-1)
 
+                if predictions is not None:
+                    # ground truth of the predicted rows is now known
+                    self._update_accumulators(accumulators, pred_val, true_val, min_, self.global_iter)
+
                 # TODO handle multienv here (this might be more complicated!)
-                obs, reward, done, info = env.step(act)
+                with timer.time("env_step"):
+                    obs, reward, done, info = env.step(act)
                 if done:
                     obs = self._reboot(env)
                     done = False
@@ -344,13 +476,181 @@ class AgentWithProxy(BaseAgent):
                     break
         # save the results and compute the metrics
         # TODO save the real x's too!
-        return self._save_results(obs, save_path, metrics, pred_val, true_val, verbose, save_values, error_plot)
+        return self._finish_evaluation(obs, save_path, metrics, pred_val, true_val, verbose, save_values,
+                                       error_plot, streaming, path_tmp, accumulators)
+
+    def record(self, env, total_evaluation_step, path, load_path=None, attr_names=None, metadata=None, verbose=0):
+        """
+        Record the data that would be seen by the proxy during an evaluation (see :func:`AgentWithProxy.evaluate`)
+        on the hard drive. Any number of proxies can then be evaluated on these data with
+        :func:`AgentWithProxy.evaluate_recorded` without running the environment again.
+
+        Make sure to seed the environment and the actor (for example with
+        :func:`leap_net.proxy.utils.reproducible_exp`) before calling this method.
+
+        Parameters
+        ----------
+        env:
+            The grid2op environment used
+
+        total_evaluation_step: ``int``
+            Total number of states recorded
+
+        path: ``str``
+            Where the data will be stored (see :func:`RecordedDataset.get_path`)
+
+        load_path: ``str``
+            If not ``None``, the metadata of the proxy are loaded from there first (to know which attributes the
+            proxy uses)
+
+        attr_names:
+            Attributes to record. By default all the attributes stored in the database of the proxy (see
+            :func:`BaseProxy.get_attr_database`)
+
+        metadata: ``dict``
+            Other information (json serializable) stored with the data, for example the seeds used.
+
+        verbose: ``int``
+            Degrees of verbosity
+
+        Returns
+        -------
+        res: :class:`RecordedDataset`
+            The recorded dataset
+
+        """
+        if load_path is not None:
+            self._load_metadata(CheckpointWriter.get_checkpoint_path(load_path))
+        if attr_names is None:
+            attr_names = self._proxy.get_attr_database()
+        me = {"env_name": str(env.name) if hasattr(env, "name") else None,
+              "actor": type(self.actor).__name__}
+        if metadata is not None:
+            me.update(metadata)
+        return RecordedDataset.record(env,
+                                      self.actor,
+                                      nb_rows=total_evaluation_step,
+                                      path=path,
+                                      attr_names=attr_names,
+                                      dtype=self._proxy.dtype,
+                                      extract_fun=self._proxy._extract_obs,
+                                      metadata=me,
+                                      verbose=verbose)
+
+    def evaluate_recorded(self, dataset, load_path, total_evaluation_step=None, save_path=None, metrics=None,
+                          verbose=0, save_values=True, streaming=False, env=None):
+        """
+        Same as :func:`AgentWithProxy.evaluate` but the proxy is evaluated on data previously recorded with
+        :func:`AgentWithProxy.record` instead of running the environment.
+
+        The data are given to the proxy by batches of `eval_batch_size` rows.
+
+        Notes
+        -----
+        The ground truth is read from the recorded attributes `attr_y` of the proxy, so this method cannot be used
+        with proxies that override :func:`BaseProxy.get_true_output`.
+
+        Parameters
+        ----------
+        dataset: :class:`RecordedDataset` or ``str``
+            The recorded data (or the path where they are stored)
+
+        load_path:
+            Path from which the proxy will be loaded.
+
+        total_evaluation_step:
+            Total number of states the proxy will be evaluated on (by default all the recorded states)
+
+        save_path: ``str``
+            Path where the results of the models are stored.
+
+        metrics:
+            dictionary of function, with keys being the metrics name, and values the function that compute
+            this metric (see :func:`AgentWithProxy.evaluate`)
+
+        verbose: ``int``
+            Degrees of verbosity
+
+        save_values: ``bool``
+            Do you save the computed values (prediction of the proxy AND ground truth) or just the metrics
+
+        streaming: ``bool``
+            See :func:`AgentWithProxy.evaluate`
+
+        env:
+            The grid2op environment, only used to plot the errors on the grid (optional)
+
+        Returns
+        -------
+        res: ``dict``
+            The dictionary containing the values of each metrics defined in "metrics" for each output variable
+            of the proxy.
+
+        """
+        if not isinstance(dataset, RecordedDataset):
+            dataset = RecordedDataset(dataset)
+        error_plot = None
+        if env is not None:
+            try:
+                error_plot = PlotErrorOnGrid(env)
+            except Exception as exc_:
+                # plotting will not be available, but this is not a reason to crash
+                pass
+
+        self.is_training = False
+        self.save_path = None  # disable the saving of the model
+
+        self.load(load_path)
+        self.global_iter = 0
+        self.train_iter = 0
+        # only the timings of this evaluation are reported
+        timer = self._proxy.stage_timer
+        timer.reset()
+
+        if total_evaluation_step is None:
+            total_evaluation_step = dataset.nb_rows
+        if total_evaluation_step > dataset.nb_rows:
+            raise RuntimeError(f"Impossible to evaluate the proxy on {total_evaluation_step} states, only "
+                               f"{dataset.nb_rows} have been recorded.")
+
+        pred_val, true_val, path_tmp = self._get_result_arrays(total_evaluation_step, save_path, save_values,
+                                                               streaming)
+
+        accumulators = self._get_accumulators(metrics)
+
+        if not self.__is_init:
+            self.init(env)
+        attr_names = self._proxy.get_attr_database()
+        batch_size = self._proxy.eval_batch_size
+        with tqdm(total=total_evaluation_step, disable=verbose == 0) as pbar:
+            for beg_ in range(0, total_evaluation_step, batch_size):
+                end_ = min(beg_ + batch_size, total_evaluation_step)
+                with timer.time("read_dataset"):
+                    data = dataset.get_rows(attr_names, beg_, end_)
+                self._store_batch(data)
+                with timer.time("predict"):
+                    predictions = self._proxy.predict(force=True)
+                for arr_, pred_ in zip(pred_val, predictions):
+                    arr_[beg_:end_, :] = pred_
+                for arr_, attr_nm in zip(true_val, self._proxy.attr_y):
+                    arr_[beg_:end_, :] = data[attr_nm]
+                self._update_accumulators(accumulators, pred_val, true_val, beg_, end_)
+                pbar.update(end_ - beg_)
+
+        return self._finish_evaluation(None, save_path, metrics, pred_val, true_val, verbose, save_values,
+                                       error_plot, streaming, path_tmp, accumulators)
 
     def save(self, path):
         """
         Part of the l2rpn_baselines interface, this allows to save a model. Its name is used at saving time. The
         same name must be reused when loading it back.
 
+        The files are first written in a temporary directory which is then published, in one atomic step, as the
+        last checkpoint (see :class:`CheckpointWriter`).
+
+        If this instance has been created with `save_database=True`, the database of the proxy is saved too
+        during training (see :func:`BaseProxy.save_database`) and it is restored when the training is resumed.
+
         Parameters
         ----------
         path: ``str``
@@ -359,10 +659,46 @@ class AgentWithProxy(BaseAgent):
         """
         if path is not None:
             path_save = os.path.join(path, self.get_name())
-            if not os.path.exists(path_save):
-                os.mkdir(path_save)
-            self._save_metadata(path_save)
-            self._proxy.save_data(path=path_save, ext=self.ext)
+
+            save_database = self._must_save_database()
+
+            def write_fun(path_tmp):
+                self._save_metadata(path_tmp)
+                self._proxy.save_data(path=path_tmp, ext=self.ext)
+                if save_database:
+                    self._proxy.save_database(path_tmp)
+            self._checkpoint_writer.write(path_save, write_fun, iteration=self.train_iter, asynchronous=False)
+
+    def save_async(self, path):
+        """
+        Same as :func:`AgentWithProxy.save` but only a copy of the metadata and the data of the proxy (for example
+        the weights of the neural network) is made in the calling thread. They are written in a background
+        thread (see :func:`BaseProxy.get_data_snapshot`).
+
+        Parameters
+        ----------
+        path: ``str``
+            The path where to save the agent.
+
+        """
+        if path is not None:
+            path_save = os.path.join(path, self.get_name())
+            # wait for the last checkpoint before taking a snapshot (the proxy might reuse some buffers)
+            self._checkpoint_writer.wait()
+            metadata = self._get_metadata()
+            snapshot = self._proxy.get_data_snapshot()
+            db_snapshot = self._proxy.get_database_snapshot() if self._must_save_database() else None
+
+            def write_fun(path_tmp):
+                self._write_metadata(path_tmp, metadata)
+                self._proxy.save_data_snapshot(snapshot, path=path_tmp, ext=self.ext)
+                if db_snapshot is not None:
+                    self._proxy.save_database_snapshot(db_snapshot, path_tmp)
+            self._checkpoint_writer.write(path_save, write_fun, iteration=self.train_iter, asynchronous=True)
+
+    def wait_save(self):
+        """wait for the checkpoint that is being written in the background (if any)"""
+        self._checkpoint_writer.wait()
 
     def load(self, path):
         """
@@ -384,9 +720,10 @@ class AgentWithProxy(BaseAgent):
                 path_model = path
             if not os.path.exists(path_model):
                 raise RuntimeError(f"You asked to load a model at \"{path_model}\" but there is nothing there.")
+            path_model = CheckpointWriter.get_checkpoint_path(path_model)
             self._load_metadata(path_model)
             self._proxy.build_model()
-            self._proxy.load_data(path=path, ext=self.ext)
+            self._proxy.load_data(path=path_model, ext=self.ext)
 
     def get_name(self):
         """get the name of this experiment, that by definition (for now) is the name given to the proxy"""
@@ -405,7 +742,36 @@ class AgentWithProxy(BaseAgent):
             The current observation
 
         """
-        self._proxy.store_obs(obs)
+        with self._proxy.stage_timer.time("store_obs"):
+            self._proxy.store_obs(obs)
+
+    def _store_batch(self, data):
+        """
+        Utility function that store multiple data (already extracted from the observations) in the proxy and
+        train it as many time as it would have been trained if the data were given one by one with
+        :func:`AgentWithProxy.act`.
+
+        Parameters
+        ----------
+        data: ``dict``
+            The data, see :func:`BaseProxy.store_batch`
+
+        """
+        nb_row = self._proxy.get_batch_size(data)
+        global_iter_before = self._proxy.get_global_iter()
+        self.global_iter += nb_row
+        with self._proxy.stage_timer.time("store_batch"):
+            self._proxy.store_batch(data)
+        if not self.is_training:
+            return
+        nb_train = self._proxy.get_global_iter() // self._proxy.train_batch_size
+        nb_train -= global_iter_before // self._proxy.train_batch_size
+        for _ in range(nb_train):
+            batch_losses = self._proxy.train(tf_writer=self._graph_writer, force=True)
+            if batch_losses is not None:
+                self.train_iter += 1
+                self._save_tensorboard(batch_losses)
+                self._save_model()
 
     # save load model
     def _get_path_nn(self, path, name):
@@ -416,11 +782,28 @@ class AgentWithProxy(BaseAgent):
             path_model = os.path.join(path, name)
         return path_model
 
+    def _must_save_database(self):
+        """the database is saved with the checkpoints made during training only"""
+        return self.save_database and self.is_training
+
+    def _load_database(self, path):
+        """restore the database of the proxy saved with the model at `path` (if any)"""
+        path_model = self._get_path_nn(path, self.get_name())
+        self._proxy.load_database(CheckpointWriter.get_checkpoint_path(path_model))
+
     def _save_metadata(self, path_model):
         """save the dimensions of the models and the scalers"""
-        json_nm = "metadata.json"
+        self._write_metadata(path_model, self._get_metadata())
+
+    def _get_metadata(self):
+        """get the metadata of the experiments (both for me and for the proxy)"""
         me = self._to_dict()
         me["proxy"] = self._proxy.get_metadata()
+        return me
+
+    def _write_metadata(self, path_model, me):
+        """write the metadata in the "metadata.json" file"""
+        json_nm = "metadata.json"
         with open(os.path.join(path_model, json_nm), "w", encoding="utf-8") as f:
             json.dump(obj=me, fp=f)
 
@@ -449,23 +832,54 @@ class AgentWithProxy(BaseAgent):
         if self._tf_writer is None:
             return
 
+        timer = self._proxy.stage_timer
+        if self._tensorboard_sink is not None:
+            with timer.time("tensorboard"):
+                # the losses are written (in the background) every "update_tensorboard" training iterations
+                self._tensorboard_sink.add("0_global_loss", batch_losses[0], "Loss of the entire model")
+                for name, value, description in self._proxy.get_tensorboard_scalars(batch_losses[1:]):
+                    self._tensorboard_sink.add(name, value, description)
+                if self.train_iter % self.update_tensorboard == 0:
+                    self._flush_tensorboard()
+            return
+
         # Log some useful metrics every even updates
         if self.train_iter % self.update_tensorboard == 0:
-            with self._tf_writer.as_default():
+            with timer.time("tensorboard"), self._tf_writer.as_default():
                 # save total loss
                 tf.summary.scalar(f"0_global_loss",
                                   batch_losses[0],
                                   self.train_iter,
                                   description="Loss of the entire model")
                 self._proxy.save_tensorboard(self._tf_writer, self.train_iter, batch_losses[1:])
+                if timer.enabled:
+                    timer.save_tensorboard(self._tf_writer, self.train_iter)
+
+    def _flush_tensorboard(self):
+        """write in tensorboard (in a background thread) the losses aggregated since the last flush"""
+        timer = self._proxy.stage_timer
+        scalars = timer.get_tensorboard_scalars() if timer.enabled else None
+        self._tensorboard_sink.flush(self.train_iter, scalars)
+
+    def _wait_tensorboard(self):
+        """write the last losses (if any) in tensorboard and wait for them to be written"""
+        if self._tensorboard_sink is None:
+            return
+        if not self._tensorboard_sink.is_empty():
+            self._flush_tensorboard()
+        self._tensorboard_sink.wait()
 
     def _save_model(self):
         """trigger the saving of the model"""
         if self.train_iter % self.save_freq == 0:
-            self.save(self.save_path)
+            with self._proxy.stage_timer.time("save"):
+                if self.async_save:
+                    self.save_async(self.save_path)
+                else:
+                    self.save(self.save_path)
 
     def _save_results(self, obs, save_path, metrics, pred_val, true_val, verbose,
-                      save_values=True, error_plot=None):
+                      save_values=True, error_plot=None, accumulators=None):
         """
         This function will save the results of the evaluation of the proxy in multiple form:
 
@@ -489,6 +903,9 @@ class AgentWithProxy(BaseAgent):
             Do I save the arrays (of true and predicted values). If ``False`` only the json is saved
         error_plot:
             Utility to plot the error on the grid in a matplotlib figures
+        accumulators: ``dict``
+            The metrics (key: metric name, value: one accumulator per output) that have been updated during the
+            evaluation and that are not computed again on the whole arrays
 
         Returns
         -------
@@ -502,12 +919,17 @@ class AgentWithProxy(BaseAgent):
         dict_metrics["predict_time"] = float(self._proxy.get_total_predict_time())
         dict_metrics["avg_pred_time_s"] = float(self._proxy.get_total_predict_time()) / float(self.global_iter)
 
+        timer = self._proxy.stage_timer
         if metrics is not None:
             array_names = self._proxy.get_attr_output_name(obs)
-            for metric_name, metric_fun in metrics.items():
+            with timer.time("compute_metrics"):
+                metrics_values = self._compute_metrics(metrics, pred_val, true_val, accumulators)
+            li_figs = []
+            if error_plot is not None and save_path is not None:
+                save_path_fig = os.path.join(save_path, self.get_name())
+            for metric_name in metrics.keys():
                 dict_metrics[metric_name] = {}
-                for nm, pred_, true_ in zip(array_names, pred_val, true_val):
-                    tmp = metric_fun(true_, pred_)
+                for nm, tmp in zip(array_names, metrics_values[metric_name]):
                     # print the results and make sure the things are json serializable
                     if isinstance(tmp, Iterable):
                         if verbose >= 2:
@@ -515,19 +937,24 @@ class AgentWithProxy(BaseAgent):
                         dict_metrics[metric_name][nm] = [float(el) for el in tmp]
 
                         # plot the error on the grid layout
-                        if error_plot is not None and save_path is not None and MATPLOT_OK:
-                            fig = error_plot.get_fig(nm, tmp)
-                            if fig is not None:
-                                save_path_fig = os.path.join(save_path, self.get_name())
-                                if not os.path.exists(save_path_fig):
-                                    os.mkdir(save_path_fig)
-                                fig.savefig(os.path.join(save_path_fig, f"{metric_name}_{nm}.pdf"))
-                                plt.close(fig)
+                        if error_plot is not None and save_path is not None:
+                            li_figs.append((nm, tmp, os.path.join(save_path_fig, f"{metric_name}_{nm}.pdf")))
                     else:
                         if verbose >=1:
                             print(f"{metric_name} for {nm}: {tmp:.2f}")
                         dict_metrics[metric_name][nm] = float(tmp)
 
+            if li_figs:
+                if not os.path.exists(save_path):
+                    os.mkdir(save_path)
+                if not os.path.exists(save_path_fig):
+                    os.mkdir(save_path_fig)
+                with timer.time("plot_errors"):
+                    error_plot.save_figs(li_figs, nb_process=self.nb_process_plot)
+
+        if timer.enabled:
+            dict_metrics["stage_timings"] = timer.get_summary()
+
         # save the numpy arrays (if needed)
         if save_path is not None:
             # save the proxy and the meta data
@@ -547,15 +974,152 @@ class AgentWithProxy(BaseAgent):
                 json.dump(dict_metrics, fp=f, indent=4, sort_keys=True)
         return dict_metrics
 
+    def _compute_metrics(self, metrics, pred_val, true_val, accumulators=None):
+        """
+        Compute the value of all the metrics for all the outputs of the proxy.
+
+        If `fused_metrics` is ``True``, the metrics of `DEFAULT_METRICS` are computed together (see
+        :func:`AgentWithProxy._compute_fused_metrics`), the other ones are computed by a pool of `nb_thread_metrics`
+        threads.
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the metric names, values are the list of the results for each output
+        """
+        fused_metrics, fused_res = self._compute_fused_metrics(metrics, pred_val, true_val, accumulators)
+        res = {}
+        to_compute = []
+        for metric_name, metric_fun in metrics.items():
+            res[metric_name] = [None for _ in pred_val]
+            for out_id, (pred_, true_) in enumerate(zip(pred_val, true_val)):
+                if accumulators is not None and metric_name in accumulators:
+                    res[metric_name][out_id] = accumulators[metric_name][out_id].result()
+                elif metric_name in fused_metrics:
+                    kind, multioutput = fused_metrics[metric_name]
+                    res[metric_name][out_id] = FusedMetrics.get(fused_res[out_id], kind, multioutput)
+                else:
+                    to_compute.append((metric_name, out_id, metric_fun, true_, pred_))
+
+        if self.nb_thread_metrics > 1 and len(to_compute) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.nb_thread_metrics, len(to_compute))) as executor:
+                li_res = list(executor.map(lambda el: el[2](el[3], el[4]), to_compute))
+        else:
+            li_res = [metric_fun(true_, pred_) for _, _, metric_fun, true_, pred_ in to_compute]
+        for (metric_name, out_id, *_), tmp in zip(to_compute, li_res):
+            res[metric_name][out_id] = tmp
+        return res
+
+    def _compute_fused_metrics(self, metrics, pred_val, true_val, accumulators=None):
+        """
+        Compute, in one pass over the data of each output, all the metrics of `DEFAULT_METRICS` that are in
+        `metrics` (see :class:`leap_net.metrics.FusedMetrics`).
+
+        The statistics are accumulated in float64 (by chunks): the results can differ slightly from the ones of the
+        metric functions (relative difference of the order of 1e-6 on float32 data) and are always float64. This is
+        why it is only done if `fused_metrics` is ``True``.
+
+        Returns
+        -------
+        fused_metrics: ``dict``
+            For each metric name that has been computed, the kind of metric and the "multioutput"
+
+        fused_res: ``list``
+            The result of :func:`FusedMetrics.compute` for each output
+        """
+        fused_metrics = {}
+        if not self.fused_metrics:
+            return fused_metrics, None
+        for metric_name, metric_fun in metrics.items():
+            if accumulators is not None and metric_name in accumulators:
+                continue
+            if isinstance(metric_fun, BaseMetricAccumulator):
+                continue
+            try:
+                if metric_fun in FUSED_METRICS:
+                    fused_metrics[metric_name] = FUSED_METRICS[metric_fun]
+            except TypeError:
+                # metric_fun is not hashable, it cannot be one of the default metrics
+                pass
+        fused_res = None
+        if fused_metrics:
+            fused_res = FusedMetrics().compute_many(true_val, pred_val, nb_thread=self.nb_thread_metrics)
+        return fused_metrics, fused_res
+
+    def _get_result_arrays(self, total_evaluation_step, save_path, save_values, streaming):
+        """
+        Create the arrays in which the predictions and the ground truth are stored during the evaluation.
+
+        If `streaming` is ``True`` they are memory mapped ".npy" files, stored in the result directory (if the
+        values are saved) or in a temporary directory (returned as `path_tmp` to be removed at the end).
+        """
+        # TODO find a better approach for more general proxy that can adapt to grid of different size
+        sizes = self._proxy.get_output_sizes()
+        path_tmp = None
+        if streaming:
+            array_names = self._proxy.get_attr_output_name(obs=None)
+            if save_path is not None and save_values:
+                path_values = os.path.join(save_path, self.get_name())
+                if not os.path.exists(save_path):
+                    os.mkdir(save_path)
+                if not os.path.exists(path_values):
+                    os.mkdir(path_values)
+            else:
+                path_tmp = tempfile.mkdtemp(prefix="leap_net_eval_")
+                path_values = path_tmp
+            true_val = [np.lib.format.open_memmap(os.path.join(path_values, f"{nm}_real.npy"),
+                                                  mode="w+",
+                                                  dtype=self._proxy.dtype,
+                                                  shape=(total_evaluation_step, el))
+                        for el, nm in zip(sizes, array_names)]
+            pred_val = [np.lib.format.open_memmap(os.path.join(path_values, f"{nm}_pred.npy"),
+                                                  mode="w+",
+                                                  dtype=self._proxy.dtype,
+                                                  shape=(total_evaluation_step, el))
+                        for el, nm in zip(sizes, array_names)]
+        else:
+            true_val = [np.zeros((total_evaluation_step, el), dtype=self._proxy.dtype) for el in sizes]
+            pred_val = [np.zeros((total_evaluation_step, el), dtype=self._proxy.dtype) for el in sizes]
+        return pred_val, true_val, path_tmp
+
+    def _finish_evaluation(self, obs, save_path, metrics, pred_val, true_val, verbose, save_values, error_plot,
+                           streaming, path_tmp, accumulators=None):
+        """compute the metrics and save the results at the end of the evaluation"""
+        if streaming:
+            for arr_ in pred_val + true_val:
+                arr_.flush()
+            # values are already stored at the right place if needed
+            res = self._save_results(obs, save_path, metrics, pred_val, true_val, verbose,
+                                     save_values=False, error_plot=error_plot, accumulators=accumulators)
+            del pred_val, true_val
+            if path_tmp is not None:
+                shutil.rmtree(path_tmp, ignore_errors=True)
+        else:
+            res = self._save_results(obs, save_path, metrics, pred_val, true_val, verbose, save_values, error_plot,
+                                     accumulators=accumulators)
+        return res
+
+    def _get_accumulators(self, metrics):
+        """
+        Create one (empty) accumulator per output of the proxy for each metric given as a
+        :class:`leap_net.metrics.BaseMetricAccumulator`
+        """
+        accumulators = {}
+        if metrics is None:
+            return accumulators
+        nb_output = len(self._proxy.get_output_sizes())
+        for metric_name, metric_fun in metrics.items():
+            if isinstance(metric_fun, BaseMetricAccumulator):
+                accumulators[metric_name] = [metric_fun.new() for _ in range(nb_output)]
+        return accumulators
+
+    def _update_accumulators(self, accumulators, pred_val, true_val, beg_, end_):
+        """update all the accumulators with the rows `beg_` (included) to `end_` (excluded) of the results"""
+        for li_acc in accumulators.values():
+            for acc, pred_, true_ in zip(li_acc, pred_val, true_val):
+                acc.update(true_[beg_:end_], pred_[beg_:end_])
+
     def _reboot(self, env):
         """when an environment is "done" this function reset it and act a first time with the agent_action"""
-        # TODO skip and random start at some steps
-        done = False
-        reward = env.reward_range[0]
-        obs = env.reset()
-        obs, reward, done, info = env.step(self.actor.act(obs, reward, done))
-        while done:
-            # we restart until we find an environment that is not "game over"
-            obs = env.reset()
-            obs, reward, done, info = env.step(self.actor.act(obs, reward, done))
+        obs, reward, done = reboot(env, self.actor)
         return obs
@@ -9,8 +9,6 @@
 import copy
 import time
 import warnings
-import shutil
-import tempfile
 
 import os
 import numpy as np
@@ -43,8 +41,9 @@ class BaseNNProxy(BaseProxy):
         The learning rate (discarded when the proxy do not need to be learned)
 
     _layer_fun: ``tensorflow.keras.layers``
-        The "function" representing each layers. Be careful, this is not serialized and so if you want to
-        save / reload the model, you need to specify the same function manually.
+        The "function" representing each layers. It is serialized (by its keras registered name) only if it is
+        registered as a keras serializable object (for example :class:`leap_net.ResNetLayer`), otherwise if you
+        want to save / reload the model, you need to specify the same function manually.
 
     _layer_act: ``str``
         The activation function of each layers. Should be a string.
@@ -92,6 +91,8 @@ class BaseNNProxy(BaseProxy):
                                "(hint: batch_size>=max_row_training_set).")
 
         self.__need_save_graph = True  # save the tensorflow computation graph
+        self._shadow_model = None  # copy of the model used to save the weights in the background
+        self._shadow_source = None  # the model the shadow model is a copy of
 
     def _make_predictions(self, data, training=False):
         """
@@ -153,6 +154,14 @@ class BaseNNProxy(BaseProxy):
 
         self._time_train = float(dict_["_time_train"])
         self._time_predict = float(dict_["_time_predict"])
+        if "_layer" in dict_:
+            layer = tf.keras.utils.get_registered_object(str(dict_["_layer"]))
+            if layer is not None:
+                self._layer_fun = layer
+            else:
+                warnings.warn(f"Impossible to find the layer \"{dict_['_layer']}\" used by the saved model, "
+                              f"make sure the module defining it is imported. The layer given when the proxy "
+                              f"was created is used instead.")
 
         self._init_database_shapes()
         super().load_metadata(dict_)
@@ -181,9 +190,24 @@ class BaseNNProxy(BaseProxy):
         else:
             # i don't store anything if it's None
             pass
+        layer_name = self._get_layer_name()
+        if layer_name is not None:
+            res["_layer"] = layer_name
+        else:
+            # the layer is a Dense or cannot be retrieved from its name
+            pass
 
         return res
 
+    def _get_layer_name(self):
+        """keras registered name of the layer used (None if it is a Dense or if it is not registered)"""
+        if self._layer_fun is Dense or not isinstance(self._layer_fun, type):
+            return None
+        name = tf.keras.utils.get_registered_name(self._layer_fun)
+        if tf.keras.utils.get_registered_object(name) is not self._layer_fun:
+            return None
+        return name
+
     def save_data(self, path, ext=".h5"):
         """
         Save extra information that might be required by the model. For example this saves the weights of
@@ -227,19 +251,32 @@ class BaseNNProxy(BaseProxy):
 
         We suppose that there is a "." preceding the extension. So ext=".h5" is valid, but not ext="h5"
 
-        We recommend that the file at the "path" is not directly read.
-        Rather, it is better to first copied it into a temporary directory, and then
-        read it. This is to avoid any data corruption when an instance of the model is reading and another
-        is writing to the same file.
+        `AgentWithProxy` gives the directory of a complete checkpoint (see `CheckpointWriter`) so the files are
+        read directly.
+
+        """
+        self._model.load_weights(os.path.join(path, f"weights{ext}"))
+
+    def get_data_snapshot(self):
+        """
+        Copy the weights of the neural network (this is done in the training thread).
+
+        The "shadow" model, on which the weights are written in the background thread, is created the first
+        time this function is called (and again each time the model is rebuilt).
+        """
+        if self._shadow_model is None or self._shadow_source is not self._model:
+            self._shadow_model = tf.keras.models.clone_model(self._model)
+            self._shadow_source = self._model
+        return self._model.get_weights()
 
+    def save_data_snapshot(self, snapshot, path, ext=".h5"):
         """
-        with tempfile.TemporaryDirectory() as path_tmp:
-            nm_file = f"weights{ext}"
-            nm_tmp = os.path.join(path_tmp, nm_file)
-            # copy the weights into this file
-            shutil.copy(os.path.join(path, nm_file), nm_tmp)
-            # load this copy (make sure the proper file is not corrupted)
-            self._model.load_weights(nm_tmp)
+        Save the weights copied by `get_data_snapshot` (this is done in a background thread).
+
+        Only the weights are saved (and not the state of the optimizer)
+        """
+        self._shadow_model.set_weights(snapshot)
+        self._shadow_model.save_weights(os.path.join(path, f"weights{ext}"))
 
     def _train_model(self, data):
         """
@@ -293,14 +330,19 @@ class BaseNNProxy(BaseProxy):
 
         In this case i save all the losses for all individual output
         """
-        for output_nm, loss in zip(self.attr_y, batch_losses):
-            tf.summary.scalar(f"{output_nm}", loss, training_iter,
-                              description=f"MSE for {output_nm}")
+        for name, value, description in self.get_tensorboard_scalars(batch_losses):
+            tf.summary.scalar(name, value, training_iter, description=description)
+
+    def get_tensorboard_scalars(self, batch_losses):
+        """
+        the losses for all individual output (see :func:`BaseProxy.get_tensorboard_scalars`)
+        """
+        return [(f"{output_nm}", loss, f"MSE for {output_nm}") for output_nm, loss in zip(self.attr_y, batch_losses)]
 
     #######################################################
     ## We don't recommend to change anything bellow this ##
     #######################################################
-    def train(self, tf_writer=None):
+    def train(self, tf_writer=None, force=False):
         """
         Train the proxy (if tf_writer is not None, it is expected that the proxy save the computation graph
 
@@ -310,11 +352,15 @@ class BaseNNProxy(BaseProxy):
         ----------
         tf_writer
 
+        force: ``bool``
+            Whether to force the training or not (by default the proxy is trained once every `train_batch_size`
+            data received). This is used when data are stored by batch with :func:`BaseProxy.store_batch`.
+
         Returns
         -------
         None if the proxy has not been trained at this iteration, or the losses
         """
-        if self._global_iter % self.train_batch_size != 0:
+        if (self._global_iter % self.train_batch_size != 0) and (not force):
             return None
 
         if self._is_db_full():
@@ -331,14 +377,16 @@ class BaseNNProxy(BaseProxy):
         if self.DEBUG:
             indx_train = np.arange(self.train_batch_size)
 
-        data = self._extract_data(indx_train)
+        with self.stage_timer.time("extract_data"):
+            data = self._extract_data(indx_train)
 
         # for el in data[1]: print(np.mean(el))
         if tf_writer is not None and self.__need_save_graph:
             tf.summary.trace_on()
 
         beg_ = time.time()
-        batch_losses = self._train_model(data)
+        with self.stage_timer.time("train_on_batch"):
+            batch_losses = self._train_model(data)
         self._time_train += time.time() - beg_
         if tf_writer is not None and self.__need_save_graph:
             with tf_writer.as_default():
@@ -7,12 +7,21 @@
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
 import os
+import json
 import time
 import copy
 import numpy as np
 from abc import ABC, abstractmethod
 from collections.abc import Iterable
 
+from leap_net.proxy.StageTimer import StageTimer
+from leap_net.proxy.InitDataset import InitDataset
+
+
+def extract_attr(obs, attr_nm):
+    """default way to extract an attribute from an observation (see :func:`BaseProxy._extract_obs`)"""
+    return getattr(obs, attr_nm)
+
 
 class BaseProxy(ABC):
     """
@@ -57,6 +66,10 @@ class BaseProxy(ABC):
         Time spent (measured in seconds) to train the proxy, only counting the training time and not the time
         spent in acquiring the data.
 
+    stage_timer: :class:`StageTimer`
+        Time spent in the different stages of the training and of the predictions (disabled by default, it is
+        enabled by `AgentWithProxy` when created with `timing=True`)
+
     attr_x: ``list`` of ``str``
         Name of the attribute sof the observation that are used as input to the proxy
 
@@ -89,6 +102,7 @@ class BaseProxy(ABC):
 
     """
     DEBUG = False
+    DATABASE_JSON = "database.json"
 
     def __init__(self,
                  name,
@@ -124,6 +138,7 @@ class BaseProxy(ABC):
         # timers
         self._time_predict = 0
         self._time_train = 0
+        self.stage_timer = StageTimer()
 
         # for the prediction
         self._last_id_eval = 0
@@ -199,14 +214,15 @@ class BaseProxy(ABC):
 
         Parameters
         ----------
-        obss: ``list`` of ``grid2op.Observation``
+        obss: ``list`` of ``grid2op.Observation`` or :class:`InitDataset`
             List of observations used to inialize this model, for example on which the model will compute the mean
-            and standard deviation to scale the data.
+            and standard deviation to scale the data. It can also be the attributes already extracted from
+            these observations (see :class:`InitDataset`), in this case use `_get_init_size`,
+            `_get_init_values` and `_get_init_first_obs` to access the data.
 
         """
 
         self.__db_full = False
-        obs = obss[0]
         # save the input x
         self._my_x = []
         self._sz_x = []
@@ -215,13 +231,9 @@ class BaseProxy(ABC):
 
         # init the dimension of everything
         for attr_nm in self.attr_x:
-            arr_ = self._extract_obs(obs, attr_nm)
-            sz = arr_.size
-            self._sz_x.append(sz)
+            self._sz_x.append(self._get_init_size(obss, attr_nm))
         for attr_nm in self.attr_y:
-            arr_ = self._extract_obs(obs, attr_nm)
-            sz = arr_.size
-            self._sz_y.append(sz)
+            self._sz_y.append(self._get_init_size(obss, attr_nm))
         self._init_database_shapes()
 
     def _init_database_shapes(self):
@@ -240,6 +252,123 @@ class BaseProxy(ABC):
         for sz in self._sz_y:
             self._my_y.append(np.zeros((self.max_row_training_set, sz), dtype=self.dtype))
 
+    def reset_database(self, max_row_training_set=None, eval_batch_size=None):
+        """
+        Remove all the data stored in the database, and possibly change its size (`max_row_training_set`) or the
+        number of rows used for each prediction (`eval_batch_size`).
+
+        It can only be called once the sizes of the attributes are known (after `init` or `load_metadata`)
+
+        This function may be overridden but in that case we recommend to call the method of the super class
+        """
+        if max_row_training_set is not None:
+            self.max_row_training_set = int(max_row_training_set)
+        if eval_batch_size is not None:
+            self.eval_batch_size = int(eval_batch_size)
+        if self.max_row_training_set < self.eval_batch_size:
+            raise RuntimeError(f"You cannot use a batch size of {self.eval_batch_size} with a dataset counting at"
+                               f" most {self.max_row_training_set} rows.")
+        self.last_id = 0
+        self._global_iter = 0
+        self._last_id_eval = 0
+        self.__db_full = False
+        self._init_database_shapes()
+
+    def get_database_snapshot(self, copy_data=True):
+        """
+        Get the content of the database (only the rows that have been filled) and its counters, to save them with
+        :func:`BaseProxy.save_database_snapshot`.
+
+        Parameters
+        ----------
+        copy_data: ``bool``
+            Whether the arrays are copied (required if the snapshot is saved in a background thread while the
+            proxy continues to store data) or are views on the database.
+
+        Returns
+        -------
+        res: ``tuple``
+            The counters of the database (json serializable ``dict``) and a ``dict`` of arrays (see
+            :func:`BaseProxy._get_database_arrays`)
+
+        """
+        nb_row = self.max_row_training_set if self._is_db_full() else self.last_id
+        arrays = {}
+        for name, arr in self._get_database_arrays().items():
+            arrays[name] = arr[:nb_row].copy() if copy_data else arr[:nb_row]
+        state = {"nb_row": int(nb_row),
+                 "max_row_training_set": int(self.max_row_training_set),
+                 "last_id": int(self.last_id),
+                 "_global_iter": int(self._global_iter),
+                 "db_full": bool(self._is_db_full()),
+                 "arrays": sorted(arrays.keys())}
+        return state, arrays
+
+    def save_database_snapshot(self, snapshot, path):
+        """
+        Save a snapshot of the database (taken with :func:`BaseProxy.get_database_snapshot`) in `path`.
+
+        Each array is saved in an (uncompressed) ".npy" file so that it can be read quickly (or memory mapped)
+        and the counters are saved in "database.json".
+
+        This function can be called in a background thread.
+        """
+        state, arrays = snapshot
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, f"database_{name}.npy"), arr)
+        with open(os.path.join(path, self.DATABASE_JSON), "w", encoding="utf-8") as f:
+            json.dump(obj=state, fp=f)
+
+    def save_database(self, path):
+        """
+        Save the database (the data received and not yet overwritten, and its counters) in `path`, so that a
+        training can be resumed with the same data (see :func:`BaseProxy.load_database`).
+        """
+        self.save_database_snapshot(self.get_database_snapshot(copy_data=False), path)
+
+    def load_database(self, path):
+        """
+        Restore the database saved with :func:`BaseProxy.save_database` (if any). It can only be called once the
+        database has been initialized (after `init` or `load_metadata`).
+
+        The database can be restored in a bigger database if it was not full when it was saved (otherwise the
+        number of rows of both databases should match).
+
+        Returns
+        -------
+        res: ``bool``
+            Whether a database has been restored (``False`` if there is no database saved in `path`)
+
+        """
+        path_json = os.path.join(path, self.DATABASE_JSON)
+        if not os.path.exists(path_json):
+            return False
+        with open(path_json, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        nb_row = int(state["nb_row"])
+        db_full = bool(state["db_full"])
+        if db_full and int(state["max_row_training_set"]) != self.max_row_training_set:
+            raise RuntimeError(f"Impossible to restore a full database of {state['max_row_training_set']} rows "
+                               f"in a database of {self.max_row_training_set} rows.")
+        if nb_row > self.max_row_training_set:
+            raise RuntimeError(f"Impossible to restore a database of {nb_row} rows in a database of "
+                               f"{self.max_row_training_set} rows.")
+        arrays = self._get_database_arrays()
+        if sorted(arrays.keys()) != sorted(state["arrays"]):
+            raise RuntimeError(f"The saved database has the arrays {sorted(state['arrays'])} but this proxy uses "
+                               f"{sorted(arrays.keys())}.")
+        for name, arr in arrays.items():
+            saved = np.load(os.path.join(path, f"database_{name}.npy"), mmap_mode="r")
+            if saved.shape != (nb_row, arr.shape[1]):
+                raise RuntimeError(f"The array \"{name}\" of the saved database has a shape {saved.shape}, "
+                                   f"expected {(nb_row, arr.shape[1])}.")
+            arr[:nb_row] = saved
+        self.last_id = int(state["last_id"])
+        self._global_iter = int(state["_global_iter"])
+        self._last_id_eval = self._global_iter
+        self.__db_full = db_full
+        return True
+
     def store_obs(self, obs):
         """
         This method update all the intermediate for you.
@@ -261,12 +390,49 @@ class BaseProxy(ABC):
             inp[self.last_id, :] = self._extract_obs(obs, attr_nm)
         for attr_nm, inp in zip(self.attr_y, self._my_y):
             inp[self.last_id, :] = self._extract_obs(obs, attr_nm)
+        self._update_counters(1)
 
-        self._global_iter += 1
-        self.last_id += 1
-        if self.last_id >= self.max_row_training_set - 1:
-            self.__db_full = True
-        self.last_id %= self.max_row_training_set
+    def store_batch(self, data):
+        """
+        Store multiple rows at once in the database. The data are not given as observations but as arrays
+        already extracted from the observations, for example by worker processes (see `ParallelCollector`).
+
+        This function may be overridden but in that case we recommend to call the method of the super class
+        (after having used `_get_batch_index` to know where the data will be stored)
+
+        Parameters
+        ----------
+        data: ``dict``
+            Keys are the attribute names (all the attributes given by :func:`BaseProxy.get_attr_database`) and
+            values are arrays with shape (nb_row, size of the attribute), in the order they have been generated.
+
+        """
+        nb_row = self.get_batch_size(data)
+        indx = self._get_batch_index(nb_row)
+        nb_keep = indx.shape[0]
+        for attr_nm, inp in zip(self.attr_x, self._my_x):
+            inp[indx, :] = data[attr_nm][(nb_row - nb_keep):, :]
+        for attr_nm, inp in zip(self.attr_y, self._my_y):
+            inp[indx, :] = data[attr_nm][(nb_row - nb_keep):, :]
+        self._update_counters(nb_row)
+
+    def get_attr_database(self):
+        """
+        Get the name of all the attributes that are stored in the database of the proxy (*ie* all the attributes
+        that need to be extracted from the observations to call :func:`BaseProxy.store_batch`)
+
+        This function may be overridden but in that case we recommend to call the method of the super class
+
+        Returns
+        -------
+        res: ``tuple`` of ``str``
+            The names of the attributes
+        """
+        res = []
+        for attr_nm in tuple(self.attr_x) + tuple(self.attr_y):
+            if attr_nm not in res:
+                res.append(attr_nm)
+        return tuple(res)
 
     def load_metadata(self, dict_):
         """
@@ -292,6 +458,8 @@ class BaseProxy(ABC):
 
         self._time_train = float(dict_["_time_train"])
         self._time_predict = float(dict_["_time_predict"])
+        if "_stage_timer" in dict_:
+            self.stage_timer.from_dict(dict_["_stage_timer"])
 
         self._init_database_shapes()
 
@@ -322,6 +490,8 @@ class BaseProxy(ABC):
 
         res["_time_train"] = float(self._time_train)
         res["_time_predict"] = float(self._time_predict)
+        if self.stage_timer.enabled:
+            res["_stage_timer"] = self.stage_timer.to_dict()
 
         return res
 
@@ -350,10 +520,8 @@ class BaseProxy(ABC):
 
         We suppose that there is a "." preceding the extension. So ext=".h5" is valid, but not ext="h5"
 
-        We recommend that the file at the "path" is not directly read.
-        Rather, it is better to first copied it into a temporary directory, and then
-        read it. This is to avoid any data corruption when an instance of the model is reading and another
-        is writing to the same file.
+        `AgentWithProxy` gives the directory of a complete checkpoint (see `CheckpointWriter`) so the files can
+        be read directly, even if another instance of the model is saving at the same location.
 
         """
         pass
@@ -379,6 +547,47 @@ class BaseProxy(ABC):
         """
         pass
 
+    def get_data_snapshot(self):
+        """
+        Take an "in memory" copy of the data saved by :func:`BaseProxy.save_data` (for example the weights of a
+        neural network).
+
+        This snapshot is then written with :func:`BaseProxy.save_data_snapshot` in a background thread while the
+        proxy continues to be trained, so it must not share any data with the proxy that could be modified
+        by the training.
+
+        This function should be overridden if `save_data` is
+
+        Returns
+        -------
+        res:
+            The snapshot of the data (``None`` if the proxy has no data to save)
+
+        """
+        return None
+
+    def save_data_snapshot(self, snapshot, path, ext=".h5"):
+        """
+        Save a snapshot taken by :func:`BaseProxy.get_data_snapshot`. The saved files should be the same as the
+        one :func:`BaseProxy.save_data` would have written when the snapshot was taken.
+
+        This function is called in a background thread.
+
+        This function should be overridden if `save_data` is
+
+        Parameters
+        ----------
+        snapshot:
+            The snapshot to save
+
+        path: ``str``
+            The path at which the model will be saved
+        ext: ``str``
+            The extension used to save the model (for example ".h5" should output a file named xxx.h5)
+
+        """
+        pass
+
     def _extract_data(self, indx_train):
         """
         extract from the training dataset, the data with indexes `indx_train`
@@ -417,6 +626,40 @@ class BaseProxy(ABC):
         tmpy = [arr[indx_train, :] for arr in self._my_y]
         return tmpx, tmpy
 
+    def _get_database_lists(self):
+        """
+        The different parts of the database, with the names of the attributes they store.
+
+        This function should be overridden (calling the method of the super class) if the proxy stores other data
+        in its database.
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the names of the parts (for example "x" for the inputs), values are tuples
+            `(attribute names, list of arrays)` (for example `(self.attr_x, self._my_x)`). The lists are the ones
+            used by the proxy, so modifying them modifies the database.
+        """
+        return {"x": (self.attr_x, self._my_x), "y": (self.attr_y, self._my_y)}
+
+    def _get_database_arrays(self):
+        """
+        All the arrays of the database (saved by :func:`BaseProxy.save_database`), with a unique name for each
+        (see :func:`BaseProxy._get_database_lists`).
+
+        We don't recommend to overide this function
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the names of the arrays, values are the arrays
+        """
+        res = {}
+        for part_nm, (attr_names, arrays) in self._get_database_lists().items():
+            for i, arr in enumerate(arrays):
+                res[f"{part_nm}_{i}"] = arr
+        return res
+
     def get_output_sizes(self):
         """
         Should return the list of the dimension of the output of the proxy.
@@ -493,6 +736,27 @@ class BaseProxy(ABC):
         """
         pass
 
+    def get_tensorboard_scalars(self, batch_losses):
+        """
+        Get the scalars of the last training iteration to save in tensorboard. Contrary to
+        :func:`BaseProxy.save_tensorboard` nothing is written: the values are aggregated over multiple training
+        iterations and written in a background thread by `AgentWithProxy` (see :class:`TensorboardSink`).
+
+        This function may be overridden
+
+        Parameters
+        ----------
+        batch_losses: ``list of float``
+            The losses for each variables that the proxy is supposed to predict
+
+        Returns
+        -------
+        res: ``list``
+            List of tuple `(name, value, description)`
+
+        """
+        return []
+
     def _post_process(self, predicted_state):
         """
         This function is used to post process the data that are the output of the proxy.
@@ -535,12 +799,27 @@ class BaseProxy(ABC):
         res:
             The array representing what need to be extracted from the observation
         """
-        return getattr(obs, attr_nm)
+        return extract_attr(obs, attr_nm)
+
+    def get_extract_fun(self):
+        """
+        Get a picklable function `extract_fun(obs, attr_nm)` that extracts the attributes from the observations in
+        the same way as :func:`BaseProxy._extract_obs`. It is used where the proxy is not available, for example
+        in the worker processes of :class:`leap_net.proxy.ParallelCollector`.
+
+        If you override `_extract_obs` you need to override this function too (and return a function defined at
+        the top level of a module), otherwise an error is raised: the data extracted in the other processes would
+        not be the same.
+        """
+        if type(self)._extract_obs is not BaseProxy._extract_obs:
+            raise RuntimeError(f"The proxy \"{self.name}\" overrides \"_extract_obs\" but not \"get_extract_fun\", "
+                               f"the attributes cannot be extracted the same way in other processes.")
+        return extract_attr
 
     #######################################################
     ## We don't recommend to change anything bellow this ##
     #######################################################
-    def train(self, tf_writer=None):
+    def train(self, tf_writer=None, force=False):
         """
         Train the proxy (if tf_writer is not None, it is expected that the proxy save the computation graph
 
@@ -550,6 +829,9 @@ class BaseProxy(ABC):
         ----------
         tf_writer
 
+        force: ``bool``
+            Whether to force the training or not
+
         Returns
         -------
         None if the proxy has not been trained at this iteration, or the losses
@@ -589,7 +871,8 @@ class BaseProxy(ABC):
         """
         if (self._global_iter % self.eval_batch_size != 0) and (not force):
             return None
-        data = self._extract_data(np.arange(self._last_id_eval, self._global_iter) % self.max_row_training_set)
+        with self.stage_timer.time("extract_data"):
+            data = self._extract_data(np.arange(self._last_id_eval, self._global_iter) % self.max_row_training_set)
 
         if self.__first_eval:
             # evaluate at "blank" the first time so that tensorflow / keras can load the model
@@ -597,9 +880,11 @@ class BaseProxy(ABC):
             self.__first_eval = False
 
         beg_ = time.time()
-        res = self._make_predictions(data, training=False)
+        with self.stage_timer.time("make_predictions"):
+            res = self._make_predictions(data, training=False)
         self._time_predict += time.time() - beg_
-        res = self._post_process(res)
+        with self.stage_timer.time("post_process"):
+            res = self._post_process(res)
         self._last_id_eval = self._global_iter
         return res
 
@@ -645,8 +930,8 @@ class BaseProxy(ABC):
 
         We don't recommend to overide this function, modify the function `_get_mean` and `_get_sd` instead
 
-        obss is a list of observation obtained from running some environment with just the "actor" acting on
-        the grid. The size of this list is set by `AgentWithProxy.nb_obs_init`
+        obss is a list of observation (or an :class:`InitDataset`) obtained from running some environment with just
+        the "actor" acting on the grid. The size of this list is set by `AgentWithProxy.nb_obs_init`
 
         Notes
         ------
@@ -655,9 +940,10 @@ class BaseProxy(ABC):
         data_scaled = (data_raw - add_tmp) / mult_tmp
 
         """
-        obs = obss[0]
-        add_tmp = np.mean([self._extract_obs(ob, attr_nm) for ob in obss], axis=0).astype(self.dtype)
-        mult_tmp = np.std([self._extract_obs(ob, attr_nm) for ob in obss], axis=0).astype(self.dtype) + 1e-1
+        obs = self._get_init_first_obs(obss)
+        values = self._get_init_values(obss, attr_nm)
+        add_tmp = np.mean(values, axis=0).astype(self.dtype)
+        mult_tmp = np.std(values, axis=0).astype(self.dtype) + 1e-1
 
         if attr_nm in ["prod_p"]:
             # mult_tmp = np.array([max((pmax - pmin), 1.) for pmin, pmax in zip(obs.gen_pmin, obs.gen_pmax)],
@@ -673,12 +959,12 @@ class BaseProxy(ABC):
         elif attr_nm in ["load_v", "prod_v"]:
             # default values are good enough
             # stds are almost 0 for loads, this leads to instability
-            add_tmp = np.mean([self._extract_obs(ob, attr_nm) for ob in obss], axis=0).astype(self.dtype)
-            mult_tmp = 1.0  # np.mean([self._extract_obs(ob, attr_nm) for ob in obss], axis=0).astype(self.dtype)
+            add_tmp = np.mean(values, axis=0).astype(self.dtype)
+            mult_tmp = 1.0  # np.mean(values, axis=0).astype(self.dtype)
         elif attr_nm in ["v_or", "v_ex"]:
             # default values are good enough
             add_tmp = self.dtype(0.)  # because i multiply by the line status, so i don't want any bias
-            mult_tmp = np.mean([self._extract_obs(ob, attr_nm) for ob in obss], axis=0).astype(self.dtype)
+            mult_tmp = np.mean(values, axis=0).astype(self.dtype)
         elif attr_nm == "hour_of_day":
             add_tmp = self.dtype(12.)
             mult_tmp = self.dtype(12.)
@@ -709,6 +995,81 @@ class BaseProxy(ABC):
 
         return add_tmp, mult_tmp
 
+    def _get_init_size(self, obss, attr_nm):
+        """
+        size of an attribute, from the data given to :func:`BaseProxy.init` (list of observations or
+        :class:`InitDataset`)
+
+        We don't recommend to overide this function
+        """
+        if isinstance(obss, InitDataset):
+            return obss.get_size(attr_nm)
+        return self._extract_obs(obss[0], attr_nm).size
+
+    def _get_init_values(self, obss, attr_nm):
+        """
+        all the values of an attribute (one row per observation), from the data given to :func:`BaseProxy.init`
+        (list of observations or :class:`InitDataset`)
+
+        We don't recommend to overide this function
+        """
+        if isinstance(obss, InitDataset):
+            return obss.get(attr_nm)
+        return np.array([self._extract_obs(ob, attr_nm) for ob in obss])
+
+    def _get_init_first_obs(self, obss):
+        """
+        the first observation of the data given to :func:`BaseProxy.init` (for an :class:`InitDataset`, only the
+        attributes it kept from the first observation are available)
+
+        We don't recommend to overide this function
+        """
+        if isinstance(obss, InitDataset):
+            return obss.first_obs
+        return obss[0]
+
+    def get_batch_size(self, data):
+        """
+        number of rows in the data given to `store_batch`
+
+        We don't recommend to overide this function
+        """
+        for attr_nm in self.get_attr_database():
+            return data[attr_nm].shape[0]
+        return 0
+
+    def _get_batch_index(self, nb_row):
+        """
+        Get the index in the database where the `nb_row` next rows will be stored. If there are more rows than
+        the size of the database, only the indexes of the last ones are returned (the first ones would be
+        overwritten anyway).
+
+        We don't recommend to overide this function
+        """
+        nb_keep = min(nb_row, self.max_row_training_set)
+        start_ = self.last_id + nb_row - nb_keep
+        return (start_ + np.arange(nb_keep)) % self.max_row_training_set
+
+    def _update_counters(self, nb_row):
+        """
+        update the counters of the database once `nb_row` have been stored into it
+
+        We don't recommend to overide this function
+        """
+        self._global_iter += nb_row
+        self.last_id += nb_row
+        if self.last_id >= self.max_row_training_set - 1:
+            self.__db_full = True
+        self.last_id %= self.max_row_training_set
+
+    def get_global_iter(self):
+        """
+        total number of rows stored in the database (including the ones that have been overwritten since)
+
+        We don't recommend to overide this function
+        """
+        return self._global_iter
+
     def get_total_predict_time(self):
         """
         get the total time spent to make the prediction with the proxy
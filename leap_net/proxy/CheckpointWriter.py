@@ -0,0 +1,151 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+
+class CheckpointWriter:
+    """
+    This class writes the checkpoints of a model, either in the calling thread or in a background thread.
+
+    Each checkpoint is entirely written in a temporary directory, which is then renamed into the "checkpoints" sub
+    directory (named after the iteration at which it has been made). Once it is there, the "latest" file, that
+    stores the name of the last checkpoint, is replaced (with `os.replace`, which is atomic on the same file system).
+    This means that the checkpoint read through the "latest" file (see :func:`CheckpointWriter.get_checkpoint_path`)
+    is always complete, even if the process is killed during a save.
+
+    The `nb_kept` last checkpoints are kept in the "checkpoints" sub directory, the older ones are removed.
+
+    Only one checkpoint is written at a time: asking for a new checkpoint while the previous one is still being
+    written waits for the previous one to be finished.
+    """
+    CHECKPOINT_DIR = "checkpoints"
+    LATEST_FILE = "latest"
+
+    def __init__(self, nb_kept=1):
+        if nb_kept < 1:
+            raise RuntimeError("At least one checkpoint should be kept.")
+        self.nb_kept = int(nb_kept)
+        self._thread = None
+        self._error = None
+
+    @staticmethod
+    def get_checkpoint_path(path_save):
+        """
+        Get the directory in which the files of the last checkpoint written in `path_save` are.
+
+        If there is no "latest" file in `path_save` (for example if the model has been saved by a previous
+        version of this package) the files are supposed to be directly in `path_save`.
+        """
+        path_latest = os.path.join(path_save, CheckpointWriter.LATEST_FILE)
+        if not os.path.exists(path_latest):
+            return path_save
+        with open(path_latest, "r", encoding="utf-8") as f:
+            nm_dir = f.read().strip()
+        return os.path.join(path_save, CheckpointWriter.CHECKPOINT_DIR, nm_dir)
+
+    def write(self, path_save, write_fun, iteration, asynchronous=False):
+        """
+        Write a checkpoint
+
+        Parameters
+        ----------
+        path_save: ``str``
+            The directory in which the checkpoint is written (it is created if it does not exist)
+
+        write_fun:
+            The function that writes the checkpoint, it is called with `write_fun(path_tmp)` where `path_tmp` is
+            a temporary directory. When `asynchronous` is ``True``, this function should only use data that
+            will not be modified by the calling thread.
+
+        iteration: ``int``
+            The current iteration (used to name the checkpoint)
+
+        asynchronous: ``bool``
+            Whether to write the checkpoint in a background thread or not
+
+        """
+        self.wait()
+        if not os.path.exists(path_save):
+            os.mkdir(path_save)
+        if asynchronous:
+            self._thread = threading.Thread(target=self._write_background,
+                                            args=(path_save, write_fun, iteration),
+                                            name="leap_net_checkpoint")
+            self._thread.start()
+        else:
+            self._write(path_save, write_fun, iteration)
+
+    def wait(self):
+        """wait for the current checkpoint (if any) to be written, and raise the error that occurred (if any)"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise RuntimeError("Error while writing the last checkpoint") from error
+
+    def is_writing(self):
+        """is a checkpoint being written in the background"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _write_background(self, path_save, write_fun, iteration):
+        try:
+            self._write(path_save, write_fun, iteration)
+        except Exception as exc_:
+            self._error = exc_
+
+    def _write(self, path_save, write_fun, iteration):
+        path_ckpts = os.path.join(path_save, self.CHECKPOINT_DIR)
+        if not os.path.exists(path_ckpts):
+            os.mkdir(path_ckpts)
+        path_tmp = tempfile.mkdtemp(prefix=".tmp_checkpoint_", dir=path_ckpts)
+        try:
+            write_fun(path_tmp)
+            # the checkpoint of the same iteration may be the current one, it is not overwritten
+            nm_this = f"iter_{int(iteration):010d}"
+            nb_same = 0
+            while os.path.exists(os.path.join(path_ckpts, nm_this)):
+                nb_same += 1
+                nm_this = f"iter_{int(iteration):010d}_{nb_same}"
+            os.rename(path_tmp, os.path.join(path_ckpts, nm_this))
+            path_tmp = None
+            self._write_latest(path_save, nm_this)
+            self._remove_old(path_ckpts, nm_this)
+        finally:
+            if path_tmp is not None:
+                shutil.rmtree(path_tmp, ignore_errors=True)
+
+    def _write_latest(self, path_save, nm_dir):
+        """make `nm_dir` the last checkpoint (in one atomic step)"""
+        path_latest = os.path.join(path_save, self.LATEST_FILE)
+        path_latest_tmp = os.path.join(path_save, f".tmp_{self.LATEST_FILE}")
+        with open(path_latest_tmp, "w", encoding="utf-8") as f:
+            f.write(nm_dir)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_latest_tmp, path_latest)
+
+    def _remove_old(self, path_ckpts, nm_latest):
+        """remove the oldest checkpoints, so that only the nb_kept last ones (including `nm_latest`) are stored"""
+        li_ckpts = []
+        for nm_dir in os.listdir(path_ckpts):
+            match_ = re.match(r"^iter_([0-9]+)(?:_([0-9]+))?$", nm_dir)
+            if match_ is not None and nm_dir != nm_latest:
+                li_ckpts.append((int(match_.group(1)), int(match_.group(2) or 0), nm_dir))
+            elif nm_dir.startswith(".tmp_checkpoint_"):
+                # left by a process killed while writing a checkpoint
+                shutil.rmtree(os.path.join(path_ckpts, nm_dir), ignore_errors=True)
+        li_ckpts = sorted(li_ckpts)
+        for *_, nm_dir in li_ckpts[:len(li_ckpts) - (self.nb_kept - 1)]:
+            shutil.rmtree(os.path.join(path_ckpts, nm_dir), ignore_errors=True)
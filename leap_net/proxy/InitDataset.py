@@ -0,0 +1,79 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class InitDataset:
+    """
+    This class stores the data used to initialize a proxy (see :func:`BaseProxy.init`) without keeping the
+    grid2op observations: only the attributes used by the proxy are extracted, in arrays that are allocated
+    once (and doubled in size if more observations than expected are added).
+
+    The values are stored in the type in which they are extracted (so that the scalers computed on these arrays are
+    exactly the same as the ones computed on the list of observations).
+
+    A few attributes of the first observation (`FIRST_OBS_ATTR`) are also kept, they are used by some scalers (
+    see :func:`BaseProxy._get_adds_mults_from_name`).
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        init_data = InitDataset(proxy.get_attr_database(), extract_fun=proxy._extract_obs, nb_row=256)
+        for obs in observations:
+            init_data.add(obs)
+        proxy.init(init_data)
+
+    """
+    FIRST_OBS_ATTR = ("gen_pmin", "gen_pmax", "a_or", "rho")
+
+    def __init__(self, attr_names, extract_fun=None, nb_row=256):
+        self.attr_names = tuple(attr_names)
+        if extract_fun is None:
+            extract_fun = getattr
+        self.extract_fun = extract_fun
+        self._capacity = max(int(nb_row), 1)
+        self._nb_row = 0
+        self._data = None
+        self.first_obs = None
+
+    def __len__(self):
+        return self._nb_row
+
+    def add(self, obs):
+        """extract the attributes of an observation and store them"""
+        values = [np.asarray(self.extract_fun(obs, attr_nm)).reshape(-1) for attr_nm in self.attr_names]
+        if self._data is None:
+            self._data = [np.zeros((self._capacity, val.shape[0]), dtype=val.dtype) for val in values]
+            first = {attr_nm: getattr(obs, attr_nm) for attr_nm in self.FIRST_OBS_ATTR if hasattr(obs, attr_nm)}
+            first = {attr_nm: np.array(val) for attr_nm, val in first.items()}
+            first.update({attr_nm: val.copy() for attr_nm, val in zip(self.attr_names, values)})
+            self.first_obs = SimpleNamespace(**first)
+        elif self._nb_row == self._capacity:
+            self._capacity *= 2
+            self._data = [np.concatenate((arr, np.zeros_like(arr)), axis=0) for arr in self._data]
+        for arr, val in zip(self._data, values):
+            arr[self._nb_row] = val
+        self._nb_row += 1
+
+    def get(self, attr_nm):
+        """all the values of an attribute (one row per observation added)"""
+        if self._data is None:
+            raise RuntimeError("No observation has been added.")
+        if attr_nm not in self.attr_names:
+            raise RuntimeError(f"The attribute \"{attr_nm}\" has not been extracted from the observations (only "
+                               f"{self.attr_names} are available)")
+        return self._data[self.attr_names.index(attr_nm)][:self._nb_row]
+
+    def get_size(self, attr_nm):
+        """size of an attribute"""
+        return self.get(attr_nm).shape[1]
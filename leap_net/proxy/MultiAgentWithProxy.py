@@ -0,0 +1,203 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+import os
+import warnings
+
+import numpy as np
+from tqdm import tqdm
+
+from concurrent.futures import ThreadPoolExecutor
+from grid2op.Agent import BaseAgent
+
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+
+
+class MultiAgentWithProxy(BaseAgent):
+    """
+    This class allows to train multiple proxies (for example with different architectures) on the same data: the
+    environment is run only once, and each observation is given to all the proxies.
+
+    Each proxy is handled by its own :class:`AgentWithProxy` (available in :attr:`MultiAgentWithProxy.agents`) so it
+    has its own tensorboard logs and checkpoints (in `save_path/proxy.name`). Its training is the same as if
+    it had been trained alone with :func:`AgentWithProxy.train` (except for the batches sampled at random).
+
+    The attributes used by the proxies are extracted only once from each observation. If the databases of the
+    proxies have the same size, the arrays that store the same attribute are shared between the proxies.
+
+    Notes
+    -----
+    All the proxies should extract the attributes from the observation the same way (same `_extract_obs` method)
+    and their names should be different.
+
+    The proxies can then be evaluated with :func:`AgentWithProxy.record` and
+    :func:`AgentWithProxy.evaluate_recorded` to, also, run the environment only once.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        proxies = [ProxyLeapNet(name="leapnet_dense", ...),
+                   ProxyLeapNet(name="leapnet_resnet", layer=ResNetLayer, ...)]
+        agent = MultiAgentWithProxy(actor, proxies, nb_thread=2, logdir="tf_logs", save_freq=1024)
+        agent.train(env, total_training_step=int(1e6), save_path="model_saved")
+
+    """
+    def __init__(self,
+                 actor,  # the agent that will take some actions
+                 proxies,  # the proxies to train
+                 nb_thread=1,  # number of proxies stored / trained at the same time (in different threads)
+                 share_database=True,  # the proxies share the arrays storing the same attribute
+                 **kwargs_agent  # other key word arguments used to build each AgentWithProxy
+                 ):
+        BaseAgent.__init__(self, actor.action_space)
+        self.actor = actor
+        proxies = list(proxies)
+        if not proxies:
+            raise RuntimeError("At least one proxy is needed.")
+        names = [proxy.name for proxy in proxies]
+        if len(set(names)) != len(names):
+            raise RuntimeError(f"All the proxies should have a different name, found {names}")
+        extract_funs = {type(proxy)._extract_obs for proxy in proxies}
+        if len(extract_funs) != 1:
+            raise RuntimeError("All the proxies should extract the data from the observations the same way "
+                               "(same \"_extract_obs\" method).")
+        self.agents = [AgentWithProxy(actor, proxy, **kwargs_agent) for proxy in proxies]
+        self.nb_thread = int(nb_thread)
+        self.share_database = share_database
+        self.global_iter = 0
+
+        # all the attributes used by at least one proxy
+        self._attr_names = []
+        for proxy in proxies:
+            for attr_nm in proxy.get_attr_database():
+                if attr_nm not in self._attr_names:
+                    self._attr_names.append(attr_nm)
+        self._extract_fun = proxies[0]._extract_obs
+        self._executor = None
+
+    def act(self, obs, reward, done=False):
+        """
+        Store the observation in the database of all the proxies (training them if needed) and return the
+        action of the actor.
+
+        Parameters
+        ----------
+        obs: ``grid2op.Observation`
+            The current grid2op observation.
+
+        reward: ``float``
+            The reward of the last action, forwarded to the actor.
+
+        done: ``bool``
+            Whether or not there was a game over in the last action, forwarded to the actor.
+
+        Returns
+        -------
+        act: `grid2op.Action`
+            The action chosen by the actor
+        """
+        self.global_iter += 1
+        data = {attr_nm: np.asarray(self._extract_fun(obs, attr_nm)).reshape(1, -1) for attr_nm in self._attr_names}
+        if self._executor is None:
+            for agent in self.agents:
+                agent._store_batch(data)
+        else:
+            # wait for all the proxies (and raise the errors if any)
+            for _ in self._executor.map(lambda agent: agent._store_batch(data), self.agents):
+                pass
+        return self.actor.act(obs, reward, done)
+
+    def train(self, env, total_training_step, save_path=None, load_path=None, verbose=1):
+        """
+        Train all the proxies (see :func:`AgentWithProxy.train`)
+
+        Parameters
+        ----------
+        env:
+            The environment
+
+        total_training_step:
+            The total number of data that will be seen during training (by each proxy)
+
+        save_path: ``str``
+            Path where the proxies will be saved (each in a sub directory named after it, ``None`` to deactivate it)
+
+        load_path: ``str``
+            If it is not None, the proxies (previously saved at `load_path`) will be loaded back.
+
+        verbose: ``int``
+            Degree of verbosity. The more verbose the more information will be plotted on the command line
+
+        """
+        if save_path is not None:
+            if not os.path.exists(save_path):
+                os.mkdir(save_path)
+        for agent in self.agents:
+            agent.save_path = save_path
+            agent.is_training = True
+            if load_path is not None:
+                agent.load(load_path)
+
+        # the environment is run once to initialize all the proxies
+        init_data = None
+        if not all(agent._is_init() for agent in self.agents):
+            init_data = self.agents[0]._get_init_data(env, self._attr_names, self._extract_fun)
+        for agent in self.agents:
+            agent.init(env, init_data=init_data)
+            if load_path is not None:
+                agent._load_database(load_path)
+        if self.share_database:
+            self._share_databases()
+        self.global_iter = min(agent.global_iter for agent in self.agents)
+
+        done = False
+        reward = env.reward_range[0]
+        if self.nb_thread > 1:
+            self._executor = ThreadPoolExecutor(max_workers=min(self.nb_thread, len(self.agents)))
+        try:
+            with tqdm(total=total_training_step, disable=verbose == 0) as pbar:
+                pbar.update(self.global_iter)
+                obs = self.agents[0]._reboot(env)
+                while not done:
+                    act = self.act(obs, reward, done)
+                    obs, reward, done, info = env.step(act)
+                    if done:
+                        obs = self.agents[0]._reboot(env)
+                        done = False
+                    pbar.update(1)
+                    if self.global_iter >= total_training_step:
+                        break
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+        # save the models at the end
+        for agent in self.agents:
+            agent._wait_tensorboard()
+            agent.save(save_path)
+
+    def _share_databases(self):
+        """make all the proxies use the same array to store the same attribute (when the arrays have the same
+        shape and type)"""
+        counters = {(agent._proxy.last_id, agent._proxy.get_global_iter(), agent._proxy._is_db_full())
+                    for agent in self.agents}
+        if len(counters) != 1:
+            # the proxies do not store the data at the same place
+            warnings.warn("The databases of the proxies are not synchronized, they will not be shared.")
+            return
+        shared = {}
+        for agent in self.agents:
+            for attr_names, arrays in agent._proxy._get_database_lists().values():
+                for i, (attr_nm, arr) in enumerate(zip(attr_names, arrays)):
+                    key = (attr_nm, arr.shape, arr.dtype.str)
+                    if key in shared:
+                        arrays[i] = shared[key]
+                    else:
+                        shared[key] = arr
@@ -0,0 +1,212 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import queue
+import multiprocessing
+
+import numpy as np
+
+from leap_net.proxy.BaseProxy import extract_attr
+from leap_net.proxy.utils import reboot
+
+
+def _collect_worker(worker_id,
+                    env_fun,
+                    env_kwargs,
+                    actor_class,
+                    actor_kwargs,
+                    seed,
+                    attr_names,
+                    chunk_size,
+                    dtype,
+                    extract_fun,
+                    res_queue,
+                    stop_event):
+    """
+    Function run by each worker process. It builds its own environment and its own actor, seeds them and then
+    sends the data, by chunks of `chunk_size` rows, in `res_queue` until `stop_event` is set.
+    """
+    env = env_fun(**env_kwargs)
+    actor = actor_class(env.action_space, **actor_kwargs)
+    if seed is not None:
+        env.seed(seed)
+        actor.seed(seed)
+
+    chunk = {attr_nm: [] for attr_nm in attr_names}
+    obs, reward, done = reboot(env, actor)
+    while not stop_event.is_set():
+        for attr_nm in attr_names:
+            chunk[attr_nm].append(np.asarray(extract_fun(obs, attr_nm), dtype=dtype).reshape(-1))
+        if len(chunk[attr_names[0]]) == chunk_size:
+            res = {attr_nm: np.stack(rows, axis=0) for attr_nm, rows in chunk.items()}
+            chunk = {attr_nm: [] for attr_nm in attr_names}
+            # don't block forever if the main process stopped consuming the data
+            while not stop_event.is_set():
+                try:
+                    res_queue.put(res, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+        obs, reward, done, info = env.step(actor.act(obs, reward, done))
+        if done:
+            obs, reward, done = reboot(env, actor)
+    env.close()
+
+
+class ParallelCollector:
+    """
+    This class runs multiple copies of a grid2op environment, each in its own process, with its own seeded
+    "actor" and sends back the data extracted from the observations by chunks.
+
+    It is used by :func:`AgentWithProxy.train_parallel` to gather the training data of a proxy faster than
+    with a single environment.
+
+    The chunks are returned in a "round robin" fashion (first chunk of worker 0, first chunk of worker 1, ...,
+    second chunk of worker 0 etc.) so that the data stream is the same, given the seeds, whatever the speed of
+    each worker.
+
+    Notes
+    -----
+    `env_fun`, `actor_class` and `extract_fun` are sent to the worker processes, so they need to be picklable (
+    defined at the top level of a module, `functools.partial` of such functions etc. Lambdas are not).
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        from leap_net.proxy.utils import create_env
+        from leap_net.agents import RandomNN1
+
+        with ParallelCollector(env_fun=create_env,
+                               env_kwargs={"env_name": "l2rpn_case14_sandbox"},
+                               actor_class=RandomNN1,
+                               actor_kwargs={"p": 0.5},
+                               attr_names=("prod_p", "load_p", "line_status", "a_or"),
+                               nb_process=4,
+                               seed=42) as collector:
+            data = collector.get()  # dictionary: attr_name -> array of shape (chunk_size, attr_size)
+
+    """
+    def __init__(self,
+                 env_fun,  # function that creates the environment
+                 env_kwargs,  # key word arguments given to env_fun
+                 actor_class,  # class of the actor, built with actor_class(env.action_space, **actor_kwargs)
+                 attr_names,  # attributes extracted from the observations
+                 actor_kwargs=None,
+                 nb_process=2,
+                 seed=None,  # each worker is seeded with seed + worker_id
+                 chunk_size=64,  # number of rows sent at once by a worker
+                 dtype=np.float32,
+                 extract_fun=extract_attr,  # function(obs, attr_nm) -> array, see BaseProxy.get_extract_fun
+                 max_chunk_queued=8,  # maximum number of chunks waiting in the queue of each worker
+                 start_method="spawn",
+                 ):
+        if nb_process <= 0:
+            raise RuntimeError("You need at least one process to collect the data.")
+        if chunk_size <= 0:
+            raise RuntimeError("The chunk size should be > 0.")
+        self.env_fun = env_fun
+        self.env_kwargs = env_kwargs if env_kwargs is not None else {}
+        self.actor_class = actor_class
+        self.actor_kwargs = actor_kwargs if actor_kwargs is not None else {}
+        self.attr_names = tuple(attr_names)
+        self.nb_process = int(nb_process)
+        self.seed = seed
+        self.chunk_size = int(chunk_size)
+        self.dtype = dtype
+        self.extract_fun = extract_fun
+        self.max_chunk_queued = int(max_chunk_queued)
+        self._ctx = multiprocessing.get_context(start_method)
+
+        self._processes = None
+        self._queues = None
+        self._stop_event = None
+        self._next_worker = 0
+
+    def start(self):
+        """start all the worker processes"""
+        if self._processes is not None:
+            return
+        self._stop_event = self._ctx.Event()
+        self._queues = []
+        self._processes = []
+        for worker_id in range(self.nb_process):
+            res_queue = self._ctx.Queue(maxsize=self.max_chunk_queued)
+            seed = self.seed + worker_id if self.seed is not None else None
+            process = self._ctx.Process(target=_collect_worker,
+                                        args=(worker_id,
+                                              self.env_fun,
+                                              self.env_kwargs,
+                                              self.actor_class,
+                                              self.actor_kwargs,
+                                              seed,
+                                              self.attr_names,
+                                              self.chunk_size,
+                                              self.dtype,
+                                              self.extract_fun,
+                                              res_queue,
+                                              self._stop_event),
+                                        daemon=True)
+            process.start()
+            self._queues.append(res_queue)
+            self._processes.append(process)
+        self._next_worker = 0
+
+    def get(self):
+        """
+        get the next chunk of data
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are the attribute names, values are arrays with `chunk_size` rows.
+        """
+        if self._processes is None:
+            self.start()
+        worker_id = self._next_worker
+        while True:
+            try:
+                res = self._queues[worker_id].get(timeout=1.)
+                break
+            except queue.Empty:
+                if not self._processes[worker_id].is_alive():
+                    raise RuntimeError(f"The worker {worker_id} used to collect the data stopped unexpectedly "
+                                       f"(exit code {self._processes[worker_id].exitcode}).")
+        self._next_worker = (worker_id + 1) % self.nb_process
+        return res
+
+    def close(self):
+        """stop all the worker processes"""
+        if self._processes is None:
+            return
+        self._stop_event.set()
+        for res_queue in self._queues:
+            # empty the queues so that the workers are not stuck
+            try:
+                while True:
+                    res_queue.get_nowait()
+            except queue.Empty:
+                pass
+        for process in self._processes:
+            process.join(timeout=10.)
+            if process.is_alive():
+                process.terminate()
+        for res_queue in self._queues:
+            res_queue.close()
+        self._processes = None
+        self._queues = None
+        self._stop_event = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,207 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import matplotlib.pyplot as plt
+    MATPLOT_OK = True
+except ImportError:
+    MATPLOT_OK = False
+
+# plot helper of a worker process
+_PLOT_WORKER = None
+
+
+def _init_plot_worker(dict_obs_space):
+    """
+    build the plot helper of a worker process. The grid2op observation spaces cannot be pickled, so the one of
+    the worker is rebuilt from its description (see `SerializableObservationSpace.cls_to_dict`)
+    """
+    from grid2op.Observation.serializableObservationSpace import SerializableObservationSpace
+    global _PLOT_WORKER
+    # the worker never displays anything
+    plt.switch_backend("agg")
+    _PLOT_WORKER = PlotErrorOnGrid(observation_space=SerializableObservationSpace.from_dict(dict_obs_space))
+
+
+def _save_fig_worker(attr_nm, metrics, path_fig, limits, kinds_before):
+    """
+    render a figure in a worker process, starting from the limits the plot helper would have in the current
+    process (see :func:`PlotErrorOnGrid.save_figs`). Returns whether the figure is saved and the limits after it.
+    """
+    _PLOT_WORKER._set_serial_limits(limits, kinds_before)
+    res = _PLOT_WORKER.save_fig(attr_nm, metrics, path_fig)
+    return res, _PLOT_WORKER.get_limits()
+
+
+class PlotErrorOnGrid:
+    """
+    this class is used to "project" on the grid the metrics / errors of some proxies.
+
+    it just ensure the projection, and as of creation (October, 26th 2020) it requires a development version
+    of grid2op found at https://github.com/BDonnot/Grid2Op
+
+    """
+    def __init__(self, env=None, observation_space=None):
+        from grid2op.PlotGrid import PlotMatplot
+        if observation_space is None:
+            if env is None:
+                raise RuntimeError("Impossible to plot the errors on the grid without an environment or an "
+                                   "observation space.")
+            observation_space = env.observation_space
+        self.observation_space = observation_space
+        self.plot_helper = PlotMatplot(observation_space)
+        self._line_attr = {"a_or", "a_ex", "p_or", "p_ex", "q_or", "q_ex", "v_or", "v_ex"}
+        self._load_attr = {"load_p", "load_q", "load_v"}
+        self._prod_attr = {"prod_p", "prod_q", "prod_v"}
+        # limits of the plot helper after a figure of each kind, starting from [0, 0] (see `_get_extent`)
+        self._extents = {}
+
+    def get_fig(self, attr_nm, metrics):
+        fig = None
+        try:
+            # only floating point values are supported at the moment
+            metrics = metrics.astype(np.float64)
+        except Exception as exc_:
+            return None
+
+        if np.all(~np.isfinite(metrics)):
+            # no need to plot a "all nan" vector
+            return None
+
+        if attr_nm in self._prod_attr:
+            # deals generator attributes
+            self.plot_helper.assign_gen_palette(increase_gen_size=1.5)
+            fig = self.plot_helper.plot_info(gen_values=metrics, coloring="gen")
+            self.plot_helper.restore_gen_palette()
+        elif attr_nm in self._line_attr:
+            # deals with lines attributes
+            self.plot_helper.assign_line_palette()
+            fig = self.plot_helper.plot_info(line_values=metrics, coloring="line")
+            self.plot_helper.restore_line_palette()
+        return fig
+
+    def get_limits(self):
+        """
+        Get a copy of the limits of the plot helper. They are extended by each figure (for example the generators
+        are bigger when their values are plotted), so a figure depends on the figures plotted before it.
+
+        Returns
+        -------
+        res: ``dict``
+            Keys are "xlim" and "ylim", values are lists `[min, max]`
+        """
+        return {nm: list(getattr(self.plot_helper, nm)) for nm in ("xlim", "ylim")}
+
+    def _set_limits(self, limits):
+        for nm, val in limits.items():
+            setattr(self.plot_helper, nm, list(val))
+
+    def _get_kind(self, attr_nm, metrics):
+        """kind of figure ("gen" or "line") plotted by :func:`PlotErrorOnGrid.get_fig`, None if nothing is
+        plotted"""
+        try:
+            metrics = metrics.astype(np.float64)
+        except Exception as exc_:
+            return None
+        if np.all(~np.isfinite(metrics)):
+            return None
+        if attr_nm in self._prod_attr:
+            return "gen"
+        if attr_nm in self._line_attr:
+            return "line"
+        return None
+
+    def _get_extent(self, kind):
+        """limits of the plot helper after a figure of this kind, starting from [0, 0] (computed once)"""
+        if kind not in self._extents:
+            limits = self.get_limits()
+            self._set_limits({"xlim": [0, 0], "ylim": [0, 0]})
+            if kind == "gen":
+                fig = self.get_fig("prod_p", np.zeros(self.observation_space.n_gen))
+            else:
+                fig = self.get_fig("a_or", np.zeros(self.observation_space.n_line))
+            plt.close(fig)
+            self._extents[kind] = self.get_limits()
+            self._set_limits(limits)
+        return self._extents[kind]
+
+    def _set_serial_limits(self, limits, kinds_before):
+        """set the limits the plot helper would have after plotting figures of `kinds_before` from `limits`"""
+        extents = [self._get_extent(kind) for kind in kinds_before]
+        for extent in extents:
+            limits = {nm: [min(val[0], extent[nm][0]), max(val[1], extent[nm][1])] for nm, val in limits.items()}
+        self._set_limits(limits)
+
+    def save_fig(self, attr_nm, metrics, path_fig):
+        """
+        plot the metrics on the grid and save the figure at `path_fig`
+
+        Returns
+        -------
+        res: ``bool``
+            Whether a figure has been saved (no figure is saved for attributes that cannot be displayed)
+        """
+        if not MATPLOT_OK:
+            return False
+        fig = self.get_fig(attr_nm, metrics)
+        if fig is None:
+            return False
+        fig.savefig(path_fig)
+        plt.close(fig)
+        return True
+
+    def save_figs(self, li_figs, nb_process=0):
+        """
+        Save multiple figures, possibly in parallel.
+
+        Parameters
+        ----------
+        li_figs: ``list``
+            List of tuple `(attr_nm, metrics, path_fig)` (see :func:`PlotErrorOnGrid.save_fig`)
+
+        nb_process: ``int``
+            Number of worker processes used to render the figures, each one with its own plot helper (built from
+            a copy of the observation space). If 0 the figures are rendered in the current process.
+
+            The worker processes are "spawned" (and not forked): the current process may run other threads (for
+            example the ones of tensorflow) that would not be copied in a forked process.
+
+            Each figure is plotted with the limits the plot helper of the current process would have at this
+            point (they depend on the kinds of figures plotted before it), so the figures are the same as the
+            ones saved without worker processes.
+
+        Returns
+        -------
+        res: ``list``
+            The result of :func:`PlotErrorOnGrid.save_fig` for each figure
+        """
+        if nb_process <= 0 or len(li_figs) <= 1 or not MATPLOT_OK:
+            return [self.save_fig(attr_nm, metrics, path_fig) for attr_nm, metrics, path_fig in li_figs]
+
+        # kinds of the figures plotted before each one (by the plot helper of this process)
+        li_kinds_before = []
+        kinds = set()
+        for attr_nm, metrics, _ in li_figs:
+            li_kinds_before.append(tuple(sorted(kinds)))
+            kind = self._get_kind(attr_nm, metrics)
+            if kind is not None:
+                kinds.add(kind)
+        limits = self.get_limits()
+        with ProcessPoolExecutor(max_workers=min(int(nb_process), len(li_figs)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_plot_worker,
+                                 initargs=(self.observation_space.cls_to_dict(),)) as executor:
+            li_res = list(executor.map(_save_fig_worker, *zip(*li_figs), [limits] * len(li_figs),
+                                       li_kinds_before))
+        # the plot helper of this process ends up as if it had plotted all the figures
+        self._set_limits(li_res[-1][1])
+        return [res for res, _ in li_res]
@@ -6,12 +6,15 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
+import numpy as np
+
 from leap_net.proxy.BaseProxy import BaseProxy
 
 # this will be used to compute the DC approximation
 from grid2op.Action._BackendAction import _BackendAction
 from grid2op.Action import CompleteAction
 from grid2op.Backend import PandaPowerBackend
+from grid2op.dtypes import dt_int
 
 
 class ProxyBackend(BaseProxy):
@@ -22,11 +25,17 @@ class ProxyBackend(BaseProxy):
     interface defined by `grid2op.Backend`.
 
     It should not cause any trouble to extend this class to deal with other type of Backends than PandaPowerBackend.
+
+    By default (`fast_set=True`) the state stored in the database is written directly in a `_BackendAction` that
+    is reused from one call to another: only the elements that changed since the previous state are flagged as
+    modified, and no grid2op action is created. Set `fast_set=False` to go through a regular grid2op
+    `CompleteAction` for each state instead.
     """
     def __init__(self,
                  path_grid_json,  # complete path where the grid is represented as a json file
                  name="dc_approx",
                  is_dc=True,
+                 fast_set=True,  # write directly the state in a reused backend action
                  attr_x=("prod_p", "prod_v", "load_p", "load_q", "topo_vect"),  # input that will be given to the proxy
                  attr_y=("a_or", "a_ex", "p_or", "p_ex", "q_or", "q_ex", "prod_q", "load_v", "v_or", "v_ex"),  # output that we want the proxy to predict
                  ):
@@ -61,6 +70,16 @@ class ProxyBackend(BaseProxy):
         for el in ("prod_p", "prod_v", "load_p", "load_q", "topo_vect"):
             self._indx_var[el] = self.attr_x.index(el)
 
+        # to set the state of the solver without creating new actions each time
+        self.fast_set = fast_set
+        self._bk_act = None  # backend action reused from one state to another
+        self._bk_act_attr = {"prod_p": "prod_p",
+                             "prod_v": "prod_v",
+                             "load_p": "load_p",
+                             "load_q": "load_q",
+                             "topo_vect": "current_topo"}
+        self._last_state = None  # last state sent to the solver (None if unknown)
+
     def build_model(self):
         """build the neural network used as proxy"""
         pass
@@ -95,9 +114,23 @@ class ProxyBackend(BaseProxy):
         if indx_train.shape[0] != 1:
             raise RuntimeError("Proxy Backend only supports running on 1 state at a time. "
                                "Please set \"train_batch_size\" and \"eval_batch_size\" to 1.")
+        if self.fast_set:
+            self._set_state_fast()
+        else:
+            self._set_state_action()
+        return None, None
+
+    def _set_state_action(self):
+        """
+        Set the state of the solver by creating a grid2op action (with all the injections and the topology) and
+        converting it to a backend action.
+
+        This is the "slow" way, kept for reference (and for backends that would not support the fast one).
+        """
         res = self._bk_act_class()
         act = self._act_class()
-        act.update({"set_bus": self._my_x[self._indx_var["topo_vect"]][0, :],
+        # the topology is stored as float in the database, grid2op expects integers
+        act.update({"set_bus": self._my_x[self._indx_var["topo_vect"]][0, :].astype(dt_int),
                     "injection": {
                         "prod_p": self._my_x[self._indx_var["prod_p"]][0, :],
                         "prod_v": self._my_x[self._indx_var["prod_v"]][0, :],
@@ -107,7 +140,59 @@ class ProxyBackend(BaseProxy):
                     })
         res += act
         self.solver.apply_action(res)
-        return None, None
+        # the reused backend action (if any) does not represent the state of the solver anymore
+        self._last_state = None
+
+    def _set_state_fast(self):
+        """
+        Set the state of the solver by writing the values stored in the database directly in a backend action
+        that is reused between calls.
+
+        Only the elements that changed since the last state sent to the solver are flagged as "changed", so that
+        the solver only modifies these elements.
+        """
+        if self._bk_act is None:
+            self._bk_act = self._bk_act_class()
+            self._last_state = None
+        bk_act = self._bk_act
+        bk_act.reset()
+
+        if self._last_state is None:
+            # first state (or state of the solver unknown): everything is modified
+            self._last_state = {}
+            for attr_nm, bk_attr_nm in self._bk_act_attr.items():
+                new_val = self._my_x[self._indx_var[attr_nm]][0, :]
+                store_ = getattr(bk_act, bk_attr_nm)
+                changed_ = self._get_changed_mask(attr_nm, new_val, None)
+                store_.values[changed_] = new_val[changed_]
+                store_.changed[changed_] = True
+                self._last_state[attr_nm] = 1.0 * new_val  # the "1.0 * " is here to force the copy...
+        else:
+            for attr_nm, bk_attr_nm in self._bk_act_attr.items():
+                new_val = self._my_x[self._indx_var[attr_nm]][0, :]
+                store_ = getattr(bk_act, bk_attr_nm)
+                last_val = self._last_state[attr_nm]
+                changed_ = self._get_changed_mask(attr_nm, new_val, last_val)
+                if np.any(changed_):
+                    store_.values[changed_] = new_val[changed_]
+                    store_.changed[changed_] = True
+                    last_val[changed_] = new_val[changed_]
+        self.solver.apply_action(bk_act)
+
+    def _get_changed_mask(self, attr_nm, new_val, last_val):
+        """
+        Compute which elements of `new_val` need to be sent to the solver.
+
+        The "validity" rules are the same as the one used by grid2op when an action is added to a backend action:
+        nan injections and topology equal to 0 are ignored.
+        """
+        if attr_nm == "topo_vect":
+            res = new_val != 0
+        else:
+            res = np.isfinite(new_val)
+        if last_val is not None:
+            res &= new_val != last_val
+        return res
 
     def _make_predictions(self, data, training=False):
         """
@@ -22,6 +22,8 @@ with warnings.catch_warnings():
 
 from leap_net.proxy.BaseNNProxy import BaseNNProxy
 from leap_net.LtauNoAdd import LtauNoAdd
+from leap_net.LtauMulti import LtauMulti
+from leap_net.LtauLowRank import LtauLowRank
 
 
 class ProxyLeapNet(BaseNNProxy):
@@ -59,8 +61,10 @@ class ProxyLeapNet(BaseNNProxy):
                  scale_main_layer=None,  # increase the size of the main layer
                  scale_input_dec_layer=None,  # scale the input of the decoder
                  scale_input_enc_layer=None,  # scale the input of the encoder
-                 layer=Dense,  # TODO (for save and restore)
-                 layer_act=None
+                 layer=Dense,  # saved if it is keras serializable (e.g. ResNetLayer)
+                 layer_act=None,
+                 fused_leap=False,  # use a single LtauMulti layer for all the tau vectors
+                 leap_rank=None,  # if not None, use LtauLowRank layers of this rank
                  ):
         BaseNNProxy.__init__(self,
                              name=name,
@@ -93,6 +97,9 @@ class ProxyLeapNet(BaseNNProxy):
         self._scale_main_layer = scale_main_layer
         self._scale_input_dec_layer = scale_input_dec_layer
         self._scale_input_enc_layer = scale_input_enc_layer
+        self._check_leap_options(fused_leap, leap_rank)
+        self._fused_leap = bool(fused_leap)
+        self._leap_rank = int(leap_rank) if leap_rank is not None else None
 
         # not to load multiple times the meta data
 
@@ -118,6 +125,7 @@ class ProxyLeapNet(BaseNNProxy):
         if self._model is not None:
             # model is already initialized
             return
+        self._shadow_model = None  # it was a copy of the previous model (if any)
         self._model = Sequential()
         inputs_x = [Input(shape=(el,), name="x_{}".format(nm_)) for el, nm_ in
                     zip(self._sz_x, self.attr_x)]
@@ -174,9 +182,17 @@ class ProxyLeapNet(BaseNNProxy):
 
         # now i do the leap net to encode the state
         encoded_state = lay
-        for input_tau, nm_ in zip(inputs_tau, self.attr_tau):
-            tmp = LtauNoAdd(name=f"leap_{nm_}")([lay, input_tau])
-            encoded_state = tf.keras.layers.add([encoded_state, tmp], name=f"adding_{nm_}")
+        if self._fused_leap and inputs_tau:
+            # all the tau vectors are handled by the same layer (same result as the sum of the LtauNoAdd)
+            tmp = LtauMulti(name="leap")([lay, *inputs_tau])
+            encoded_state = tf.keras.layers.add([encoded_state, tmp], name="adding_leap")
+        else:
+            for input_tau, nm_ in zip(inputs_tau, self.attr_tau):
+                if self._leap_rank is not None:
+                    tmp = LtauLowRank(self._leap_rank, add_input=False, name=f"leap_{nm_}")([lay, input_tau])
+                else:
+                    tmp = LtauNoAdd(name=f"leap_{nm_}")([lay, input_tau])
+                encoded_state = tf.keras.layers.add([encoded_state, tmp], name=f"adding_{nm_}")
 
         # i predict the full state of the grid given the input variables
         outputs_gm = []
@@ -238,6 +254,35 @@ class ProxyLeapNet(BaseNNProxy):
         # save the observation in the database
         super().store_obs(obs)
 
+    def store_batch(self, data):
+        """
+        store multiple rows (already extracted from the observations) into the "training database"
+
+        As for :func:`ProxyLeapNet.store_obs` the storing of X and Y is done in the base class.
+        """
+        nb_row = self.get_batch_size(data)
+        indx = self._get_batch_index(nb_row)
+        nb_keep = indx.shape[0]
+        for attr_nm, inp in zip(self.attr_tau, self._my_tau):
+            inp[indx, :] = data[attr_nm][(nb_row - nb_keep):, :]
+
+        # save the other data in the database
+        super().store_batch(data)
+
+    def _get_database_lists(self):
+        """the tau vectors are also stored in the database"""
+        res = super()._get_database_lists()
+        res["tau"] = (self.attr_tau, self._my_tau)
+        return res
+
+    def get_attr_database(self):
+        """the tau vectors are also stored in the database"""
+        res = list(super().get_attr_database())
+        for attr_nm in self.attr_tau:
+            if attr_nm not in res:
+                res.append(attr_nm)
+        return tuple(res)
+
     def init(self, obss):
         """
         Initialize all the meta data and the database for training
@@ -255,9 +300,7 @@ class ProxyLeapNet(BaseNNProxy):
             # ini the vector tau
             self._sz_tau = []
             for attr_nm in self.attr_tau:
-                arr_ = self._extract_obs(obss[0], attr_nm)
-                sz = arr_.size
-                self._sz_tau.append(sz)
+                self._sz_tau.append(self._get_init_size(obss, attr_nm))
 
         # init the rest (attributes of the base class)
         super().init(obss)
@@ -336,6 +379,16 @@ class ProxyLeapNet(BaseNNProxy):
         else:
             # i don't store anything if it's None
             pass
+        if self._fused_leap:
+            res["_fused_leap"] = True
+        else:
+            # i don't store anything if the leap layers are not fused
+            pass
+        if self._leap_rank is not None:
+            res["_leap_rank"] = int(self._leap_rank)
+        else:
+            # i don't store anything if it's None
+            pass
         return res
 
     def _init_database_shapes(self):
@@ -348,10 +401,24 @@ class ProxyLeapNet(BaseNNProxy):
         for sz in self._sz_tau:
             self._my_tau.append(np.zeros((self.max_row_training_set, sz), dtype=self.dtype))
 
-    def load_metadata(self, dict_):
+    def load_metadata(self, dict_, fused_leap=None):
         """
         load the metadata of this neural network (also called meta parameters) from a dictionary
+
+        Parameters
+        ----------
+        dict_: ``dict``
+            The metadata (see :func:`ProxyLeapNet.get_metadata`)
+
+        fused_leap: ``bool``
+            If not ``None``, whether the leap layers of this proxy are fused, whatever the value in the metadata.
+            This is used to convert a proxy into a proxy with fused leap layers (or the other way around), see
+            :func:`ProxyLeapNet.set_weights_from`.
         """
+        if fused_leap is not None:
+            dict_ = dict(dict_)
+            dict_["_fused_leap"] = bool(fused_leap)
+        self._check_leap_options(dict_.get("_fused_leap", False), dict_.get("_leap_rank"))
         self.attr_tau = tuple([str(el) for el in dict_["attr_tau"]])
         self._sz_tau = [int(el) for el in dict_["_sz_tau"]]
         super().load_metadata(dict_)
@@ -376,11 +443,76 @@ class ProxyLeapNet(BaseNNProxy):
             self._scale_input_enc_layer = int(dict_["_scale_input_enc_layer"])
         else:
             self._scale_input_enc_layer = None
+        self._fused_leap = bool(dict_.get("_fused_leap", False))
+        if "_leap_rank" in dict_:
+            self._leap_rank = int(dict_["_leap_rank"])
+        else:
+            self._leap_rank = None
         if "_layer_act" in dict_:
             self._layer_act = str(dict_["_layer_act"])
         else:
             self._layer_act = None
 
+    @staticmethod
+    def _check_leap_options(fused_leap, leap_rank):
+        """the leap layers cannot be both fused and of low rank (there is no fused low rank layer)"""
+        if fused_leap and leap_rank is not None:
+            raise RuntimeError("The leap layers cannot be both fused (\"fused_leap=True\") and of low rank "
+                               "(\"leap_rank\" is not None)")
+
+    def set_weights_from(self, other):
+        """
+        Copy the weights of the neural network of another ProxyLeapNet with the same architecture, except that its leap
+        layers can be fused (see the `fused_leap` argument) while the ones of this proxy are not (or the other way
+        around).
+
+        This can be used to convert a proxy trained with one :class:`leap_net.LtauNoAdd` per tau vector into a proxy
+        with a single :class:`leap_net.LtauMulti` layer (and back), both proxies making the same predictions. The
+        converted proxy gets the metadata of the other one with the `fused_leap` argument of
+        :func:`ProxyLeapNet.load_metadata`.
+
+        Examples
+        --------
+
+        .. code-block:: python
+
+            proxy = ProxyLeapNet(...)  # saved with fused_leap=False
+            agent = AgentWithProxy(actor, proxy)
+            agent.load(path_model)
+            agent.init(env)
+
+            fused_proxy = ProxyLeapNet(...)
+            fused_proxy.load_metadata(proxy.get_metadata(), fused_leap=True)
+            fused_proxy.build_model()
+            fused_proxy.set_weights_from(proxy)
+
+        """
+        if self._model is None or other._model is None:
+            raise RuntimeError("Both neural networks should be built before the weights are copied.")
+        other_layers = {layer.name: layer for layer in other._model.layers}
+        for layer in self._model.layers:
+            if not layer.weights:
+                continue
+            if layer.name in other_layers and type(layer) is type(other_layers[layer.name]):
+                layer.set_weights(other_layers[layer.name].get_weights())
+            elif isinstance(layer, LtauMulti):
+                # the other proxy has one LtauNoAdd per tau vector
+                layer.set_ltau_weights([self._get_layer(other_layers, f"leap_{nm_}") for nm_ in self.attr_tau])
+            elif isinstance(layer, LtauNoAdd):
+                # the other proxy has a single LtauMulti for all the tau vectors
+                fused_layer = self._get_layer(other_layers, "leap")
+                layer.set_weights(fused_layer.get_ltau_weights()[self.attr_tau.index(layer.name[len("leap_"):])])
+            else:
+                raise RuntimeError(f"Impossible to find the weights of the layer \"{layer.name}\" in the other "
+                                   f"neural network")
+
+    @staticmethod
+    def _get_layer(layers, name):
+        """get the layer with the given name, raise an explicit error if there is none"""
+        if name not in layers:
+            raise RuntimeError(f"No layer named \"{name}\" in the other neural network")
+        return layers[name]
+
     def _extract_data(self, indx_train):
         """
         extract from the training dataset, the data with indexes `indx_train`
@@ -436,9 +568,10 @@ class ProxyLeapNet(BaseNNProxy):
         # tmpy = [tf.convert_to_tensor((arr[indx_train, :] - m_) / sd_ * tmp_line_status if attr_n in self.line_attr else 1.0)
         #         for arr, m_, sd_, attr_n in zip(self._my_y, self._m_y, self._sd_y, self.attr_y)]
 
-        tmpx = [tf.convert_to_tensor(el) for el in tmpx]
-        tmpt = [tf.convert_to_tensor(el) for el in tmpt]
-        tmpy = [tf.convert_to_tensor(el) for el in tmpy]
+        with self.stage_timer.time("convert_to_tensor"):
+            tmpx = [tf.convert_to_tensor(el) for el in tmpx]
+            tmpt = [tf.convert_to_tensor(el) for el in tmpt]
+            tmpy = [tf.convert_to_tensor(el) for el in tmpy]
         return (tmpx, tmpt), tmpy
 
     def _post_process(self, predicted_state):
@@ -0,0 +1,182 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import json
+import shutil
+
+import numpy as np
+from tqdm import tqdm
+
+from leap_net.proxy.BaseProxy import extract_attr
+from leap_net.proxy.utils import reboot
+
+
+class RecordedDataset:
+    """
+    This class represents a stream of observations (or rather some of their attributes) recorded once on the
+    hard drive so that multiple proxies can be evaluated on it without having to run the environment again.
+
+    Each attribute is stored in a ".npy" file (one row per observation) that is memory mapped when the dataset
+    is read. A "metadata.json" file stores how the data have been generated.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        path_data = RecordedDataset.get_path("data_recorded", env_name, "RandomN1",
+                                             env_seed=0, agent_seed=42, chron_id_start=0)
+        if not RecordedDataset.exists(path_data):
+            reproducible_exp(env, agent=actor, env_seed=0, agent_seed=42, chron_id_start=0)
+            agent_with_proxy.record(env, total_evaluation_step, path_data)
+        agent_with_proxy.evaluate_recorded(RecordedDataset(path_data), load_path=...)
+
+    """
+    METADATA_NM = "metadata.json"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(os.path.join(self.path, self.METADATA_NM), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.nb_rows = int(self.metadata["nb_rows"])
+        self.attr_names = tuple([str(el) for el in self.metadata["attr_names"]])
+        self._data = {}
+
+    @staticmethod
+    def get_path(root_path, env_name, actor_name, env_seed=None, agent_seed=None, chron_id_start=None):
+        """
+        Get the path where the data generated with a given environment, actor and seeds are stored.
+        """
+        return os.path.join(root_path, f"{env_name}_{actor_name}_"
+                                       f"envseed{env_seed}_agentseed{agent_seed}_chron{chron_id_start}")
+
+    @classmethod
+    def exists(cls, path, nb_rows=None, attr_names=None):
+        """
+        Check whether a (complete) dataset is stored at the given path, with at least `nb_rows` rows and all the
+        attributes in `attr_names`
+        """
+        if not os.path.exists(os.path.join(path, cls.METADATA_NM)):
+            return False
+        dataset = cls(path)
+        if nb_rows is not None and dataset.nb_rows < nb_rows:
+            return False
+        if attr_names is not None and not set(attr_names).issubset(dataset.attr_names):
+            return False
+        return True
+
+    @classmethod
+    def record(cls,
+               env,
+               actor,
+               nb_rows,
+               path,
+               attr_names,
+               dtype=np.float32,
+               extract_fun=extract_attr,
+               metadata=None,
+               verbose=0):
+        """
+        Run the environment with the actor and record the attributes `attr_names` of the `nb_rows` first
+        observations.
+
+        The environment is run exactly like in :func:`AgentWithProxy.evaluate` so the recorded data are the same
+        as the one a proxy would see during an evaluation with the same seeds.
+
+        The "metadata.json" file is written last, so a dataset is considered as complete only once all the data
+        have been recorded.
+
+        Parameters
+        ----------
+        env:
+            The grid2op environment
+
+        actor:
+            The agent that takes the actions
+
+        nb_rows: ``int``
+            Number of observations to record
+
+        path: ``str``
+            Where the dataset is stored
+
+        attr_names:
+            Name of the attributes to record
+
+        dtype:
+            Type of the data stored
+
+        extract_fun:
+            Function used to extract an attribute from an observation: `extract_fun(obs, attr_nm)`. It should be
+            the one of the proxy evaluated on these data (see :func:`BaseProxy._extract_obs`)
+
+        metadata: ``dict``
+            Other information (json serializable) about how the data have been generated
+
+        verbose: ``int``
+            Degree of verbosity
+
+        Returns
+        -------
+        res: :class:`RecordedDataset`
+            The recorded dataset
+        """
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        attr_names = tuple(attr_names)
+
+        # same loop as in AgentWithProxy.evaluate (the reward and done flag of the reboot are not given to the actor)
+        reward = env.reward_range[0]
+        done = False
+        obs, *_ = reboot(env, actor)
+        # the size of each attribute is given by the first observation
+        arrays = {}
+        for attr_nm in attr_names:
+            sz = np.asarray(extract_fun(obs, attr_nm)).size
+            arrays[attr_nm] = np.lib.format.open_memmap(os.path.join(path, f"{attr_nm}.npy"),
+                                                        mode="w+",
+                                                        dtype=dtype,
+                                                        shape=(nb_rows, sz))
+        with tqdm(total=nb_rows, disable=verbose == 0) as pbar:
+            for row_id in range(nb_rows):
+                for attr_nm in attr_names:
+                    arrays[attr_nm][row_id, :] = np.asarray(extract_fun(obs, attr_nm)).reshape(-1)
+                act = actor.act(obs, reward, done)
+                obs, reward, done, info = env.step(act)
+                if done:
+                    obs, *_ = reboot(env, actor)
+                    done = False
+                pbar.update(1)
+        for arr_ in arrays.values():
+            arr_.flush()
+        del arrays
+
+        me = {}
+        if metadata is not None:
+            me.update(metadata)
+        me["nb_rows"] = int(nb_rows)
+        me["attr_names"] = [str(el) for el in attr_names]
+        me["dtype"] = np.dtype(dtype).name
+        with open(os.path.join(path, cls.METADATA_NM), "w", encoding="utf-8") as f:
+            json.dump(obj=me, fp=f, indent=4, sort_keys=True)
+        return cls(path)
+
+    def get(self, attr_nm):
+        """get the (memory mapped) array representing the attribute `attr_nm`"""
+        if attr_nm not in self._data:
+            if attr_nm not in self.attr_names:
+                raise RuntimeError(f"The attribute \"{attr_nm}\" has not been recorded in the dataset "
+                                   f"at \"{self.path}\".")
+            self._data[attr_nm] = np.load(os.path.join(self.path, f"{attr_nm}.npy"), mmap_mode="r")
+        return self._data[attr_nm]
+
+    def get_rows(self, attr_names, beg_, end_):
+        """get the rows `beg_` (included) to `end_` (excluded) of the attributes `attr_names` as a dictionary"""
+        return {attr_nm: np.array(self.get(attr_nm)[beg_:end_]) for attr_nm in attr_names}
@@ -0,0 +1,176 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+import math
+import time
+from contextlib import contextmanager, nullcontext
+
+# returned (and reused) when the timer is disabled
+_NO_TIMING = nullcontext()
+
+
+class StageTimer:
+    """
+    Record the time spent in the different stages of the training / evaluation of a proxy (for example
+    "env_step", "train_on_batch" or "save").
+
+    For each stage it keeps the number of calls, the total, min and max durations and an histogram of the durations
+    with buckets of increasing (power of 2) sizes: the bucket `i` counts the durations in :math:`[2^{i-1}, 2^i)`
+    microseconds (the first one counts all the durations below 1 microsecond).
+
+    Stages can be nested (for example "convert_to_tensor" is part of "extract_data") so the total of all the stages
+    is not the wall clock time of the run.
+
+    When the timer is disabled (the default), :func:`StageTimer.time` only returns a context manager that does
+    nothing, so the instrumentation can be left in the "hot" code.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        timer = StageTimer(enabled=True)
+        with timer.time("env_step"):
+            obs, reward, done, info = env.step(act)
+        print(timer.get_summary()["env_step"]["mean_ms"])
+
+    Attributes
+    ----------
+    enabled: ``bool``
+        Whether the durations are recorded or not
+
+    """
+    NB_BUCKET = 40  # the last bucket counts everything above 2**38 microseconds (~3 days)
+
+    def __init__(self, enabled=False):
+        self.enabled = bool(enabled)
+        # for each stage: [count, total, min, max, histogram] (durations in seconds)
+        self._stages = {}
+
+    def time(self, stage):
+        """
+        Context manager that records the time spent in its body for the stage `stage` (if the timer is enabled)
+        """
+        if not self.enabled:
+            return _NO_TIMING
+        return self._time(stage)
+
+    @contextmanager
+    def _time(self, stage):
+        beg_ = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - beg_)
+
+    def record(self, stage, duration):
+        """
+        Record that a call to the stage `stage` lasted `duration` seconds (even if the timer is disabled)
+        """
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = [0, 0., duration, duration, [0 for _ in range(self.NB_BUCKET)]]
+            self._stages[stage] = stats
+        stats[0] += 1
+        stats[1] += duration
+        if duration < stats[2]:
+            stats[2] = duration
+        if duration > stats[3]:
+            stats[3] = duration
+        # frexp returns the exponent `e` such that 2**(e-1) <= x < 2**e
+        bucket = math.frexp(duration * 1e6)[1]
+        stats[4][min(max(bucket, 0), self.NB_BUCKET - 1)] += 1
+
+    def reset(self):
+        """remove everything that has been recorded"""
+        self._stages = {}
+
+    def get_stages(self):
+        """name of the stages that have been recorded (in the order of their first call)"""
+        return list(self._stages.keys())
+
+    def get_total_time(self, stage):
+        """total time (in seconds) spent in a stage (0. if it has never been called)"""
+        if stage not in self._stages:
+            return 0.
+        return self._stages[stage][1]
+
+    def get_summary(self):
+        """
+        Summary of the recorded durations, in a json serializable format.
+
+        Returns
+        -------
+        res: ``dict``
+            For each stage: the number of calls ("count"), the total time in seconds ("total_s"), the mean, min and
+            max durations in milliseconds ("mean_ms", "min_ms", "max_ms"), the 50th, 95th and 99th percentiles (in
+            milliseconds, estimated with the upper bound of the buckets of the histogram, so they are at most
+            2 times too high) and the non empty buckets of the histogram ("histogram": key is the upper bound of
+            the bucket, in microseconds, value is the number of calls)
+
+        """
+        res = {}
+        for stage, (count, total, min_, max_, hist) in self._stages.items():
+            res[stage] = {"count": int(count),
+                          "total_s": float(total),
+                          "mean_ms": 1000. * float(total) / count,
+                          "min_ms": 1000. * float(min_),
+                          "max_ms": 1000. * float(max_),
+                          "p50_ms": self._get_percentile(hist, count, max_, 50.),
+                          "p95_ms": self._get_percentile(hist, count, max_, 95.),
+                          "p99_ms": self._get_percentile(hist, count, max_, 99.),
+                          "histogram": {f"{2 ** bucket}": int(nb) for bucket, nb in enumerate(hist) if nb > 0}
+                          }
+        return res
+
+    def save_tensorboard(self, tf_writer, step):
+        """
+        save the mean duration (in ms) and the total time (in s) of each stage in tensorboard.
+
+        It should be called within the writer context (`with tf_writer.as_default():`)
+        """
+        import tensorflow as tf
+        for name, value, description in self.get_tensorboard_scalars():
+            tf.summary.scalar(name, value, step, description=description)
+
+    def get_tensorboard_scalars(self):
+        """the scalars written by :func:`StageTimer.save_tensorboard`, as tuples `(name, value, description)`"""
+        res = []
+        for stage, (count, total, min_, max_, hist) in self._stages.items():
+            res.append((f"timing/{stage}_mean_ms", 1000. * total / count, f"Mean duration of \"{stage}\" (ms)"))
+            res.append((f"timing/{stage}_total_s", total, f"Total time spent in \"{stage}\" (s)"))
+        return res
+
+    def to_dict(self):
+        """json serializable representation of everything that has been recorded"""
+        return {stage: {"count": int(count),
+                        "total": float(total),
+                        "min": float(min_),
+                        "max": float(max_),
+                        "histogram": [int(el) for el in hist]}
+                for stage, (count, total, min_, max_, hist) in self._stages.items()}
+
+    def from_dict(self, dict_):
+        """restore what has been recorded from the output of :func:`StageTimer.to_dict`"""
+        self._stages = {}
+        for stage, stats in dict_.items():
+            hist = [int(el) for el in stats["histogram"]]
+            if len(hist) != self.NB_BUCKET:
+                raise RuntimeError(f"The histogram of the stage \"{stage}\" has {len(hist)} buckets "
+                                   f"(expected {self.NB_BUCKET}).")
+            self._stages[stage] = [int(stats["count"]), float(stats["total"]), float(stats["min"]),
+                                   float(stats["max"]), hist]
+
+    def _get_percentile(self, hist, count, max_, q):
+        """estimation (in ms) of the percentile `q` from the histogram (upper bound of the bucket)"""
+        target = q / 100. * count
+        cum_ = 0
+        for bucket, nb in enumerate(hist):
+            cum_ += nb
+            if nb > 0 and cum_ >= target:
+                return min(1e-3 * 2 ** bucket, 1000. * float(max_))
+        return 1000. * float(max_)
@@ -0,0 +1,114 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import threading
+
+import tensorflow as tf
+
+
+class TensorboardSink:
+    """
+    This class buffers the scalars sent to tensorboard and writes them in a background thread.
+
+    Values are accumulated in memory with :func:`TensorboardSink.add` (for example the losses of each training
+    iteration). When :func:`TensorboardSink.flush` is called, the mean of the values received since the last flush is
+    written under the name of the scalar, and their min and max under "name_min" and "name_max". Other scalars
+    can be written "as is" at the same time (for example the timings of the different stages).
+
+    The values are written in a background thread, only one flush is written at a time: flushing while the
+    previous flush is still being written waits for the previous one to be finished.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        sink = TensorboardSink(tf.summary.create_file_writer(logpath))
+        for train_iter in range(1, nb_iter + 1):
+            sink.add("loss", train_one_batch())
+            if train_iter % 256 == 0:
+                sink.flush(train_iter)
+        sink.flush(nb_iter)
+        sink.wait()
+
+    """
+    def __init__(self, tf_writer):
+        self.tf_writer = tf_writer
+        # for each scalar: [count, sum, min, max, description]
+        self._window = {}
+        self._thread = None
+        self._error = None
+
+    def add(self, name, value, description=None):
+        """
+        Add a value to the current window of the scalar `name` (nothing is written until the next flush)
+        """
+        value = float(value)
+        stats = self._window.get(name)
+        if stats is None:
+            self._window[name] = [1, value, value, value, description]
+            return
+        stats[0] += 1
+        stats[1] += value
+        if value < stats[2]:
+            stats[2] = value
+        if value > stats[3]:
+            stats[3] = value
+
+    def is_empty(self):
+        """whether some values have been added since the last flush"""
+        return not self._window
+
+    def flush(self, step, scalars=None):
+        """
+        Write (in a background thread) the aggregated values of the current window and start a new one.
+
+        Parameters
+        ----------
+        step: ``int``
+            The step at which the values are written
+
+        scalars: ``list``
+            Other scalars, written as they are, given by tuples `(name, value, description)`
+
+        """
+        self.wait()
+        li_scalars = []
+        for name, (count, sum_, min_, max_, description) in self._window.items():
+            li_scalars.append((name, sum_ / count, description))
+            li_scalars.append((f"{name}_min", min_, None))
+            li_scalars.append((f"{name}_max", max_, None))
+        if scalars is not None:
+            li_scalars += [(name, float(value), description) for name, value, description in scalars]
+        self._window = {}
+        if not li_scalars:
+            return
+        self._thread = threading.Thread(target=self._write_background,
+                                        args=(int(step), li_scalars),
+                                        name="leap_net_tensorboard")
+        self._thread.start()
+
+    def wait(self):
+        """wait for the last flush (if any) to be written, and raise the error that occurred (if any)"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise RuntimeError("Error while writing in tensorboard") from error
+
+    def _write_background(self, step, li_scalars):
+        try:
+            # the default writer is local to a thread
+            with self.tf_writer.as_default():
+                for name, value, description in li_scalars:
+                    tf.summary.scalar(name, value, step, description=description)
+            self.tf_writer.flush()
+        except Exception as exc_:
+            self._error = exc_
@@ -11,5 +11,14 @@ from leap_net.proxy.BaseNNProxy import BaseNNProxy
 from leap_net.proxy.ProxyBackend import ProxyBackend
 from leap_net.proxy.ProxyLeapNet import ProxyLeapNet
 from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.ParallelCollector import ParallelCollector
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
+from leap_net.proxy.RecordedDataset import RecordedDataset
 from leap_net.proxy.utils import reproducible_exp
-from leap_net.proxy.utils import DEFAULT_METRICS
\ No newline at end of file
+from leap_net.proxy.utils import DEFAULT_METRICS
+from leap_net.proxy.utils import STREAMING_METRICS
+from leap_net.proxy.PlotErrorOnGrid import PlotErrorOnGrid
+from leap_net.proxy.StageTimer import StageTimer
+from leap_net.proxy.TensorboardSink import TensorboardSink
+from leap_net.proxy.InitDataset import InitDataset
+from leap_net.proxy.MultiAgentWithProxy import MultiAgentWithProxy
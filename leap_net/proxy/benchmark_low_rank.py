@@ -0,0 +1,113 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import time
+import numpy as np
+
+import tensorflow as tf
+from tensorflow.keras.layers import Input
+from tensorflow.keras.models import Model
+
+from leap_net.Ltau import Ltau
+from leap_net.LtauLowRank import LtauLowRank
+
+
+def make_data(nb_row, dim_x, dim_tau, nb_change, teacher_rank, rng):
+    """
+    Synthetic dataset: `x` is gaussian, `tau` is a binary vector with `nb_change` ones per row (as a topology with
+    a few changes) and `y = x + d.(e.x * tau)` where `e` and `d` are random matrices of rank `teacher_rank` (scaled
+    so that `d.(e.x * tau)` has a variance close to 1).
+    """
+    x = rng.normal(size=(nb_row, dim_x)).astype(np.float32)
+    tau = np.zeros((nb_row, dim_tau), dtype=np.float32)
+    cols = rng.integers(0, dim_tau, size=(nb_row, nb_change))
+    tau[np.arange(nb_row)[:, None], cols] = 1.
+    e = rng.normal(size=(dim_x, teacher_rank)) @ rng.normal(size=(teacher_rank, dim_tau))
+    e /= np.sqrt(teacher_rank * dim_x)
+    d = rng.normal(size=(dim_tau, teacher_rank)) @ rng.normal(size=(teacher_rank, dim_x))
+    d /= np.sqrt(teacher_rank * nb_change)
+    y = (x + ((x @ e) * tau) @ d).astype(np.float32)
+    return x, tau, y
+
+
+def build_model(dim_x, dim_tau, rank, lr):
+    """a single leap layer, full rank (`rank` is None) or low rank"""
+    x = Input(shape=(dim_x,), name="x")
+    tau = Input(shape=(dim_tau,), name="tau")
+    if rank is None:
+        res = Ltau(name="leap")((x, tau))
+    else:
+        res = LtauLowRank(rank, name="leap")((x, tau))
+    model = Model(inputs=[x, tau], outputs=[res])
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=lr), loss="mse")
+    return model
+
+
+def time_prediction(model, x, tau, nb_repeat):
+    """best time (in s) over `nb_repeat` predictions of the whole batch (in a tf.function)"""
+    fun = tf.function(lambda x_, tau_: model((x_, tau_), training=False))
+    x = tf.convert_to_tensor(x)
+    tau = tf.convert_to_tensor(tau)
+    fun(x, tau)  # trace the function
+    best_time = np.inf
+    for _ in range(nb_repeat):
+        beg_ = time.perf_counter()
+        fun(x, tau).numpy()
+        best_time = min(best_time, time.perf_counter() - beg_)
+    return best_time
+
+
+def main(ranks=(None, 4, 16, 64),
+         dim_x=150,  # size of the main layer of the proxies
+         dim_tau=1000,  # size of a topology vector on a large grid
+         nb_change=3,
+         teacher_rank=16,
+         nb_row_train=16384,
+         nb_row_test=4096,
+         nb_epoch=10,
+         batch_size=32,
+         lr=1e-3,
+         eval_batch_size=1024,
+         nb_repeat=20,
+         seed=0,
+         verbose=1):
+    """
+    Compare a (full rank) :class:`leap_net.Ltau` layer with :class:`leap_net.LtauLowRank` layers of different ranks:
+    number of parameters, time to make a prediction on a batch of size `eval_batch_size` and mean squared error on a
+    test set after `nb_epoch` epochs of training on a synthetic dataset (see :func:`make_data`).
+
+    `None` in `ranks` stands for the full rank :class:`leap_net.Ltau`.
+    """
+    rng = np.random.default_rng(seed)
+    tf.random.set_seed(seed)
+    x, tau, y = make_data(nb_row_train + nb_row_test, dim_x, dim_tau, nb_change, teacher_rank, rng)
+    x_train, tau_train, y_train = x[:nb_row_train], tau[:nb_row_train], y[:nb_row_train]
+    x_test, tau_test, y_test = x[nb_row_train:], tau[nb_row_train:], y[nb_row_train:]
+
+    res = {}
+    for rank in ranks:
+        model = build_model(dim_x, dim_tau, rank, lr)
+        beg_ = time.perf_counter()
+        model.fit(x=[x_train, tau_train], y=y_train, epochs=nb_epoch, batch_size=batch_size, verbose=0)
+        train_time = time.perf_counter() - beg_
+        y_hat = model.predict([x_test, tau_test], batch_size=eval_batch_size, verbose=0)
+        pred_time = time_prediction(model, x_test[:eval_batch_size], tau_test[:eval_batch_size], nb_repeat)
+        nm_ = "full" if rank is None else f"rank_{rank}"
+        res[nm_] = {"nb_params": int(model.count_params()),
+                    "train_s": float(train_time),
+                    "predict_ms": 1000. * float(pred_time),
+                    "test_mse": float(np.mean((y_hat - y_test) ** 2))}
+        if verbose:
+            print(f"{nm_:>8}: {res[nm_]['nb_params']:>8} parameters, training {train_time:.1f}s, "
+                  f"prediction {res[nm_]['predict_ms']:.3f}ms ({eval_batch_size} rows), "
+                  f"test mse {res[nm_]['test_mse']:.4f}")
+    return res
+
+
+if __name__ == "__main__":
+    main()
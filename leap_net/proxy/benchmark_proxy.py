@@ -0,0 +1,308 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+try:
+    import resource
+    RESOURCE_OK = True
+except ImportError:
+    # not available on windows
+    RESOURCE_OK = False
+
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
+from leap_net.proxy.ProxyLeapNet import ProxyLeapNet
+from leap_net.proxy.RecordedDataset import RecordedDataset
+
+# version of the format of the json file written by this benchmark
+BENCHMARK_VERSION = 1
+
+
+def load_proxy(proxy_class, proxy_kwargs, path_model, ext=".h5"):
+    """
+    Build a proxy and load it from `path_model` (a directory written by :func:`AgentWithProxy.save`: the last
+    checkpoint is loaded, see :class:`CheckpointWriter`)
+    """
+    proxy = proxy_class(**proxy_kwargs)
+    path_ckpt = CheckpointWriter.get_checkpoint_path(path_model)
+    with open(os.path.join(path_ckpt, "metadata.json"), "r", encoding="utf-8") as f:
+        me = json.load(f)
+    proxy.load_metadata(me["proxy"])
+    proxy.build_model()
+    proxy.load_data(path=path_ckpt, ext=ext)
+    return proxy
+
+
+def get_attr_sizes(proxy):
+    """get the size of all the attributes stored in the database of the proxy (from `_sz_x`, `_sz_y`
+    and `_sz_tau` if any)"""
+    res = {}
+    li_attrs = [(proxy.attr_x, proxy._sz_x), (proxy.attr_y, proxy._sz_y)]
+    if getattr(proxy, "_sz_tau", None) is not None:
+        li_attrs.append((proxy.attr_tau, proxy._sz_tau))
+    for attrs, sizes in li_attrs:
+        for attr_nm, sz in zip(attrs, sizes):
+            res[attr_nm] = int(sz)
+    return res
+
+
+def make_synthetic_data(proxy, nb_row, seed=0):
+    """
+    Generate `nb_row` random rows for each attribute of the database of the proxy.
+
+    The values are drawn around the means and standard deviations used by the proxy to scale its data (if any).
+    Topologies are random bus assignments and powerlines are all connected. Values are not physically consistent:
+    they only have the right shapes for timing purposes.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = get_attr_sizes(proxy)
+    scalings = {}
+    for suffix in ["x", "y", "tau"]:
+        attrs = getattr(proxy, f"attr_{suffix}", None)
+        means = getattr(proxy, f"_m_{suffix}", None)
+        sds = getattr(proxy, f"_sd_{suffix}", None)
+        if attrs is None or means is None or sds is None:
+            continue
+        for attr_nm, m_, sd_ in zip(attrs, means, sds):
+            scalings[attr_nm] = (np.asarray(m_, dtype=np.float64), np.asarray(sd_, dtype=np.float64))
+
+    data = {}
+    for attr_nm in proxy.get_attr_database():
+        sz = sizes[attr_nm]
+        if attr_nm == "topo_vect":
+            tmp = rng.integers(1, 3, size=(nb_row, sz))
+        elif attr_nm == "line_status":
+            tmp = np.ones((nb_row, sz))
+        elif attr_nm in scalings:
+            m_, sd_ = scalings[attr_nm]
+            tmp = m_ + sd_ * rng.normal(size=(nb_row, sz))
+        else:
+            tmp = rng.normal(size=(nb_row, sz))
+        data[attr_nm] = tmp.astype(proxy.dtype)
+    return data
+
+
+def get_peak_rss_mb():
+    """peak resident memory of the current process (in MB) or ``None`` if it cannot be measured"""
+    # on linux, "ru_maxrss" is kept when a process is "exec", so it would count the memory of the parent process
+    # (that started the benchmark), whereas "VmHWM" is reset
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return float(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    if not RESOURCE_OK:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # bytes on macos, kilobytes on linux
+        return float(peak) / 1024. ** 2
+    return float(peak) / 1024.
+
+
+def get_git_commit():
+    """commit of the leap_net sources used (if they are in a git repository)"""
+    try:
+        res = subprocess.run(["git", "rev-parse", "HEAD"],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        return res.stdout.decode("utf-8").strip()
+    except Exception:
+        return None
+
+
+def _set_nb_thread(nb_thread):
+    """limit the number of threads used by tensorflow (should be called before tensorflow is used)"""
+    if nb_thread is None:
+        return
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(int(nb_thread))
+    tf.config.threading.set_inter_op_parallelism_threads(int(nb_thread))
+
+
+def benchmark_batch_size(proxy, data, batch_size, nb_batch, nb_warmup=2):
+    """
+    Time `nb_batch` calls to "store_batch + predict" with batches of `batch_size` rows (after `nb_warmup` calls
+    that are not timed). Rows are taken from `data`, cycling through it if needed.
+
+    Returns
+    -------
+    res: ``dict``
+        The latency percentiles (in ms) of a call, and the number of rows processed per second
+    """
+    proxy.reset_database(max_row_training_set=batch_size, eval_batch_size=batch_size)
+    attr_names = proxy.get_attr_database()
+    nb_row_data = min(data[attr_nm].shape[0] for attr_nm in attr_names)
+    if nb_row_data < batch_size:
+        raise RuntimeError(f"At least {batch_size} rows are needed to benchmark a batch size of {batch_size}, "
+                           f"only {nb_row_data} are available.")
+    nb_slice = nb_row_data // batch_size
+    batches = [{attr_nm: data[attr_nm][(i * batch_size):((i + 1) * batch_size)] for attr_nm in attr_names}
+               for i in range(nb_slice)]
+
+    latencies = np.zeros(nb_batch, dtype=np.float64)
+    for it_num in range(nb_warmup + nb_batch):
+        batch = batches[it_num % nb_slice]
+        beg_ = time.perf_counter()
+        proxy.store_batch(batch)
+        proxy.predict(force=True)
+        end_ = time.perf_counter()
+        if it_num >= nb_warmup:
+            latencies[it_num - nb_warmup] = end_ - beg_
+
+    total_time = float(np.sum(latencies))
+    res = {"batch_size": int(batch_size),
+           "nb_batch": int(nb_batch),
+           "latency_ms_p50": 1000. * float(np.percentile(latencies, 50)),
+           "latency_ms_p95": 1000. * float(np.percentile(latencies, 95)),
+           "latency_ms_p99": 1000. * float(np.percentile(latencies, 99)),
+           "latency_ms_mean": 1000. * float(np.mean(latencies)),
+           "rows_per_s": float(batch_size * nb_batch / total_time) if total_time > 0. else None,
+           }
+    return res
+
+
+def run_benchmark(proxy_class,
+                  proxy_kwargs,
+                  path_model,
+                  ext=".h5",
+                  batch_sizes=(1, 32, 1024),
+                  nb_thread=None,
+                  nb_batch=100,
+                  nb_warmup=2,
+                  path_recorded_data=None,
+                  seed=0):
+    """
+    Run the benchmark for all the batch sizes, in the current process, with `nb_thread` threads for tensorflow
+    (``None``: tensorflow default).
+
+    Batch sizes are processed by increasing size, "peak_rss_mb" is the peak memory of the process once a given
+    batch size has been benchmarked.
+    """
+    _set_nb_thread(nb_thread)
+    proxy = load_proxy(proxy_class, proxy_kwargs, path_model, ext=ext)
+    batch_sizes = sorted(int(el) for el in batch_sizes)
+    nb_row = 2 * max(batch_sizes)
+    if path_recorded_data is not None:
+        dataset = RecordedDataset(path_recorded_data)
+        nb_row = min(nb_row, dataset.nb_rows)
+        data = dataset.get_rows(proxy.get_attr_database(), 0, nb_row)
+    else:
+        data = make_synthetic_data(proxy, nb_row, seed=seed)
+
+    res = []
+    for batch_size in batch_sizes:
+        tmp = benchmark_batch_size(proxy, data, batch_size, nb_batch, nb_warmup=nb_warmup)
+        tmp["nb_thread"] = nb_thread
+        tmp["peak_rss_mb"] = get_peak_rss_mb()
+        res.append(tmp)
+    return res
+
+
+def _run_benchmark_worker(res_queue, kwargs):
+    """function run in a separate process to benchmark one number of threads"""
+    try:
+        res_queue.put(("ok", run_benchmark(**kwargs)))
+    except Exception as exc_:
+        res_queue.put(("error", f"{type(exc_).__name__}: {exc_}"))
+
+
+def main(path_model,
+         proxy_class=ProxyLeapNet,
+         proxy_kwargs=None,
+         ext=".h5",
+         batch_sizes=(1, 8, 32, 128, 1024),
+         nb_threads=(1, 2, 4),  # tensorflow threads, each value is benchmarked in a new process
+         nb_batch=100,
+         nb_warmup=2,
+         path_recorded_data=None,  # use data recorded with AgentWithProxy.record instead of random ones
+         seed=0,
+         output_path=None,  # where the json is written
+         verbose=1):
+    """
+    Benchmark the latency and the throughput of a (trained) proxy, without any grid2op environment.
+
+    The proxy is loaded from `path_model` and fed with synthetic (or recorded) data by batches of different sizes.
+    Each number of threads is benchmarked in a new process (tensorflow cannot change its number of threads once
+    started), which also makes the peak memory of each configuration comparable.
+
+    The results are returned (and written in `output_path` if not ``None``) as a json serializable dictionary,
+    with the commit of the code, the versions of the main packages and the parameters of the benchmark, so that
+    the results of different commits can be compared.
+    """
+    if proxy_kwargs is None:
+        proxy_kwargs = {"name": os.path.basename(os.path.normpath(path_model))}
+    if nb_threads is None:
+        nb_threads = (None,)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for nb_thread in nb_threads:
+        kwargs = {"proxy_class": proxy_class,
+                  "proxy_kwargs": proxy_kwargs,
+                  "path_model": path_model,
+                  "ext": ext,
+                  "batch_sizes": batch_sizes,
+                  "nb_thread": nb_thread,
+                  "nb_batch": nb_batch,
+                  "nb_warmup": nb_warmup,
+                  "path_recorded_data": path_recorded_data,
+                  "seed": seed}
+        res_queue = ctx.Queue()
+        process = ctx.Process(target=_run_benchmark_worker, args=(res_queue, kwargs))
+        process.start()
+        status, res = res_queue.get()
+        process.join()
+        if status != "ok":
+            raise RuntimeError(f"Benchmark with {nb_thread} thread(s) failed: {res}")
+        results += res
+        if verbose:
+            for el in res:
+                print(f"{el['nb_thread']} thread(s), batch size {el['batch_size']:5d}: "
+                      f"p50 {el['latency_ms_p50']:.2f}ms, p95 {el['latency_ms_p95']:.2f}ms, "
+                      f"p99 {el['latency_ms_p99']:.2f}ms, {el['rows_per_s']:.0f} rows/s, "
+                      f"peak RSS {el['peak_rss_mb']}MB")
+
+    import tensorflow as tf
+    res = {"benchmark_version": BENCHMARK_VERSION,
+           "git_commit": get_git_commit(),
+           "platform": platform.platform(),
+           "python": platform.python_version(),
+           "numpy": np.__version__,
+           "tensorflow": tf.__version__,
+           "cpu_count": os.cpu_count(),
+           "config": {"path_model": os.path.abspath(path_model),
+                      "proxy_class": proxy_class.__name__,
+                      "ext": ext,
+                      "batch_sizes": [int(el) for el in batch_sizes],
+                      "nb_threads": list(nb_threads),
+                      "nb_batch": int(nb_batch),
+                      "nb_warmup": int(nb_warmup),
+                      "data": "recorded" if path_recorded_data is not None else "synthetic",
+                      "seed": int(seed)},
+           "results": sorted(results, key=lambda el: (el["nb_thread"] if el["nb_thread"] is not None else -1,
+                                                      el["batch_size"]))
+           }
+    if output_path is not None:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(obj=res, fp=f, indent=4, sort_keys=True)
+    return res
+
+
+if __name__ == "__main__":
+    main(path_model=os.path.join("model_saved", "leapnet_case_14"))
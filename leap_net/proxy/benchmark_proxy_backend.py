@@ -0,0 +1,99 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import time
+import numpy as np
+
+from leap_net.proxy.utils import create_env, reproducible_exp
+from leap_net.agents import RandomN1
+from leap_net.proxy.ProxyBackend import ProxyBackend
+
+
+def gather_observations(env, actor, nb_states):
+    """run the environment with the actor and keep the `nb_states` first (non game over) observations"""
+    obss = []
+    reward = env.reward_range[0]
+    done = False
+    obs = env.reset()
+    while len(obss) < nb_states:
+        act = actor.act(obs, reward, done)
+        obs, reward, done, info = env.step(act)
+        if done:
+            obs = env.reset()
+            reward = env.reward_range[0]
+            done = False
+            continue
+        obss.append(obs)
+    return obss
+
+
+def run_proxy(proxy, obss):
+    """feed all the observations to the proxy, and returns the time spent (in s) as well as all the predictions"""
+    preds = []
+    beg_ = time.perf_counter()
+    for obs in obss:
+        proxy.store_obs(obs)
+        preds.append(proxy.predict())
+    total_time = time.perf_counter() - beg_
+    return total_time, preds
+
+
+def main(env_name="l2rpn_case14_sandbox",
+         use_lightsim_if_available=False,  # the proxy is based on a PandaPowerBackend anyway
+         nb_states=1000,
+         is_dc=True,
+         env_seed=0,
+         agent_seed=42,
+         verbose=1):
+    """
+    Compare the number of states per second a `ProxyBackend` can process when the solver is set with regular
+    grid2op actions (`fast_set=False`) or directly from the arrays of the database (`fast_set=True`).
+
+    The same observations are given to both proxies, and the predictions are checked to be equal.
+    """
+    env = create_env(env_name, use_lightsim_if_available=use_lightsim_if_available)
+    actor = RandomN1(env.action_space)
+    reproducible_exp(env, agent=actor, env_seed=env_seed, agent_seed=agent_seed)
+    obss = gather_observations(env, actor, nb_states)
+
+    res = {}
+    all_preds = {}
+    for fast_set in [False, True]:
+        nm_ = "fast_set" if fast_set else "action"
+        proxy = ProxyBackend(env._init_grid_path,
+                             name=f"benchmark_{nm_}",
+                             is_dc=is_dc,
+                             fast_set=fast_set)
+        proxy.init([obss[0]])
+        # run once to make sure everything is loaded
+        proxy.store_obs(obss[0])
+        proxy.predict()
+
+        total_time, preds = run_proxy(proxy, obss)
+        res[nm_] = {"total_time_s": float(total_time),
+                    "states_per_s": float(nb_states / total_time)}
+        all_preds[nm_] = preds
+        if verbose:
+            print(f"{nm_}: {nb_states} states in {total_time:.2f}s ({nb_states / total_time:.1f} states / s)")
+
+    # check that both methods give the same results
+    max_diff = 0.
+    for pred_action, pred_fast in zip(all_preds["action"], all_preds["fast_set"]):
+        for arr_action, arr_fast in zip(pred_action, pred_fast):
+            diff_ = np.abs(arr_action - arr_fast)
+            if np.any(np.isfinite(diff_)):
+                max_diff = max(max_diff, float(np.nanmax(diff_)))
+    res["max_abs_diff"] = max_diff
+    if verbose:
+        print(f"Speed up: {res['fast_set']['states_per_s'] / res['action']['states_per_s']:.2f}, "
+              f"max difference between the predictions: {max_diff:.2e}")
+    return res
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,7 @@ def main(
         use_lightsim_if_available=True,
         val_regex=".*Scenario_february_0[0-9].*",
         model_name="leapnet_case_118",
-        layer=ResNetLayer,  # for now this is not serialized in the model
+        layer=ResNetLayer,  # only used if the saved model does not say which layer it uses
         # parameters for the evaluation
         do_dc=True,
         do_N1 = True,
@@ -27,6 +27,8 @@ def main(
         li_batch_size=tuple(),  # if you want to study the impact of the batch size
         total_evaluation_step=int(1024) * int(128),
         pred_batch_size=int(1024) * int(32),
+        streaming=False,  # if True, predictions are made by chunks of "pred_batch_size" and stored on the hard drive
+        path_recorded_data=None,  # if not None, the environment is run once and the data are stored there
         save_path_final_results="model_results_118",  # where the information about the prediction will be stored
         metrics=DEFAULT_METRICS,  # which metrics are used to evaluate the performance of the model
         verbose=1,  # do I print the results of the model
@@ -47,6 +49,8 @@ def main(
             li_batch_size=li_batch_size,
             total_evaluation_step=total_evaluation_step,
             pred_batch_size=pred_batch_size,
+            streaming=streaming,
+            path_recorded_data=path_recorded_data,
             save_path_final_results=save_path_final_results,
             metrics=metrics,
             verbose=verbose,
@@ -9,13 +9,58 @@
 import re
 import os
 import matplotlib.pyplot as plt
-from leap_net.proxy.utils import create_env, reproducible_exp, DEFAULT_METRICS
+from leap_net.proxy.utils import create_env, reproducible_exp, DEFAULT_METRICS, STREAMING_METRICS
 
 from leap_net.ResNetLayer import ResNetLayer
 from leap_net.agents import RandomN1, RandomN2
 from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
 from leap_net.proxy.ProxyLeapNet import ProxyLeapNet
 from leap_net.proxy.ProxyBackend import ProxyBackend
+from leap_net.proxy.RecordedDataset import RecordedDataset
+
+
+def get_recorded_data(env,
+                      agent_with_proxy,
+                      path_recorded_data,
+                      env_name,
+                      nb_rows,
+                      load_path,
+                      env_seed,
+                      agent_seed,
+                      chron_id_val,
+                      verbose=1):
+    """
+    Get the data recorded with the actor of `agent_with_proxy` and the given seeds. They are recorded if they do not
+    exist yet (or if they do not contain enough rows or all the attributes needed by the proxy).
+    """
+    actor = agent_with_proxy.actor
+    path_data = RecordedDataset.get_path(path_recorded_data,
+                                         env_name=env_name,
+                                         actor_name=type(actor).__name__,
+                                         env_seed=env_seed,
+                                         agent_seed=agent_seed,
+                                         chron_id_start=chron_id_val)
+    # load the metadata of the proxy to know which attributes are needed
+    agent_with_proxy._load_metadata(CheckpointWriter.get_checkpoint_path(load_path))
+    attr_names = agent_with_proxy._proxy.get_attr_database()
+    if not RecordedDataset.exists(path_data, nb_rows=nb_rows, attr_names=attr_names):
+        if verbose > 0:
+            print(f"Recording the data in \"{path_data}\"")
+        reproducible_exp(env,
+                         agent=actor,
+                         env_seed=env_seed,
+                         agent_seed=agent_seed,
+                         chron_id_start=chron_id_val)
+        agent_with_proxy.record(env,
+                                nb_rows,
+                                path_data,
+                                attr_names=attr_names,
+                                metadata={"env_seed": env_seed,
+                                          "agent_seed": agent_seed,
+                                          "chron_id_start": chron_id_val},
+                                verbose=verbose)
+    return RecordedDataset(path_data)
 
 
 def main(
@@ -25,7 +70,7 @@ def main(
         use_lightsim_if_available=True,
         val_regex=".*99[0-9].*",
         model_name="leapnet_case_14",
-        layer=ResNetLayer,  # for now this is not serialized in the model
+        layer=ResNetLayer,  # only used if the saved model does not say which layer it uses
         # parameters for the evaluation
         do_dc=True,
         do_N1 = True,
@@ -33,6 +78,8 @@ def main(
         li_batch_size=tuple(),  # if you want to study the impact of the batch size
         total_evaluation_step=int(1024) * int(128),
         pred_batch_size=int(1024) * int(128),
+        streaming=False,  # if True, predictions are made by chunks of "pred_batch_size" and stored on the hard drive
+        path_recorded_data=None,  # if not None, the environment is run once and the data are stored there
         save_path_final_results="model_results",  # where the information about the prediction will be stored
         metrics=DEFAULT_METRICS,  # which metrics are used to evaluate the performance of the model
         verbose=1,  # do I print the results of the model
@@ -48,6 +95,15 @@ def main(
     env.chronics_handler.real_data.reset()
     obs = env.reset()
 
+    if streaming:
+        # the proxy only needs to store one batch of data at a time
+        max_row_training_set = pred_batch_size
+        if metrics is DEFAULT_METRICS:
+            # same metrics, but they are updated batch by batch
+            metrics = STREAMING_METRICS
+    else:
+        max_row_training_set = max(total_evaluation_step, pred_batch_size)
+
     if save_path_final_results is not None:
         if not os.path.exists(save_path_final_results):
             os.mkdir(save_path_final_results)
@@ -84,25 +140,47 @@ def main(
               "#######################\n")
         actor_evalN1 = RandomN1(env.action_space)
         proxy_eval = ProxyLeapNet(name=f"{model_name}_evalN1",
-                                  max_row_training_set=max(total_evaluation_step, pred_batch_size),
+                                  max_row_training_set=max_row_training_set,
                                   eval_batch_size=pred_batch_size,
                                   layer=layer
                                   )
         agent_with_proxy_evalN1 = AgentWithProxy(actor_evalN1,
                                                  proxy=proxy_eval,
                                                  logdir=None)
-        reproducible_exp(env,
-                         agent=actor_evalN1,
-                         env_seed=env_seed,
-                         agent_seed=agent_seed,
-                         chron_id_start=chron_id_val)
-        agent_with_proxy_evalN1.evaluate(env,
-                                         total_evaluation_step=total_evaluation_step,
-                                         load_path=os.path.join(save_path, model_name),
-                                         save_path=save_path_final_results,
-                                         metrics=metrics,
-                                         verbose=verbose
-                                         )
+        if path_recorded_data is None:
+            reproducible_exp(env,
+                             agent=actor_evalN1,
+                             env_seed=env_seed,
+                             agent_seed=agent_seed,
+                             chron_id_start=chron_id_val)
+            agent_with_proxy_evalN1.evaluate(env,
+                                             total_evaluation_step=total_evaluation_step,
+                                             load_path=os.path.join(save_path, model_name),
+                                             save_path=save_path_final_results,
+                                             metrics=metrics,
+                                             verbose=verbose,
+                                             streaming=streaming
+                                             )
+        else:
+            dataset = get_recorded_data(env,
+                                        agent_with_proxy_evalN1,
+                                        path_recorded_data,
+                                        env_name=env_name,
+                                        nb_rows=total_evaluation_step,
+                                        load_path=os.path.join(save_path, model_name),
+                                        env_seed=env_seed,
+                                        agent_seed=agent_seed,
+                                        chron_id_val=chron_id_val,
+                                        verbose=verbose)
+            agent_with_proxy_evalN1.evaluate_recorded(dataset,
+                                                      total_evaluation_step=total_evaluation_step,
+                                                      load_path=os.path.join(save_path, model_name),
+                                                      save_path=save_path_final_results,
+                                                      metrics=metrics,
+                                                      verbose=verbose,
+                                                      streaming=streaming,
+                                                      env=env
+                                                      )
 
     if do_N2:
         print("#######################\n"
@@ -110,25 +188,47 @@ def main(
               "#######################\n")
         actor_evalN2 = RandomN2(env.action_space)
         proxy_eval = ProxyLeapNet(name=f"{model_name}_evalN2",
-                                  max_row_training_set=max(total_evaluation_step, pred_batch_size),
+                                  max_row_training_set=max_row_training_set,
                                   eval_batch_size=pred_batch_size,
                                   layer=layer
                                   )
         agent_with_proxy_evalN2 = AgentWithProxy(actor_evalN2,
                                                  proxy=proxy_eval,
                                                  logdir=None)
-        reproducible_exp(env,
-                         agent=actor_evalN2,
-                         env_seed=env_seed,
-                         agent_seed=agent_seed,
-                         chron_id_start=chron_id_val)
-        agent_with_proxy_evalN2.evaluate(env,
-                                         total_evaluation_step=total_evaluation_step,
-                                         load_path=os.path.join(save_path, model_name),
-                                         save_path=save_path_final_results,
-                                         metrics=metrics,
-                                         verbose=verbose
-                                         )
+        if path_recorded_data is None:
+            reproducible_exp(env,
+                             agent=actor_evalN2,
+                             env_seed=env_seed,
+                             agent_seed=agent_seed,
+                             chron_id_start=chron_id_val)
+            agent_with_proxy_evalN2.evaluate(env,
+                                             total_evaluation_step=total_evaluation_step,
+                                             load_path=os.path.join(save_path, model_name),
+                                             save_path=save_path_final_results,
+                                             metrics=metrics,
+                                             verbose=verbose,
+                                             streaming=streaming
+                                             )
+        else:
+            dataset = get_recorded_data(env,
+                                        agent_with_proxy_evalN2,
+                                        path_recorded_data,
+                                        env_name=env_name,
+                                        nb_rows=total_evaluation_step,
+                                        load_path=os.path.join(save_path, model_name),
+                                        env_seed=env_seed,
+                                        agent_seed=agent_seed,
+                                        chron_id_val=chron_id_val,
+                                        verbose=verbose)
+            agent_with_proxy_evalN2.evaluate_recorded(dataset,
+                                                      total_evaluation_step=total_evaluation_step,
+                                                      load_path=os.path.join(save_path, model_name),
+                                                      save_path=save_path_final_results,
+                                                      metrics=metrics,
+                                                      verbose=verbose,
+                                                      streaming=streaming,
+                                                      env=env
+                                                      )
 
     if len(li_batch_size):
         print("###########################\n"
@@ -137,12 +237,8 @@ def main(
         actor_batch_size = RandomN1(env.action_space)
         times_per_pf_ms = []
         total_times_ms = []
+        dataset = None
         for pred_batch_size in li_batch_size:
-            reproducible_exp(env,
-                             agent=actor_batch_size,
-                             env_seed=env_seed,
-                             agent_seed=agent_seed,
-                             chron_id_start=chron_id_val)
             proxy_eval_tmp = ProxyLeapNet(name=f"{model_name}_evalN1_{pred_batch_size}",
                                           max_row_training_set=max(total_evaluation_step, pred_batch_size),
                                           eval_batch_size=pred_batch_size,  # min(total_evaluation_step, 1024*64)
@@ -150,15 +246,41 @@ def main(
             agent_with_tmp = AgentWithProxy(actor_batch_size,
                                             proxy=proxy_eval_tmp,
                                             logdir=None)
-
-            dict_metrics = agent_with_tmp.evaluate(env,
-                                                   total_evaluation_step=pred_batch_size,
-                                                   load_path=os.path.join(save_path, model_name),
-                                                   save_path=save_path_final_results,
-                                                   metrics={},
-                                                   verbose=0,
-                                                   save_values=False  # I do not save the arrays
-                                                   )
+            if path_recorded_data is None:
+                reproducible_exp(env,
+                                 agent=actor_batch_size,
+                                 env_seed=env_seed,
+                                 agent_seed=agent_seed,
+                                 chron_id_start=chron_id_val)
+                dict_metrics = agent_with_tmp.evaluate(env,
+                                                       total_evaluation_step=pred_batch_size,
+                                                       load_path=os.path.join(save_path, model_name),
+                                                       save_path=save_path_final_results,
+                                                       metrics={},
+                                                       verbose=0,
+                                                       save_values=False  # I do not save the arrays
+                                                       )
+            else:
+                if dataset is None:
+                    # record all the states once for all the batch sizes
+                    dataset = get_recorded_data(env,
+                                                agent_with_tmp,
+                                                path_recorded_data,
+                                                env_name=env_name,
+                                                nb_rows=max(li_batch_size),
+                                                load_path=os.path.join(save_path, model_name),
+                                                env_seed=env_seed,
+                                                agent_seed=agent_seed,
+                                                chron_id_val=chron_id_val,
+                                                verbose=verbose)
+                dict_metrics = agent_with_tmp.evaluate_recorded(dataset,
+                                                                total_evaluation_step=pred_batch_size,
+                                                                load_path=os.path.join(save_path, model_name),
+                                                                save_path=save_path_final_results,
+                                                                metrics={},
+                                                                verbose=0,
+                                                                save_values=False  # I do not save the arrays
+                                                                )
             total_pred_time_ms = 1000.*dict_metrics["predict_time"]
             total_times_ms.append(total_pred_time_ms)
             times_per_pf_ms.append(total_pred_time_ms/pred_batch_size)
@@ -36,6 +36,7 @@ def main(limit_gpu_memory=True,
          val_regex=".*99[0-9].*",
          actor_class=RandomNN1,
          load_dataset=True, # do you load the entire training set in memory (can take a few minutes - set it to false if you simply want to make some tests)
+         nb_process=None,  # number of environments run in parallel to generate the training data (None: only one)
          # perform an evaluation on the training set at the end of training
          eval_training_set=int(1024) * int(128),  # number of powerflow the proxy will do after training
          pred_batch_size=int(1024) * int(128),  # number of powerflow that will be done by the proxy "at once"
@@ -97,10 +98,24 @@ def main(limit_gpu_memory=True,
                                       )
 
     # train it
-    agent_with_proxy.train(env,
-                           total_train,
-                           save_path=save_path
-                           )
+    if nb_process is None:
+        agent_with_proxy.train(env,
+                               total_train,
+                               save_path=save_path
+                               )
+    else:
+        agent_with_proxy.train_parallel(env,
+                                        total_train,
+                                        env_fun=create_env,
+                                        env_kwargs={"env_name": env_name,
+                                                    "use_lightsim_if_available": use_lightsim_if_available,
+                                                    "val_regex": val_regex if load_dataset else None},
+                                        actor_class=actor_class,
+                                        actor_kwargs={"p": 0.5},
+                                        nb_process=nb_process,
+                                        seed=agent_seed,
+                                        save_path=save_path
+                                        )
 
     if verbose:
         print("Summary of the model used:")
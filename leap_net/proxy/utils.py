@@ -6,6 +6,7 @@
 # SPDX-License-Identifier: MPL-2.0
 # This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
 
+import re
 import warnings
 
 import tensorflow as tf
@@ -13,6 +14,7 @@ import tensorflow as tf
 from sklearn.metrics import mean_squared_error, mean_absolute_error  # mean_absolute_percentage_error
 from leap_net.metrics import nrmse
 from leap_net.metrics import pearson_r
+from leap_net.metrics import MSEAccumulator, MAEAccumulator, NRMSEAccumulator, PearsonRAccumulator
 
 import grid2op
 from grid2op.Chronics import MultifolderWithCache
@@ -37,6 +39,30 @@ DEFAULT_METRICS = {"MSE_avg": mean_squared_error,
                        multioutput="raw_values"),
                    }
 
+# metrics of DEFAULT_METRICS that are computed all at once (with the same residuals) by
+# leap_net.metrics.FusedMetrics: metric function -> (kind of metric, multioutput)
+FUSED_METRICS = {DEFAULT_METRICS["MSE_avg"]: ("MSE", "uniform_average"),
+                 DEFAULT_METRICS["MAE_avg"]: ("MAE", "uniform_average"),
+                 DEFAULT_METRICS["NRMSE_avg"]: ("NRMSE", "uniform"),
+                 DEFAULT_METRICS["pearson_r_avg"]: ("pearson_r", "uniform"),
+                 DEFAULT_METRICS["MSE"]: ("MSE", "raw_values"),
+                 DEFAULT_METRICS["MAE"]: ("MAE", "raw_values"),
+                 DEFAULT_METRICS["NRMSE"]: ("NRMSE", "raw_values"),
+                 DEFAULT_METRICS["pearson_r"]: ("pearson_r", "raw_values"),
+                 }
+
+# same metrics as DEFAULT_METRICS, but computed batch by batch during the evaluation (the whole arrays of
+# predictions and ground truth are never loaded in memory)
+STREAMING_METRICS = {"MSE_avg": MSEAccumulator(),
+                     "MAE_avg": MAEAccumulator(),
+                     "NRMSE_avg": NRMSEAccumulator(),
+                     "pearson_r_avg": PearsonRAccumulator(),
+                     "MSE": MSEAccumulator(multioutput="raw_values"),
+                     "MAE": MAEAccumulator(multioutput="raw_values"),
+                     "NRMSE": NRMSEAccumulator(multioutput="raw_values"),
+                     "pearson_r": PearsonRAccumulator(multioutput="raw_values"),
+                     }
+
 
 def limit_gpu_usage():
     physical_devices = tf.config.list_physical_devices('GPU')
@@ -56,8 +82,13 @@ def get_parameters():
     return param
 
 
-def create_env(env_name, use_lightsim_if_available=True):
-    """create the grid2op environment with the right parameters and chronics class"""
+def create_env(env_name, use_lightsim_if_available=True, val_regex=None, keep_val=False):
+    """
+    create the grid2op environment with the right parameters and chronics class
+
+    If `val_regex` is not ``None``, the chronics whose path match this regex are removed from the environment (
+    or they are the only one that are kept if `keep_val` is ``True``).
+    """
     backend_cls = None
     if use_lightsim_if_available:
         try:
@@ -77,6 +108,12 @@ def create_env(env_name, use_lightsim_if_available=True):
                        backend=backend_cls(),
                        chronics_class=MultifolderWithCache
                        )
+    if val_regex is not None:
+        if keep_val:
+            env.chronics_handler.set_filter(lambda path: re.match(val_regex, path) is not None)
+        else:
+            env.chronics_handler.set_filter(lambda path: re.match(val_regex, path) is None)
+        env.chronics_handler.real_data.reset()
     return env
 
 
@@ -96,3 +133,27 @@ def reproducible_exp(env, agent, env_seed=None, chron_id_start=None, agent_seed=
     if agent_seed is not None:
         agent.seed(agent_seed)
 
+
+def reboot(env, actor):
+    """
+    reset the environment and act a first time with the actor, until this first step is not a "game over"
+
+    It is used each time the environment is "done" by :class:`leap_net.proxy.AgentWithProxy`,
+    :class:`leap_net.proxy.ParallelCollector` and :class:`leap_net.proxy.RecordedDataset` so that all of them see
+    the same observations given the same seeds.
+
+    Returns
+    -------
+    obs, reward, done:
+        The observation, the reward and the "done" flag after the first step
+    """
+    # TODO skip and random start at some steps
+    done = False
+    reward = env.reward_range[0]
+    obs = env.reset()
+    obs, reward, done, info = env.step(actor.act(obs, reward, done))
+    while done:
+        # we restart until we find an environment that is not "game over"
+        obs = env.reset()
+        obs, reward, done, info = env.step(actor.act(obs, reward, done))
+    return obs, reward, done
@@ -8,6 +8,7 @@
 
 import logging
 import os
+from types import SimpleNamespace
 import numpy as np
 import unittest
 logging.disable(logging.WARNING)
@@ -17,7 +18,8 @@ import tensorflow as tf
 from tensorflow.keras.layers import Input
 from tensorflow.keras.models import Model
 
-from leap_net import Ltau
+from leap_net import Ltau, LtauNoAdd, LtauMulti, LtauLowRank, ResNetLayer, TopoEmbedding
+from leap_net.proxy import ProxyLeapNet
 import pdb
 
 
@@ -133,9 +135,160 @@ class Test(unittest.TestCase):
         assert np.mean(np.abs(res - Y_test)) <= self.tol_learn, "problem with l1"
         assert np.max(np.abs(res - Y_test)) <= self.tol_learn, "problem with linf"
 
+    def test_multi_same_as_no_add(self):
+        dim_x = 10
+        n_elem = 100
+        dims_tau = (3, 7)
+
+        X_train = np.random.normal(size=(n_elem, dim_x)).astype(np.float32)
+        TAUS_train = [np.random.normal(size=(n_elem, dim_tau)).astype(np.float32) for dim_tau in dims_tau]
+
+        x = Input(shape=(dim_x,), name="x")
+        taus = [Input(shape=(dim_tau,), name=f"tau_{i}") for i, dim_tau in enumerate(dims_tau)]
+        ltaus = [LtauNoAdd(name=f"leap_{i}") for i, _ in enumerate(dims_tau)]
+        res_no_add = tf.keras.layers.add([ltau((x, tau)) for ltau, tau in zip(ltaus, taus)])
+        model_no_add = Model(inputs=[x] + taus, outputs=[res_no_add])
+        ltau_multi = LtauMulti(name="leap")
+        model_multi = Model(inputs=[x] + taus, outputs=[ltau_multi([x] + taus)])
+
+        # same weights, same results
+        ltau_multi.set_ltau_weights(ltaus)
+        res_th = model_no_add.predict([X_train] + TAUS_train, verbose=0)
+        res = model_multi.predict([X_train] + TAUS_train, verbose=0)
+        assert np.max(np.abs(res - res_th)) <= self.tol, "problem with linf"
+
+        # and back (with the opposite "d" kernels)
+        for ltau, weights in zip(ltaus, ltau_multi.get_ltau_weights()):
+            ltau.set_weights(weights[:-1] + [-weights[-1]])
+        res_th = model_no_add.predict([X_train] + TAUS_train, verbose=0)
+        assert np.max(np.abs(res + res_th)) <= self.tol, "problem with linf"
+
+    def test_low_rank(self):
+        dim_x = 10
+        n_elem = 100
+        dim_tau = 20
+        rank = 3
+
+        X_train = np.random.normal(size=(n_elem, dim_x)).astype(np.float32)
+        TAU_train = np.random.normal(size=(n_elem, dim_tau)).astype(np.float32)
+
+        x = Input(shape=(dim_x,), name="x")
+        tau = Input(shape=(dim_tau,), name="tau")
+        layer = LtauLowRank(rank, initializer='glorot_uniform')
+        model = Model(inputs=[x, tau], outputs=[layer((x, tau))])
+        assert model.count_params() == 2 * rank * (dim_x + dim_tau) + dim_tau
+        e_u, e_v, e_bias, d_u, d_v = layer.get_weights()
+        e_bias = np.random.normal(size=e_bias.shape).astype(np.float32)
+        layer.set_weights([e_u, e_v, e_bias, d_u, d_v])
+        res = model.predict([X_train, TAU_train], verbose=0)
+
+        # LEAP Net implementation in numpy, with e and d of low rank
+        res_th = np.matmul(X_train, np.matmul(e_u, e_v)) + e_bias
+        res_th = np.multiply(res_th, TAU_train)
+        res_th = np.matmul(res_th, np.matmul(d_u, d_v))
+        res_th += X_train
+        assert np.max(np.abs(res - res_th)) <= 10 * self.tol, "problem with linf"
+
+    def test_low_rank_not_fused(self):
+        # there is no fused low rank leap layer
+        with self.assertRaises(RuntimeError):
+            ProxyLeapNet(fused_leap=True, leap_rank=3)
+        with self.assertRaises(RuntimeError):
+            ProxyLeapNet().load_metadata({"_fused_leap": True, "_leap_rank": 3})
+        with self.assertRaises(RuntimeError):
+            ProxyLeapNet().load_metadata({"_leap_rank": 3}, fused_leap=True)
+
+    def test_convert_fused(self):
+        n_elem = 20
+        # "observations" with only the attributes used by the proxy
+        obss = [SimpleNamespace(prod_p=np.random.normal(size=3).astype(np.float32),
+                                load_p=np.random.normal(size=4).astype(np.float32),
+                                a_or=np.random.normal(size=5).astype(np.float32),
+                                rho=np.random.uniform(size=5).astype(np.float32),
+                                line_status=np.random.randint(0, 2, size=5).astype(bool),
+                                topo_vect=np.random.randint(1, 3, size=6).astype(np.int32))
+                for _ in range(n_elem)]
+        kwargs = dict(attr_x=("prod_p", "load_p"), attr_y=("a_or",), attr_tau=("line_status", "topo_vect"),
+                      max_row_training_set=n_elem, train_batch_size=n_elem, eval_batch_size=n_elem)
+        proxy = ProxyLeapNet(**kwargs)
+        proxy.init(obss)
+        proxy.build_model()
+        metadata = proxy.get_metadata()
+
+        fused_proxy = ProxyLeapNet(**kwargs)
+        fused_proxy.load_metadata(metadata, fused_leap=True)
+        # (the metadata are not modified, the flag is only stored for the fused leap layers)
+        assert "_fused_leap" not in metadata
+        assert fused_proxy.get_metadata()["_fused_leap"]
+        fused_proxy.build_model()
+        fused_proxy.set_weights_from(proxy)
+        assert any(isinstance(layer, LtauMulti) for layer in fused_proxy._model.layers)
+
+        # and back
+        unfused_proxy = ProxyLeapNet(**kwargs)
+        unfused_proxy.load_metadata(fused_proxy.get_metadata(), fused_leap=False)
+        assert "_fused_leap" not in unfused_proxy.get_metadata()
+        unfused_proxy.build_model()
+        unfused_proxy.set_weights_from(fused_proxy)
+
+        inputs = ([np.random.normal(size=(n_elem, sz)).astype(np.float32) for sz in proxy._sz_x],
+                  [np.random.randint(0, 2, size=(n_elem, sz)).astype(np.float32) for sz in proxy._sz_tau])
+        res_th = proxy._model(inputs)[0].numpy()
+        assert np.max(np.abs(fused_proxy._model(inputs)[0].numpy() - res_th)) <= self.tol
+        assert np.max(np.abs(unfused_proxy._model(inputs)[0].numpy() - res_th)) <= self.tol
+
+    def test_topo_embedding(self):
+        sub_info = [3, 2, 5, 1]
+        n_elem = 100
+        topo = np.random.choice([0, 1, -2], size=(n_elem, sum(sub_info)), p=[0.6, 0.3, 0.1]).astype(np.float32)
+        topo[0] = 0.  # reference topology
+        topo[1] = 1.  # same as the reference (the buses are swapped)
+
+        tau = Input(shape=(sum(sub_info),), name="tau")
+        layer = TopoEmbedding(sub_info, embedding_dim=4, max_config=8, combine="concat")
+        model = Model(inputs=[tau], outputs=[layer(tau)])
+        res = model.predict(topo, verbose=0)
+        assert res.shape == (n_elem, 4 * len(sub_info))
+        assert np.all(res[0] == 0.)
+        assert np.all(res[1] == 0.)
+
+        # ids of the substations, bus 2 of the first element of each substation is swapped with bus 1
+        ids = layer.get_config_ids(topo)
+        assert ids.shape == (n_elem, len(sub_info))
+        assert np.all(ids[:, 3] == 0)
+        on_bus_2 = topo[:, :3] == 1
+        on_bus_2 ^= on_bus_2[:, [0]]
+        assert np.all(ids[:, 0] == on_bus_2[:, 1] + 2 * on_bus_2[:, 2])
+        # 2**4 configurations for the third substation, only 8 embeddings
+        assert np.max(ids[:, 2]) < 8
+
+        # same result if the ids are given
+        ids_in = Input(shape=(len(sub_info),), name="ids", dtype="int32")
+        layer_ids = TopoEmbedding.from_config(dict(layer.get_config(), from_ids=True))
+        model_ids = Model(inputs=[ids_in], outputs=[layer_ids(ids_in)])
+        layer_ids.set_weights(layer.get_weights())
+        assert np.max(np.abs(model_ids.predict(ids, verbose=0) - res)) <= self.tol
+
+    def test_resnet_fused(self):
+        dim_x = 10
+        n_elem = 100
+        X_train = np.random.normal(size=(n_elem, dim_x)).astype(np.float32)
+
+        x = Input(shape=(dim_x,), name="x")
+        resnet = ResNetLayer(20, activation="relu", name="resnet")
+        model = Model(inputs=[x], outputs=[resnet(x)])
+        resnet_fused = ResNetLayer.from_config(dict(resnet.get_config(), fused=True))
+        model_fused = Model(inputs=[x], outputs=[resnet_fused(x)])
+        resnet_fused.set_weights(resnet.get_weights())
+
+        res_th = model.predict(X_train, verbose=0)
+        res = model_fused.predict(X_train, verbose=0)
+        assert np.max(np.abs(res - res_th)) <= self.tol, "problem with linf"
+        # the layer can be retrieved from its name
+        assert tf.keras.utils.get_registered_object("leap_net>ResNetLayer") is ResNetLayer
+
 # TODO test saving / loading
 # TODO test name and graph visualizing
-# TODO test resnet too
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Agent import BaseAgent
+from grid2op.dtypes import dt_int, dt_float
+
+from leap_net.agents import LineActionCache, RandomN1, RandomN2, RandomNN1, RandomNk
+
+
+class FakeActionSpace:
+    """builds "actions" that are only the status of the powerlines, and counts them"""
+    def __init__(self, n_line):
+        self.n_line = n_line
+        self.nb_built = 0
+
+    def __call__(self, dict_):
+        self.nb_built += 1
+        return tuple(int(el) for el in dict_["set_line_status"])
+
+
+def _line_action(action_space, arr_):
+    li_bus = [(i, el) for i, el in enumerate(arr_)]
+    return action_space({"set_line_status": arr_,
+                         "set_bus": {"lines_or_id": li_bus,
+                                     "lines_ex_id": li_bus},
+                         })
+
+
+class RefRandomN1(BaseAgent):
+    """RandomN1 as it was before the actions were cached"""
+    def act(self, obs, reward, done):
+        id_ = self.space_prng.choice(self.action_space.n_line)
+        return _line_action(self.action_space, (1 - 2 * np.eye(self.action_space.n_line, dtype=dt_int))[id_, :])
+
+
+class RefRandomN2(BaseAgent):
+    """RandomN2 as it was before the actions were cached"""
+    def act(self, obs, reward, done):
+        id_1 = self.space_prng.choice(self.action_space.n_line)
+        id_2 = self.space_prng.choice(self.action_space.n_line - 1)
+        if id_2 >= id_1:
+            id_2 += 1
+        arr_ = np.ones(self.action_space.n_line, dtype=dt_int)
+        arr_[id_1] = -1
+        arr_[id_2] = -1
+        return _line_action(self.action_space, arr_)
+
+
+class RefRandomNN1(BaseAgent):
+    """RandomNN1 as it was before the actions were cached"""
+    def __init__(self, action_space, p):
+        super(RefRandomNN1, self).__init__(action_space)
+        self._1_p = 1. - dt_float(p)
+
+    def act(self, obs, reward, done):
+        ur = self.space_prng.uniform()
+        if ur < self._1_p:
+            arr_ = np.ones(self.action_space.n_line, dtype=dt_int)
+        else:
+            id_ = self.space_prng.choice(self.action_space.n_line)
+            arr_ = (1 - 2 * np.eye(self.action_space.n_line, dtype=dt_int))[id_, :]
+        return _line_action(self.action_space, arr_)
+
+
+class TestRandomAgents(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            cls.env = grid2op.make("l2rpn_case14_sandbox", test=True)
+        cls.action_space = cls.env.action_space
+        cls.n_line = cls.env.n_line
+        cls.nb_act = 50
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.close()
+
+    def _acts(self, agent, seed=0):
+        agent.seed(seed)
+        return [agent.act(None, None, False) for _ in range(self.nb_act)]
+
+    def _disconnected(self, act):
+        """ids of the powerlines disconnected by `act` (checking that all the others are reconnected)"""
+        status = act.line_set_status
+        assert np.all(np.isin(status, [-1, 1]))
+        return np.where(status == -1)[0]
+
+    def test_same_as_before(self):
+        for agent, ref_agent in [(RandomN1(self.action_space), RefRandomN1(self.action_space)),
+                                 (RandomN2(self.action_space), RefRandomN2(self.action_space)),
+                                 (RandomNN1(self.action_space, p=0.5), RefRandomNN1(self.action_space, p=0.5))]:
+            acts = self._acts(agent)
+            ref_acts = self._acts(ref_agent)
+            assert all(act == ref_act for act, ref_act in zip(acts, ref_acts))
+            # the actions are random
+            assert len({tuple(self._disconnected(act)) for act in acts}) > 1
+
+    def test_sample_many(self):
+        for agent, nb_disc in [(RandomN1(self.action_space), [1]),
+                               (RandomN2(self.action_space), [2]),
+                               (RandomNN1(self.action_space, p=0.5), [0, 1]),
+                               (RandomNk(self.action_space, k=3), [3])]:
+            agent.seed(0)
+            acts = agent.sample_many(self.nb_act)
+            assert len(acts) == self.nb_act
+            assert all(len(self._disconnected(act)) in nb_disc for act in acts)
+        # RandomN1 draws the same random numbers at once
+        agent = RandomN1(self.action_space)
+        agent.seed(0)
+        assert agent.sample_many(self.nb_act) == self._acts(RandomN1(self.action_space))
+
+    def test_random_nk(self):
+        for k in [0, 1, 2, 5, self.n_line]:
+            agent = RandomNk(self.action_space, k=k)
+            agent.seed(0)
+            for act in self._acts(agent) + agent.sample_many(self.nb_act):
+                # exactly k distinct powerlines are disconnected
+                assert len(self._disconnected(act)) == k
+        # all the powerlines are disconnected by some actions
+        agent = RandomNk(self.action_space, k=2)
+        agent.seed(1)
+        for acts in [self._acts(agent), agent.sample_many(self.nb_act)]:
+            ids = np.concatenate([self._disconnected(act) for act in acts])
+            assert len(np.unique(ids)) == self.n_line
+        with self.assertRaises(RuntimeError):
+            RandomNk(self.action_space, k=self.n_line + 1)
+
+
+class TestLineActionCache(unittest.TestCase):
+    def test_cache(self):
+        action_space = FakeActionSpace(6)
+        cache = LineActionCache(action_space, max_size=2)
+        assert action_space.nb_built == 7  # reset and N-1 actions
+        assert cache.get([]) == (1, 1, 1, 1, 1, 1)
+        assert cache.get([4]) is cache.n1_actions[4]
+        assert cache.get([4]) == (1, 1, 1, 1, -1, 1)
+
+        act = cache.get([3, 1])
+        assert act == (1, -1, 1, -1, 1, 1)
+        assert cache.get((1, 3)) is act
+        assert action_space.nb_built == 8
+        cache.get([0, 1])
+        cache.get([1, 3])  # most recently used
+        cache.get([0, 5])  # [0, 1] is removed
+        assert len(cache) == 9
+        cache.get([1, 3])
+        assert action_space.nb_built == 10
+        cache.get([0, 1])
+        assert action_space.nb_built == 11
+
+        acts = cache.get_many(np.array([[0, 2, 5], [5, 2, 0]]))
+        assert acts[0] is acts[1]
+        assert acts[0] == (-1, 1, -1, 1, 1, -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+import tensorflow as tf
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.BaseNNProxy import BaseNNProxy
+from leap_net.proxy.benchmark_proxy import run_benchmark, load_proxy
+
+
+class DenseProxy(BaseNNProxy):
+    def build_model(self):
+        if self._model is not None:
+            return
+        inputs = tf.keras.Input(shape=(self._sz_x[0],))
+        self._model = tf.keras.Model(inputs=inputs, outputs=tf.keras.layers.Dense(self._sz_y[0])(inputs))
+
+    def _make_predictions(self, data, training=False):
+        return [self._model(data[0][0], training=training)]
+
+
+class TestBenchmarkProxy(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.ext = ".h5"
+        self.proxy_kwargs = {"name": "dense", "attr_x": ("prod_p",), "attr_y": ("a_or",)}
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            env = grid2op.make("l2rpn_case14_sandbox", test=True, gamerules_class=AlwaysLegal)
+        # the model is saved as during a training
+        proxy = DenseProxy(max_row_training_set=8, train_batch_size=4, eval_batch_size=4, **self.proxy_kwargs)
+        agent = AgentWithProxy(RandomN1(env.action_space), proxy, ext=self.ext, nb_obs_init=4, async_save=False)
+        agent.init(env)
+        agent.save(self.dir.name)
+        env.close()
+        self.weights = proxy._model.get_weights()
+        self.path_model = os.path.join(self.dir.name, proxy.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_load_proxy(self):
+        proxy = load_proxy(DenseProxy, self.proxy_kwargs, self.path_model, ext=self.ext)
+        for arr, arr_ref in zip(proxy._model.get_weights(), self.weights):
+            assert np.array_equal(arr, arr_ref)
+
+    def test_run_benchmark(self):
+        res = run_benchmark(DenseProxy, self.proxy_kwargs, self.path_model, ext=self.ext, batch_sizes=(2,),
+                            nb_batch=3, nb_warmup=1)
+        assert len(res) == 1
+        assert res[0]["batch_size"] == 2
+        assert res[0]["nb_batch"] == 3
+        assert res[0]["latency_ms_p50"] > 0.
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from leap_net.proxy.BaseNNProxy import BaseNNProxy
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
+
+
+class DenseProxy(BaseNNProxy):
+    def build_model(self):
+        if self._model is not None:
+            return
+        inputs = tf.keras.Input(shape=(3,))
+        self._model = tf.keras.Model(inputs=inputs, outputs=tf.keras.layers.Dense(2)(inputs))
+
+    def _make_predictions(self, data, training=False):
+        return self._model(data, training=training)
+
+
+def _get_write_fun(content, event=None):
+    """function writing 2 files with `content` (once `event` is set if it is not None)"""
+    def write_fun(path_tmp):
+        if event is not None:
+            event.wait()
+        for nm_file in ["a.txt", "b.txt"]:
+            with open(os.path.join(path_tmp, nm_file), "w", encoding="utf-8") as f:
+                f.write(content)
+    return write_fun
+
+
+def _fail(path_tmp):
+    with open(os.path.join(path_tmp, "a.txt"), "w", encoding="utf-8") as f:
+        f.write("half written")
+    raise ValueError("the disk is full")
+
+
+class TestCheckpointWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path_save = os.path.join(self.dir.name, "model")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _read(self, nm_file="a.txt"):
+        path_ckpt = CheckpointWriter.get_checkpoint_path(self.path_save)
+        with open(os.path.join(path_ckpt, nm_file), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _list_ckpts(self):
+        return sorted(os.listdir(os.path.join(self.path_save, CheckpointWriter.CHECKPOINT_DIR)))
+
+    def test_sync(self):
+        writer = CheckpointWriter()
+        writer.write(self.path_save, _get_write_fun("1"), iteration=1)
+        assert self._read() == "1"
+        assert self._read("b.txt") == "1"
+        # the same iteration is saved again: it is a new checkpoint
+        writer.write(self.path_save, _get_write_fun("2"), iteration=1)
+        assert self._read() == "2"
+        assert self._list_ckpts() == ["iter_0000000001_1"]
+        # the files of the previous layout are read directly
+        assert CheckpointWriter.get_checkpoint_path(self.dir.name) == self.dir.name
+
+    def test_async(self):
+        writer = CheckpointWriter()
+        writer.write(self.path_save, _get_write_fun("1"), iteration=1)
+        event = threading.Event()
+        writer.write(self.path_save, _get_write_fun("2", event), iteration=2, asynchronous=True)
+        assert writer.is_writing()
+        # the last complete checkpoint is read while the new one is written
+        assert self._read() == "1"
+        event.set()
+        writer.wait()
+        assert not writer.is_writing()
+        assert self._read() == "2"
+        assert self._read("b.txt") == "2"
+
+    def test_nb_kept(self):
+        writer = CheckpointWriter(nb_kept=3)
+        for iteration in range(1, 6):
+            writer.write(self.path_save, _get_write_fun(str(iteration)), iteration=iteration,
+                         asynchronous=iteration % 2 == 0)
+        writer.wait()
+        assert self._list_ckpts() == ["iter_0000000003", "iter_0000000004", "iter_0000000005"]
+        assert self._read() == "5"
+        # the training is restarted from scratch: the last checkpoint is kept even if its iteration is lower
+        writer.write(self.path_save, _get_write_fun("0"), iteration=0)
+        assert self._list_ckpts() == ["iter_0000000000", "iter_0000000004", "iter_0000000005"]
+        assert self._read() == "0"
+        with self.assertRaises(RuntimeError):
+            CheckpointWriter(nb_kept=0)
+
+    def test_error(self):
+        writer = CheckpointWriter(nb_kept=2)
+        writer.write(self.path_save, _get_write_fun("1"), iteration=1)
+        # the error of the background thread is raised in the calling thread
+        writer.write(self.path_save, _fail, iteration=2, asynchronous=True)
+        with self.assertRaises(RuntimeError) as context:
+            writer.wait()
+        assert isinstance(context.exception.__cause__, ValueError)
+        # it is raised only once
+        writer.wait()
+        with self.assertRaises(ValueError):
+            writer.write(self.path_save, _fail, iteration=3)
+        # the failed checkpoints are not published, nor left on the hard drive
+        assert self._read() == "1"
+        assert self._list_ckpts() == ["iter_0000000001"]
+
+
+class TestShadowModel(unittest.TestCase):
+    def test_rebuild(self):
+        proxy = DenseProxy(name="test", attr_x=("a",), attr_y=("b",))
+        proxy.build_model()
+        snapshot = proxy.get_data_snapshot()
+        shadow = proxy._shadow_model
+        assert proxy.get_data_snapshot() is not None and proxy._shadow_model is shadow
+        # the model is rebuilt: the shadow model is a copy of the new one
+        proxy._model = None
+        proxy.build_model()
+        proxy._model.set_weights([np.ones_like(el) for el in snapshot])
+        snapshot = proxy.get_data_snapshot()
+        assert proxy._shadow_model is not shadow
+        with tempfile.TemporaryDirectory() as path:
+            proxy.save_data_snapshot(snapshot, path, ext=".weights.h5")
+            proxy._model.set_weights([np.zeros_like(el) for el in snapshot])
+            proxy.load_data(path, ext=".weights.h5")
+        for arr in proxy._model.get_weights():
+            assert np.all(arr == 1.)
+
+
+if __name__ == "__main__":
+    unittest.main()
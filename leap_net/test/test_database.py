@@ -0,0 +1,139 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.CheckpointWriter import CheckpointWriter
+from leap_net.test.utils import IdentityProxy
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.metadata = {"attr_x": ["a"], "attr_y": ["b"], "_sz_x": [3], "_sz_y": [2],
+                         "_time_train": 0., "_time_predict": 0.}
+        np.random.seed(0)
+
+    def _get_proxy(self, max_row):
+        proxy = IdentityProxy(name="test", max_row_training_set=max_row, attr_x=("a",), attr_y=("b",))
+        proxy.load_metadata(self.metadata)
+        return proxy
+
+    def _store(self, proxy, nb_row):
+        proxy.store_batch({"a": np.random.normal(size=(nb_row, 3)), "b": np.random.normal(size=(nb_row, 2))})
+
+    def _check_same(self, proxy, proxy2, nb_row):
+        for name, arr in proxy._get_database_arrays().items():
+            assert np.array_equal(arr[:nb_row], proxy2._get_database_arrays()[name][:nb_row])
+        assert proxy2.last_id == proxy.last_id
+        assert proxy2._global_iter == proxy._global_iter
+        assert proxy2._is_db_full() == proxy._is_db_full()
+
+    def test_save_load(self):
+        proxy = self._get_proxy(10)
+        self._store(proxy, 7)
+        self._store(proxy, 9)
+        assert proxy._is_db_full()
+        with tempfile.TemporaryDirectory() as path:
+            proxy.save_database(path)
+            proxy2 = self._get_proxy(10)
+            assert proxy2.load_database(path)
+            self._check_same(proxy, proxy2, 10)
+            # a full database cannot be restored in a database of another size
+            with self.assertRaises(RuntimeError):
+                self._get_proxy(20).load_database(path)
+
+    def test_not_full(self):
+        proxy = self._get_proxy(10)
+        self._store(proxy, 4)
+        snapshot = proxy.get_database_snapshot()
+        # the snapshot is a copy
+        self._store(proxy, 2)
+        with tempfile.TemporaryDirectory() as path:
+            proxy.save_database_snapshot(snapshot, path)
+            proxy2 = self._get_proxy(20)
+            assert proxy2.load_database(path)
+            assert proxy2.last_id == 4
+            assert proxy2._global_iter == 4
+            assert not proxy2._is_db_full()
+            for name, arr in proxy._get_database_arrays().items():
+                assert np.array_equal(arr[:4], proxy2._get_database_arrays()[name][:4])
+        with tempfile.TemporaryDirectory() as path:
+            # nothing saved there
+            assert not self._get_proxy(10).load_database(path)
+
+
+class TestDatabaseResume(unittest.TestCase):
+    """the database saved with the checkpoints of an AgentWithProxy is restored when the training is resumed"""
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            self.env = grid2op.make("l2rpn_case14_sandbox", test=True, gamerules_class=AlwaysLegal)
+        self.dir = tempfile.TemporaryDirectory()
+        self.max_row = 16
+
+    def tearDown(self):
+        self.env.close()
+        self.dir.cleanup()
+
+    def _get_agent(self, async_save):
+        proxy = IdentityProxy(name="model", max_row_training_set=self.max_row, eval_batch_size=4,
+                              attr_x=("prod_p",), attr_y=("a_or",))
+        return AgentWithProxy(RandomN1(self.env.action_space), proxy, nb_obs_init=4, async_save=async_save,
+                              save_database=True)
+
+    def _check_resume(self, async_save, nb_step):
+        save_path = os.path.join(self.dir.name, f"async_{async_save}_{nb_step}")
+        os.mkdir(save_path)
+        agent = self._get_agent(async_save)
+        agent.train(self.env, nb_step, verbose=0)
+        if async_save:
+            agent.save_async(save_path)
+            agent.wait_save()
+        else:
+            agent.save(save_path)
+        proxy = agent._proxy
+        assert proxy._is_db_full() == (nb_step > self.max_row)
+        assert os.path.exists(os.path.join(CheckpointWriter.get_checkpoint_path(os.path.join(save_path, "model")),
+                                           proxy.DATABASE_JSON))
+
+        # the training is resumed until the same number of steps: only one observation is stored
+        agent_resumed = self._get_agent(async_save)
+        agent_resumed.train(self.env, nb_step, load_path=save_path, verbose=0)
+        proxy_resumed = agent_resumed._proxy
+        assert agent_resumed.global_iter == agent.global_iter + 1
+        assert proxy_resumed._global_iter == proxy._global_iter + 1
+        assert proxy_resumed.last_id == (proxy.last_id + 1) % self.max_row
+        assert proxy_resumed._is_db_full() == proxy._is_db_full()
+        arrays_resumed = proxy_resumed._get_database_arrays()
+        nb_row = self.max_row if proxy._is_db_full() else proxy.last_id
+        for name, arr in proxy._get_database_arrays().items():
+            # all the rows are restored, except the one of the new observation
+            kept = np.arange(nb_row) != proxy.last_id
+            assert np.array_equal(arrays_resumed[name][:nb_row][kept], arr[:nb_row][kept])
+            assert not np.array_equal(arrays_resumed[name][proxy.last_id], arr[proxy.last_id])
+
+    def test_resume_sync(self):
+        for nb_step in [10, 30]:
+            self._check_resume(async_save=False, nb_step=nb_step)
+
+    def test_resume_async(self):
+        for nb_step in [10, 30]:
+            self._check_resume(async_save=True, nb_step=nb_step)
+
+
+if __name__ == "__main__":
+    unittest.main()
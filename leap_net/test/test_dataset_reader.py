@@ -0,0 +1,122 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn import preprocessing
+
+from leap_net.generate_data import DatasetReader
+
+
+class TestDatasetReader(unittest.TestCase):
+    def setUp(self):
+        self.tol = 1e-5
+        np.random.seed(0)
+        self.nb_rows = 1003
+        self.sizes = {"prod_p": 3, "prod_v": 3, "load_p": 4, "load_q": 4, "tau": 5, "flow_a": 6, "flow_p": 6,
+                      "line_v": 6}
+        self.arrays = {nm: (10. * np.random.normal(size=(self.nb_rows, sz)) + 3.).astype(np.float32)
+                       for nm, sz in self.sizes.items()}
+        self.arrays["tau"] = np.random.randint(0, 2, size=(self.nb_rows, self.sizes["tau"])).astype(np.int32)
+        self.arrays["prod_v"][:, 0] = 2.  # a constant column
+        # the first column stores the id of the row
+        self.arrays["prod_p"][:, 0] = np.arange(self.nb_rows)
+        self.dir = tempfile.TemporaryDirectory()
+        for nm, arr in self.arrays.items():
+            np.save(os.path.join(self.dir.name, "{}.npy".format(nm)), arr)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_header(self):
+        header = DatasetReader.write_header(self.dir.name, list(self.sizes), chunk_size=100)
+        assert DatasetReader.read_header(self.dir.name, list(self.sizes)) == header
+        assert header["nb_rows"] == self.nb_rows
+        for nm, arr in self.arrays.items():
+            stats = header["arrays"][nm]
+            assert stats["shape"] == list(arr.shape)
+            assert np.dtype(stats["dtype"]) == arr.dtype
+            arr64 = arr.astype(np.float64)
+            assert np.allclose(stats["mean"], np.mean(arr64, axis=0), rtol=1e-10, atol=1e-10)
+            assert np.allclose(stats["std"], np.std(arr64, axis=0), rtol=1e-10, atol=1e-10)
+            assert np.array_equal(stats["min"], np.min(arr64, axis=0))
+            assert np.array_equal(stats["max"], np.max(arr64, axis=0))
+
+    def test_batches(self):
+        DatasetReader.write_header(self.dir.name, list(self.sizes), chunk_size=100)
+        reader = DatasetReader(self.dir.name)
+        for shuffle in [False, True]:
+            batches = list(reader.iter_batches(32, shuffle=shuffle, seed=1, nb_chunk_shuffle=3, scale_x=False))
+            assert all(len(x[0]) == 32 for x, _ in batches[:-1])
+            ids = np.concatenate([x[0][:, 0] for x, _ in batches]).astype(int)
+            # each row is given once
+            assert np.array_equal(np.sort(ids), np.arange(self.nb_rows))
+            assert np.array_equal(ids, np.arange(self.nb_rows)) != shuffle
+            # the rows of all the arrays match, the outputs are scaled as with a StandardScaler
+            y = np.concatenate([y[0] for _, y in batches])
+            tau = np.concatenate([x[4] for x, _ in batches])
+            assert np.array_equal(tau, self.arrays["tau"][ids])
+            scaler = preprocessing.StandardScaler().fit(self.arrays["flow_a"])
+            assert np.allclose(y, scaler.transform(self.arrays["flow_a"][ids]), atol=self.tol)
+            assert np.allclose(reader.inverse_transform("flow_a", y), self.arrays["flow_a"][ids], atol=1e-4)
+        # the constant column is not divided by 0
+        x, _ = next(reader.iter_batches(32, shuffle=False))
+        assert np.all(x[1][:, 0] == 0.)
+        # same seed, same batches
+        batch_1 = next(reader.iter_batches(32, seed=2))[0][0]
+        batch_2 = next(reader.iter_batches(32, seed=2))[0][0]
+        assert np.array_equal(batch_1, batch_2)
+        assert len(list(reader.iter_batches(32, drop_remainder=True))) == self.nb_rows // 32
+
+    def test_tf_dataset(self):
+        reader = DatasetReader(self.dir.name)  # no header: it is computed
+        reader_2 = DatasetReader(self.dir.name, scaler_header=reader.header)
+        dataset = reader_2.get_tf_dataset(64, seed=0)
+        nb_rows = 0
+        li_ids = []
+        for x, y in dataset:
+            assert len(x) == 5
+            assert len(y) == 3
+            assert x[4].shape[1] == self.sizes["tau"]
+            nb_rows += x[0].shape[0]
+        assert nb_rows == self.nb_rows
+        # the rows are shuffled differently at each epoch
+        for _ in range(2):
+            x, _ = next(iter(dataset))
+            li_ids.append(reader.inverse_transform("prod_p", x[0].numpy())[:, 0])
+        assert not np.array_equal(li_ids[0], li_ids[1])
+
+    def test_subsample_cache(self):
+        DatasetReader.write_header(self.dir.name, list(self.sizes), chunk_size=100)
+        reader = DatasetReader(self.dir.name)
+        rows = reader.get_subsample(250, seed=0)
+        assert len(rows) == 250
+        assert np.array_equal(rows, reader.get_subsample(250, seed=0))
+        assert np.array_equal(reader.get_subsample(2 * self.nb_rows), np.arange(self.nb_rows))
+        for shuffle in [False, True]:
+            batches = list(reader.iter_batches(32, shuffle=shuffle, seed=1, scale_x=False, rows=rows))
+            ids = np.concatenate([x[0][:, 0] for x, _ in batches]).astype(int)
+            assert np.array_equal(np.sort(ids), rows)
+
+        dataset = reader.get_tf_dataset(32, shuffle=False, seed=0, cache=True, max_rows=250)
+        assert int(dataset.cardinality()) == 8
+        li_ids = []
+        for _ in range(2):
+            x = np.concatenate([x[0].numpy() for x, _ in dataset])
+            li_ids.append(np.round(reader.inverse_transform("prod_p", x)[:, 0]).astype(int))
+        assert np.array_equal(li_ids[0], rows)
+        assert np.array_equal(li_ids[1], rows)
+        with self.assertRaises(RuntimeError):
+            reader.get_tf_dataset(32, cache=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import importlib
+import multiprocessing
+import os
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+
+from leap_net.generate_data.generate_dataset import generate_dataset, ARRAY_NAMES, PROGRESS_FILE, _generate_rows
+
+# (the package exports the function `generate_dataset`, that hides the module)
+generate_module = importlib.import_module("leap_net.generate_data.generate_dataset")
+
+
+class _Interrupted(Exception):
+    pass
+
+
+_get_context = multiprocessing.get_context
+
+
+class _KilledWorkerContext:
+    """multiprocessing context whose processes exit (with code 3) without generating anything, as if killed"""
+    def __init__(self, method):
+        self.ctx = _get_context(method)
+
+    def Queue(self):
+        return self.ctx.Queue()
+
+    def Process(self, target, args, name):
+        return self.ctx.Process(target=os._exit, args=(3,), name=name)
+
+
+def _interrupt_after(nb_rows):
+    """`_generate_rows` that stops (as if the process was killed) once `nb_rows` rows are generated"""
+    def generate_rows(env, agent, arrays, expe_type, callback=None):
+        def callback_interrupt(t):
+            callback(t)
+            if t == nb_rows:
+                raise _Interrupted()
+        _generate_rows(env, agent, arrays, expe_type, callback_interrupt)
+    return generate_rows
+
+
+class TestGenerateDataset(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.nb_rows = 12
+        self.kwargs = {"name_env": "l2rpn_case14_sandbox",
+                       "nb_rows": self.nb_rows,
+                       "agent_type": "random_n_n1",
+                       "seed": 0,
+                       "verbose": False,
+                       "kwargs_make": {"test": True},
+                       "p": 0.5}
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _path(self, nm):
+        return os.path.join(self.dir.name, nm)
+
+    def _generate(self, dir_out, **kwargs):
+        kwargs_ = dict(self.kwargs)
+        kwargs_.update(kwargs)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            generate_dataset(dir_out=dir_out, **kwargs_)
+
+    def _load(self, dir_out):
+        return {arr_n: np.load(os.path.join(dir_out, "{}.npy".format(arr_n))) for arr_n in ARRAY_NAMES}
+
+    def test_resume(self):
+        self._generate(self._path("ref"))
+        ref = self._load(self._path("ref"))
+        assert not os.path.exists(os.path.join(self._path("ref"), PROGRESS_FILE))
+        assert not np.any(np.isnan(ref["prod_p"]))
+
+        # the generation is interrupted after 7 rows, the progress is saved every 5 rows
+        dir_out = self._path("interrupted")
+        with mock.patch.object(generate_module, "PROGRESS_FREQ", 5), \
+                mock.patch.object(generate_module, "_generate_rows", _interrupt_after(7)):
+            with self.assertRaises(_Interrupted):
+                self._generate(dir_out)
+        progress = generate_module._read_progress(dir_out)
+        assert progress["done"] == [5]
+
+        # it cannot be resumed with other parameters
+        for kwargs in [{"seed": 1}, {"seed": None}, {"p": 0.3}, {"kwargs_make": {"test": True, "difficulty": "0"}},
+                       {"nb_rows": self.nb_rows + 1}]:
+            with self.assertRaises(RuntimeError):
+                self._generate(dir_out, **kwargs)
+        assert generate_module._read_progress(dir_out) == progress
+
+        self._generate(dir_out)
+        res = self._load(dir_out)
+        assert not os.path.exists(os.path.join(dir_out, PROGRESS_FILE))
+        assert os.path.exists(os.path.join(dir_out, "header.json"))
+        for arr_n in ARRAY_NAMES:
+            assert res[arr_n].shape == ref[arr_n].shape
+            # the rows saved before the interruption are kept
+            assert np.array_equal(res[arr_n][:5], ref[arr_n][:5])
+        # all the other rows have been generated
+        assert not np.any(np.isnan(res["prod_p"]))
+
+        # a new generation is started with other parameters if it is not resumed
+        self._generate(self._path("ref"), seed=1, resume=False)
+
+    def test_worker_killed(self):
+        dir_out = self._path("killed")
+        with mock.patch.object(generate_module, "PROGRESS_TIMEOUT", 0.1), \
+                mock.patch.object(generate_module.multiprocessing, "get_context", _KilledWorkerContext):
+            with self.assertRaises(RuntimeError) as context:
+                self._generate(dir_out, nb_process=2)
+        assert "exit code 3" in str(context.exception)
+        progress = generate_module._read_progress(dir_out)
+        assert progress["done"] == [0, 0]
+        # the generation can then be resumed
+        self._generate(dir_out, nb_process=2)
+        assert not os.path.exists(os.path.join(dir_out, PROGRESS_FILE))
+        assert not np.any(np.isnan(self._load(dir_out)["prod_p"]))
+
+    def test_reproducible(self):
+        nb_process = 2
+        res = []
+        bounds = []
+        for i in range(2):
+            dir_out = self._path(f"run_{i}")
+            with mock.patch.object(generate_module, "_generate_parallel",
+                                   wraps=generate_module._generate_parallel) as generate_parallel:
+                self._generate(dir_out, nb_process=nb_process)
+            # (the arguments are dir_out_abs, progress, seeds...)
+            progress = generate_parallel.call_args[0][1]
+            bounds.append(progress["bounds"])
+            res.append(self._load(dir_out))
+        assert bounds[0] == bounds[1] == [0, self.nb_rows // 2, self.nb_rows]
+        for arr_n in ARRAY_NAMES:
+            assert np.array_equal(res[0][arr_n], res[1][arr_n])
+        assert not np.any(np.isnan(res[0]["prod_p"]))
+        # the shards are not seeded the same way
+        beg_ = bounds[0][1]
+        assert not np.array_equal(res[0]["tau"][:beg_], res[0]["tau"][beg_:])
+
+
+if __name__ == "__main__":
+    unittest.main()
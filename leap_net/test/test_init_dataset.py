@@ -0,0 +1,87 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.InitDataset import InitDataset
+from leap_net.test.utils import NoModelLeapNet
+
+
+SCALERS = ("_m_x", "_sd_x", "_m_y", "_sd_y", "_m_tau", "_sd_tau")
+
+
+class TestInitDataset(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            env = grid2op.make("l2rpn_case14_sandbox", test=True, gamerules_class=AlwaysLegal)
+        actor = RandomN1(env.action_space)
+        env.seed(0)
+        actor.seed(1)
+        cls.obss = [env.reset()]
+        while len(cls.obss) < 10:
+            obs, reward, done, info = env.step(actor.act(None, None, False))
+            if not done:
+                cls.obss.append(obs)
+        env.close()
+
+    def _get_proxy(self):
+        # the attributes cover the different kinds of scalers (see BaseProxy._get_adds_mults_from_name)
+        return NoModelLeapNet(name="test", max_row_training_set=16, eval_batch_size=8, train_batch_size=8,
+                              attr_x=("prod_p", "prod_v", "load_p", "load_q"),
+                              attr_y=("a_or", "p_or", "q_ex", "v_or", "load_v"),
+                              attr_tau=("line_status",))
+
+    def _get_init_data(self, proxy, nb_row):
+        init_data = InitDataset(proxy.get_attr_database(), extract_fun=proxy._extract_obs, nb_row=nb_row)
+        for obs in self.obss:
+            init_data.add(obs)
+        return init_data
+
+    def test_values(self):
+        proxy = self._get_proxy()
+        # 3 -> 6 -> 12 rows: the arrays are doubled twice
+        for nb_row in [len(self.obss), 3]:
+            init_data = self._get_init_data(proxy, nb_row)
+            assert len(init_data) == len(self.obss)
+            for attr_nm in proxy.get_attr_database():
+                ref = np.array([proxy._extract_obs(obs, attr_nm) for obs in self.obss])
+                assert init_data.get(attr_nm).dtype == ref.dtype
+                assert np.array_equal(init_data.get(attr_nm), ref)
+                assert init_data.get_size(attr_nm) == ref.shape[1]
+        with self.assertRaises(RuntimeError):
+            init_data.get("a_ex")
+        with self.assertRaises(RuntimeError):
+            InitDataset(("a_or",)).get("a_or")
+
+    def test_same_scalers(self):
+        proxy_ref = self._get_proxy()
+        proxy_ref.init(self.obss)
+        for nb_row in [len(self.obss), 3]:
+            proxy = self._get_proxy()
+            proxy.init(self._get_init_data(proxy, nb_row))
+            assert proxy._sz_x == proxy_ref._sz_x
+            assert proxy._sz_y == proxy_ref._sz_y
+            assert proxy._sz_tau == proxy_ref._sz_tau
+            for nm in SCALERS:
+                scalers, scalers_ref = getattr(proxy, nm), getattr(proxy_ref, nm)
+                assert len(scalers) == len(scalers_ref)
+                for scaler, scaler_ref in zip(scalers, scalers_ref):
+                    assert np.asarray(scaler).dtype == np.asarray(scaler_ref).dtype
+                    assert np.array_equal(scaler, scaler_ref)
+
+
+if __name__ == "__main__":
+    unittest.main()
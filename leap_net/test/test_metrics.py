@@ -0,0 +1,313 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import numpy as np
+import unittest
+
+from scipy.stats import pearsonr
+from sklearn.metrics import mean_squared_error, mean_absolute_error
+
+from leap_net.metrics import nrmse, pearson_r
+from leap_net.metrics import MSEAccumulator, MAEAccumulator, NRMSEAccumulator, PearsonRAccumulator
+from leap_net.metrics import FusedMetrics
+
+
+def pearson_r_loop(y_true, y_pred, multioutput="uniform", threshold=1.0):
+    """reference implementation of :func:`leap_net.metrics.pearson_r`: one call to scipy per column"""
+    rs = np.zeros(y_true.shape[1])
+    for col_id in range(y_true.shape[1]):
+        true_tmp = y_true[:, col_id]
+        pred_tmp = y_pred[:, col_id]
+
+        # don't count some value considered "constant"
+        is_ko_true = np.abs(np.max(true_tmp) - np.min(true_tmp)) <= threshold
+        is_ko_pred = np.abs(np.max(pred_tmp) - np.min(pred_tmp)) <= threshold
+        if is_ko_true or is_ko_pred:
+            tmp_r = np.nan
+        else:
+            tmp_r, *_ = pearsonr(true_tmp, pred_tmp)
+        rs[col_id] = tmp_r
+
+    if multioutput == "uniform":
+        if np.all(~np.isfinite(rs)):
+            rs = np.nan
+        else:
+            rs = np.nanmean(rs)
+    return rs
+
+
+class TestPearsonR(unittest.TestCase):
+    def setUp(self):
+        self.tol = 1e-5  # float32 data: scipy and pearson_r do not compute the means the same way
+        np.random.seed(1)
+        self.nb_row = 1000
+        self.nb_col = 7
+        self.y_true = (100. * np.random.normal(size=(self.nb_row, self.nb_col)) + 50.).astype(np.float32)
+        noise = 10. * np.random.normal(size=(self.nb_row, self.nb_col))
+        self.y_pred = (self.y_true + noise).astype(np.float32)
+
+    def _check_equal(self, res, ref):
+        res = np.asarray(res, dtype=np.float64)
+        ref = np.asarray(ref, dtype=np.float64)
+        assert res.shape == ref.shape
+        assert np.all(np.isnan(res) == np.isnan(ref))
+        ok_ = ~np.isnan(ref)
+        assert np.all(np.abs(res[ok_] - ref[ok_]) <= self.tol * np.maximum(1., np.abs(ref[ok_])))
+
+    def test_vectorized(self):
+        # same results as the implementation with one call to scipy per column
+        self.y_true[:, 0] = 3.
+        self.y_pred[:, 1] = 0.5 * np.random.uniform(size=self.nb_row)
+        for multioutput in ["uniform", "raw_values"]:
+            for threshold in [0., 1., 1000.]:
+                self._check_equal(pearson_r(self.y_true, self.y_pred, multioutput=multioutput, threshold=threshold),
+                                  pearson_r_loop(self.y_true, self.y_pred, multioutput=multioutput,
+                                                 threshold=threshold))
+        # inputs are not modified
+        y_true = self.y_true.copy()
+        pearson_r(self.y_true, self.y_pred)
+        assert np.array_equal(y_true, self.y_true)
+
+
+class TestNRMSE(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.nb_row = 1000
+        self.nb_col = 7
+        self.y_true = (100. * np.random.normal(size=(self.nb_row, self.nb_col)) + 50.).astype(np.float32)
+        noise = 10. * np.random.normal(size=(self.nb_row, self.nb_col))
+        self.y_pred = (self.y_true + noise).astype(np.float32)
+        self.y_true[:, 0] = 3.
+        self.chunk_sizes = [1, 13, 128, 1000]
+
+    def _nrmse_whole(self, y_true, y_pred, threshold):
+        """nrmse computed on the whole matrices at once"""
+        norm_ = np.max(y_true, axis=0) - np.min(y_true, axis=0)
+        norm_[norm_ <= threshold] = threshold
+        return np.sqrt(np.mean((y_true - y_pred)**2, axis=0)) / norm_
+
+    def _check_same_as_whole(self, y_true, y_pred):
+        ref = self._nrmse_whole(y_true, y_pred, threshold=2.)
+        for chunk_size in self.chunk_sizes:
+            res = nrmse(y_true, y_pred, multioutput="raw_values", threshold=2., chunk_size=chunk_size)
+            assert res.dtype == ref.dtype
+            assert np.array_equal(res, ref)
+            assert nrmse(y_true, y_pred, threshold=2., chunk_size=chunk_size) == np.mean(ref)
+
+    def test_chunked(self):
+        # exactly the same results as the computation on the whole matrices at once
+        for dtype in [np.float32, np.float64]:
+            self._check_same_as_whole(self.y_true.astype(dtype), self.y_pred.astype(dtype))
+            # some columns only (the rows are not contiguous)
+            self._check_same_as_whole(self.y_true[:, 2:].astype(dtype), self.y_pred[:, 2:].astype(dtype))
+
+    def test_column_major(self):
+        # numpy uses a pairwise summation along the columns, that gives different results in float32
+        y_true = (100. * np.random.normal(size=(5000, 20)) + 50.).astype(np.float32)
+        y_pred = (y_true + 10. * np.random.normal(size=y_true.shape)).astype(np.float32)
+        for dtype in [np.float32, np.float64]:
+            y_true_f = np.asfortranarray(y_true.astype(dtype))
+            y_pred_f = np.asfortranarray(y_pred.astype(dtype))
+            self._check_same_as_whole(y_true_f, y_pred_f)
+            self._check_same_as_whole(y_true.astype(dtype), y_pred_f)
+
+    def test_single_column(self):
+        y_true = (100. * np.random.normal(size=(100000, 1)) + 50.).astype(np.float32)
+        y_pred = (y_true + 10. * np.random.normal(size=y_true.shape)).astype(np.float32)
+        self._check_same_as_whole(y_true, y_pred)
+        self._check_same_as_whole(self.y_true[:, :1], self.y_pred[:, :1])
+
+    def test_accumulator_dtype(self):
+        # accumulated in float64: the results differ at the float32 precision
+        for y_true, y_pred in [(self.y_true, self.y_pred), (self.y_true[:, :1], self.y_pred[:, :1])]:
+            res = nrmse(y_true, y_pred, multioutput="raw_values", accumulator_dtype=np.float64, chunk_size=13)
+            ref = nrmse(y_true, y_pred, multioutput="raw_values")
+            assert np.allclose(res, ref, rtol=1e-6, atol=0.)
+
+
+class TestMetricAccumulators(unittest.TestCase):
+    """
+    The accumulators use float64 whatever the type of the data: they are compared with the metric functions
+    computed on the float64 data with a relative tolerance of `tol64` (the additions are not made in the same
+    order) and on the float32 data with a relative tolerance of `tol` (the rounding errors of the float32
+    additions made by the metric functions)
+    """
+    def setUp(self):
+        self.tol = 1e-5
+        self.tol64 = 1e-12
+        np.random.seed(1)
+        self.nb_row = 1000
+        self.nb_col = 7
+        self.y_true = (100. * np.random.normal(size=(self.nb_row, self.nb_col)) + 50.).astype(np.float32)
+        noise = 10. * np.random.normal(size=(self.nb_row, self.nb_col))
+        self.y_pred = (self.y_true + noise).astype(np.float32)
+        self.chunk_sizes = [1, 13, 128, 1000]
+
+    def _check_equal(self, res, ref, tol=None):
+        tol = self.tol if tol is None else tol
+        res = np.asarray(res, dtype=np.float64)
+        ref = np.asarray(ref, dtype=np.float64)
+        assert res.shape == ref.shape
+        assert np.all(np.isnan(res) == np.isnan(ref))
+        ok_ = ~np.isnan(ref)
+        assert np.all(np.abs(res[ok_] - ref[ok_]) <= tol * np.maximum(1., np.abs(ref[ok_])))
+
+    def _check_all(self, acc_proto, ref_fun):
+        ref = ref_fun(self.y_true, self.y_pred)
+        ref64 = ref_fun(self.y_true.astype(np.float64), self.y_pred.astype(np.float64))
+        self._check_equal(ref64, ref)
+        for chunk_size in self.chunk_sizes:
+            acc = acc_proto.new()
+            for beg_ in range(0, self.nb_row, chunk_size):
+                acc.update(self.y_true[beg_:(beg_ + chunk_size)], self.y_pred[beg_:(beg_ + chunk_size)])
+            self._check_equal(acc.result(), ref64, tol=self.tol64)
+        # used as a regular metric function
+        self._check_equal(acc_proto(self.y_true, self.y_pred), ref64, tol=self.tol64)
+        # merge accumulators computed on different parts of the data
+        acc1 = acc_proto.new()
+        acc2 = acc_proto.new()
+        acc1.update(self.y_true[:123], self.y_pred[:123])
+        acc2.update(self.y_true[123:], self.y_pred[123:])
+        acc1.merge(acc2)
+        self._check_equal(acc1.result(), ref64, tol=self.tol64)
+
+    def test_mse(self):
+        self._check_all(MSEAccumulator(), mean_squared_error)
+        self._check_all(MSEAccumulator(multioutput="raw_values"),
+                        lambda y_true, y_pred: mean_squared_error(y_true, y_pred, multioutput="raw_values"))
+
+    def test_mae(self):
+        self._check_all(MAEAccumulator(), mean_absolute_error)
+        self._check_all(MAEAccumulator(multioutput="raw_values"),
+                        lambda y_true, y_pred: mean_absolute_error(y_true, y_pred, multioutput="raw_values"))
+
+    def test_nrmse(self):
+        self._check_all(NRMSEAccumulator(), nrmse)
+        self._check_all(NRMSEAccumulator(multioutput="raw_values"),
+                        lambda y_true, y_pred: nrmse(y_true, y_pred, multioutput="raw_values"))
+        # the threshold is used instead of (max - min) for (almost) constant columns
+        self.y_true[:, 0] = 3.
+        self._check_all(NRMSEAccumulator(multioutput="raw_values", threshold=2.),
+                        lambda y_true, y_pred: nrmse(y_true, y_pred, multioutput="raw_values", threshold=2.))
+
+    def test_pearson_r(self):
+        self._check_all(PearsonRAccumulator(), pearson_r)
+        self._check_all(PearsonRAccumulator(multioutput="raw_values"),
+                        lambda y_true, y_pred: pearson_r(y_true, y_pred, multioutput="raw_values"))
+
+    def test_pearson_r_constant(self):
+        # (almost) constant columns are ignored
+        self.y_true[:, 0] = 3.
+        self.y_pred[:, 1] = 0.5 * np.random.uniform(size=self.nb_row)
+        res = PearsonRAccumulator(multioutput="raw_values")(self.y_true, self.y_pred)
+        assert np.all(np.isnan(res[:2]))
+        ref = pearson_r(self.y_true[:, 2:], self.y_pred[:, 2:], multioutput="raw_values")
+        self._check_equal(res[2:], ref)
+        self._check_equal(PearsonRAccumulator()(self.y_true, self.y_pred), np.mean(ref))
+
+        # everything is constant
+        res = PearsonRAccumulator()(self.y_true[:, :1], self.y_pred[:, :1])
+        assert np.isnan(res)
+
+    def test_update_from_residual(self):
+        y_true = self.y_true.astype(np.float64)
+        y_pred = self.y_pred.astype(np.float64)
+        resid = y_true - y_pred
+        resid_ref = resid.copy()
+        for acc_proto in [MSEAccumulator(), MAEAccumulator(), NRMSEAccumulator(), PearsonRAccumulator()]:
+            acc_ref = acc_proto.new()
+            acc_ref.update(y_true, y_pred)
+            acc = acc_proto.new()
+            acc.update_from_residual(resid, y_true, y_pred)
+            assert acc.result() == acc_ref.result()
+            # the residuals are shared between the accumulators: they are not modified
+            assert np.array_equal(resid, resid_ref)
+        with self.assertRaises(RuntimeError):
+            MSEAccumulator().update_from_residual(resid[:, 1:], y_true, y_pred)
+
+    def test_errors(self):
+        acc = MSEAccumulator()
+        with self.assertRaises(RuntimeError):
+            acc.result()
+        with self.assertRaises(RuntimeError):
+            acc.update(self.y_true, self.y_pred[:, 1:])
+        acc.update(self.y_true, self.y_pred)
+        with self.assertRaises(RuntimeError):
+            acc.update(self.y_true[:, 1:], self.y_pred[:, 1:])
+        with self.assertRaises(RuntimeError):
+            acc.merge(MAEAccumulator())
+        with self.assertRaises(RuntimeError):
+            NRMSEAccumulator(threshold=-1.)
+
+
+class TestFusedMetrics(unittest.TestCase):
+    """
+    The fused metrics are the ones of the accumulators: they are compared with the metric functions computed on
+    float64 data with a relative tolerance of 1e-12 (see `TestMetricAccumulators`)
+    """
+    def setUp(self):
+        self.tol = 1e-12
+        np.random.seed(1)
+        self.nb_row = 1000
+        self.nb_col = 7
+        self.y_true = (100. * np.random.normal(size=(self.nb_row, self.nb_col)) + 50.).astype(np.float32)
+        noise = 10. * np.random.normal(size=(self.nb_row, self.nb_col))
+        self.y_pred = (self.y_true + noise).astype(np.float32)
+        self.y_true[:, 0] = 3.
+        self.y_pred[:, 1] = 0.5 * np.random.uniform(size=self.nb_row)
+        self.chunk_sizes = [1, 13, 128, 1000]
+
+    def _check_equal(self, res, ref):
+        res = np.asarray(res, dtype=np.float64)
+        ref = np.asarray(ref, dtype=np.float64)
+        assert res.shape == ref.shape
+        assert np.all(np.isnan(res) == np.isnan(ref))
+        ok_ = ~np.isnan(ref)
+        assert np.all(np.abs(res[ok_] - ref[ok_]) <= self.tol * np.maximum(1., np.abs(ref[ok_])))
+
+    def test_same_as_functions(self):
+        refs = {"MSE": mean_squared_error, "MAE": mean_absolute_error, "NRMSE": nrmse, "pearson_r": pearson_r}
+        y_true = self.y_true.astype(np.float64)
+        y_pred = self.y_pred.astype(np.float64)
+        for chunk_size in self.chunk_sizes:
+            fused = FusedMetrics(chunk_size=chunk_size)
+            res = fused.compute(self.y_true, self.y_pred)
+            for kind, ref_fun in refs.items():
+                self._check_equal(fused.get(res, kind, "raw_values"),
+                                  ref_fun(y_true, y_pred, multioutput="raw_values"))
+            self._check_equal(fused.get(res, "MSE", "uniform_average"), mean_squared_error(y_true, y_pred))
+            self._check_equal(fused.get(res, "MAE", "uniform_average"), mean_absolute_error(y_true, y_pred))
+            self._check_equal(fused.get(res, "NRMSE", "uniform"), nrmse(y_true, y_pred))
+            self._check_equal(fused.get(res, "pearson_r", "uniform"), pearson_r(y_true, y_pred))
+
+    def test_same_as_accumulators(self):
+        fused = FusedMetrics(threshold_nrmse=2., threshold_pearson=0.5, chunk_size=128)
+        res = fused.compute(self.y_true, self.y_pred)
+        refs = {"MSE": MSEAccumulator(multioutput="raw_values"),
+                "MAE": MAEAccumulator(multioutput="raw_values"),
+                "NRMSE": NRMSEAccumulator(multioutput="raw_values", threshold=2.),
+                "pearson_r": PearsonRAccumulator(multioutput="raw_values", threshold=0.5)}
+        for kind, acc in refs.items():
+            acc.CHUNK_SIZE = 128
+            assert np.array_equal(res[kind], acc(self.y_true, self.y_pred), equal_nan=True)
+        with self.assertRaises(RuntimeError):
+            fused.get(res, "RMSE", "raw_values")
+
+    def test_compute_many(self):
+        # multiple outputs, in parallel
+        li_true = [self.y_true, self.y_true[:, 2:]]
+        li_pred = [self.y_pred, self.y_pred[:, 2:]]
+        res_seq = FusedMetrics().compute_many(li_true, li_pred, nb_thread=1)
+        res_par = FusedMetrics().compute_many(li_true, li_pred, nb_thread=2)
+        for res_s, res_p in zip(res_seq, res_par):
+            for kind in FusedMetrics.KINDS:
+                assert np.array_equal(res_p[kind], res_s[kind], equal_nan=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
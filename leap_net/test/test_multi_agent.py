@@ -0,0 +1,101 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.MultiAgentWithProxy import MultiAgentWithProxy
+from leap_net.proxy.utils import reproducible_exp
+from leap_net.test.utils import NoModelLeapNet
+
+
+SCALERS = ("_m_x", "_sd_x", "_m_y", "_sd_y", "_m_tau", "_sd_tau")
+
+
+class TestMultiAgentWithProxy(unittest.TestCase):
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            self.env = grid2op.make("l2rpn_case14_sandbox", test=True, gamerules_class=AlwaysLegal)
+        self.total_training_step = 25
+        self.max_row = 16  # the databases are full, some rows are overwritten
+
+    def tearDown(self):
+        self.env.close()
+
+    def _get_proxy(self, name, attr_x, attr_y):
+        return NoModelLeapNet(name=name, max_row_training_set=self.max_row, train_batch_size=8, eval_batch_size=8,
+                              attr_x=attr_x, attr_y=attr_y, attr_tau=("line_status",))
+
+    def _get_proxies(self):
+        # the 2 proxies share "prod_p", "a_or" and "line_status"
+        return [self._get_proxy("proxy_1", attr_x=("prod_p", "load_p"), attr_y=("a_or",)),
+                self._get_proxy("proxy_2", attr_x=("prod_p",), attr_y=("a_or", "p_or"))]
+
+    def _seed(self, actor):
+        reproducible_exp(self.env, actor, env_seed=0, agent_seed=1, chron_id_start=0)
+
+    def _train_multi(self):
+        actor = RandomN1(self.env.action_space)
+        agent = MultiAgentWithProxy(actor, self._get_proxies(), nb_obs_init=8, async_save=False)
+        self._seed(actor)
+        agent.train(self.env, self.total_training_step, verbose=0)
+        return agent
+
+    def _train_solo(self, proxy):
+        actor = RandomN1(self.env.action_space)
+        agent = AgentWithProxy(actor, proxy, nb_obs_init=8, async_save=False)
+        self._seed(actor)
+        agent.train(self.env, self.total_training_step, verbose=0)
+        return agent
+
+    def test_same_as_solo(self):
+        multi = self._train_multi()
+        proxy_1, proxy_2 = [agent._proxy for agent in multi.agents]
+        # the arrays storing the same attributes are shared
+        assert proxy_1._my_x[0] is proxy_2._my_x[0]
+        assert proxy_1._my_y[0] is proxy_2._my_y[0]
+        assert proxy_1._my_tau[0] is proxy_2._my_tau[0]
+
+        for agent in multi.agents:
+            proxy = agent._proxy
+            solo = self._train_solo(self._get_proxy(proxy.name, attr_x=proxy.attr_x, attr_y=proxy.attr_y))
+            proxy_solo = solo._proxy
+            assert agent.global_iter == solo.global_iter == self.total_training_step
+            assert proxy.get_global_iter() == proxy_solo.get_global_iter()
+            assert proxy.last_id == proxy_solo.last_id
+            for arrs, arrs_solo in [(proxy._my_x, proxy_solo._my_x),
+                                    (proxy._my_y, proxy_solo._my_y),
+                                    (proxy._my_tau, proxy_solo._my_tau)]:
+                assert len(arrs) == len(arrs_solo)
+                for arr, arr_solo in zip(arrs, arrs_solo):
+                    assert np.array_equal(arr, arr_solo)
+            for nm in SCALERS:
+                assert len(getattr(proxy, nm)) == len(getattr(proxy_solo, nm))
+                for scaler, scaler_solo in zip(getattr(proxy, nm), getattr(proxy_solo, nm)):
+                    assert np.array_equal(scaler, scaler_solo)
+
+    def test_not_shared(self):
+        actor = RandomN1(self.env.action_space)
+        agent = MultiAgentWithProxy(actor, self._get_proxies(), nb_obs_init=8, async_save=False,
+                                    share_database=False)
+        self._seed(actor)
+        agent.train(self.env, self.total_training_step, verbose=0)
+        proxy_1, proxy_2 = [agent_proxy._proxy for agent_proxy in agent.agents]
+        assert proxy_1._my_x[0] is not proxy_2._my_x[0]
+        assert np.array_equal(proxy_1._my_x[0], proxy_2._my_x[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
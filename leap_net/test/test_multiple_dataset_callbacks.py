@@ -0,0 +1,105 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from leap_net.kerasutils import MultipleDasetCallBacks
+
+
+class TestMultipleDasetCallBacks(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.x_train = rng.normal(size=(64, 3)).astype(np.float32)
+        self.y_train = rng.normal(size=(64, 2)).astype(np.float32)
+        self.validation_sets = [("val_1",
+                                 rng.normal(size=(50, 3)).astype(np.float32),
+                                 rng.normal(size=(50, 2)).astype(np.float32)),
+                                ("val_2",
+                                 rng.normal(size=(20, 3)).astype(np.float32),
+                                 rng.normal(size=(20, 2)).astype(np.float32))]
+        self.nb_epoch = 5
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _get_model(self):
+        inputs = tf.keras.Input(shape=(3,))
+        model = tf.keras.Model(inputs=inputs, outputs=tf.keras.layers.Dense(2)(inputs))
+        # all the models start from the same weights
+        model.set_weights([np.linspace(-1., 1., num=arr.size, dtype=np.float32).reshape(arr.shape)
+                           for arr in model.get_weights()])
+        model.compile(optimizer="sgd", loss="mse", metrics=["mae"])
+        return model
+
+    def _fit(self, **kwargs):
+        model = self._get_model()
+        callback = MultipleDasetCallBacks(self.validation_sets, log_dir=self.dir.name, savecsv=False, **kwargs)
+        model.fit(x=self.x_train, y=self.y_train, epochs=self.nb_epoch, batch_size=16, shuffle=False, verbose=0,
+                  callbacks=[callback])
+        return model, callback
+
+    def test_sync(self):
+        model, callback = self._fit()
+        for validation_set_name, x_val, y_val in self.validation_sets:
+            res_csv = callback.res_csv[validation_set_name]
+            assert res_csv["epoch"] == list(range(self.nb_epoch))
+            # the metrics are recorded with the loss
+            res_model = model.evaluate(x_val, y_val, verbose=0, return_dict=True)
+            for nm, val in res_model.items():
+                assert len(res_csv[nm]) == self.nb_epoch
+                assert np.allclose(res_csv[nm][-1], val)
+        assert len(callback.history["epoch_loss"]) == 2 * self.nb_epoch
+        assert len(callback.history["epoch_mae"]) == 2 * self.nb_epoch
+
+    def test_eval_freq(self):
+        _, callback = self._fit(eval_freq=2)
+        # the last epoch is always evaluated
+        for validation_set_name, *_ in self.validation_sets:
+            assert callback.res_csv[validation_set_name]["epoch"] == [1, 3, 4]
+        _, callback = self._fit(eval_freq=10)
+        for validation_set_name, *_ in self.validation_sets:
+            assert callback.res_csv[validation_set_name]["epoch"] == [self.nb_epoch - 1]
+
+    def test_max_rows(self):
+        max_rows = 30
+        model, callback = self._fit(max_rows=max_rows, seed=1)
+        rng = np.random.default_rng(1)
+        for (validation_set_name, dataset), (_, x_val, y_val) in zip(callback.datasets, self.validation_sets):
+            nb_row = len(x_val)
+            rows = np.arange(nb_row)
+            if nb_row > max_rows:
+                # the subsample is drawn once, as in the callback
+                rows = np.sort(rng.choice(nb_row, size=max_rows, replace=False))
+            x_sub = np.concatenate([x for x, _ in dataset])
+            assert np.array_equal(x_sub, x_val[rows])
+            res_model = model.evaluate(x_val[rows], y_val[rows], verbose=0, return_dict=True)
+            assert np.allclose(callback.res_csv[validation_set_name]["loss"][-1], res_model["loss"])
+
+    def test_async(self):
+        _, callback_sync = self._fit()
+        _, callback_async = self._fit(async_eval=True)
+        assert callback_async._thread is None
+        for validation_set_name, *_ in self.validation_sets:
+            res_sync = callback_sync.res_csv[validation_set_name]
+            res_async = callback_async.res_csv[validation_set_name]
+            # the shadow model is compiled with the metrics too
+            assert sorted(res_async) == sorted(res_sync)
+            for nm in res_sync:
+                assert np.allclose(res_async[nm], res_sync[nm])
+        assert sorted(callback_async.history) == sorted(callback_sync.history)
+        for nm in callback_sync.history:
+            assert np.allclose(callback_async.history[nm], callback_sync.history[nm])
+
+
+if __name__ == "__main__":
+    unittest.main()
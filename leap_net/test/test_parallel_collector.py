@@ -0,0 +1,154 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import threading
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.BaseProxy import extract_attr
+from leap_net.proxy.ParallelCollector import ParallelCollector, _collect_worker
+from leap_net.test.utils import IdentityProxy, ScaledProxy, extract_scaled
+
+
+def make_test_env(env_name):
+    """function used by the workers to build their environment (it needs to be picklable)"""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore")
+        env = grid2op.make(env_name, test=True, gamerules_class=AlwaysLegal)
+    return env
+
+
+class ScaledPicklableProxy(ScaledProxy):
+    def get_extract_fun(self):
+        return extract_scaled
+
+
+class _StopAfterQueue:
+    """queue that stops the worker (run in the main process) after `nb_chunk` chunks"""
+    def __init__(self, stop_event, nb_chunk):
+        self.stop_event = stop_event
+        self.nb_chunk = nb_chunk
+        self.chunks = []
+
+    def put(self, res, timeout=None):
+        self.chunks.append(res)
+        if len(self.chunks) == self.nb_chunk:
+            self.stop_event.set()
+
+
+class TestStoreBatch(unittest.TestCase):
+    def setUp(self):
+        self.metadata = {"attr_x": ["a"], "attr_y": ["b"], "_sz_x": [3], "_sz_y": [2],
+                         "_time_train": 0., "_time_predict": 0.}
+        self.max_row = 10
+        self.proxy = IdentityProxy(name="test", max_row_training_set=self.max_row, attr_x=("a",), attr_y=("b",))
+        self.proxy.train_batch_size = 4
+        self.proxy.load_metadata(self.metadata)
+        self.agent = AgentWithProxy(RandomN1(make_test_env("l2rpn_case14_sandbox").action_space), self.proxy,
+                                    async_save=False, async_tensorboard=False)
+        self.nb_stored = 0
+
+    def _batch(self, nb_row):
+        ids = np.arange(self.nb_stored, self.nb_stored + nb_row, dtype=np.float32)
+        self.nb_stored += nb_row
+        return {"a": np.tile(ids.reshape(-1, 1), (1, 3)), "b": np.tile(ids.reshape(-1, 1), (1, 2))}
+
+    def _check_database(self):
+        """row `i` of the data stream should be at `i % max_row` if it has not been overwritten"""
+        expected = np.full(self.max_row, np.nan, dtype=np.float32)
+        for i in range(max(0, self.nb_stored - self.max_row), self.nb_stored):
+            expected[i % self.max_row] = i
+        stored = self.proxy._my_x[0][:, 0]
+        mask = ~np.isnan(expected)
+        assert np.array_equal(stored[mask], expected[mask])
+        assert np.all(self.proxy._my_x[0][mask] == self.proxy._my_y[0][mask, :1])
+        assert self.proxy.get_global_iter() == self.nb_stored
+        assert self.agent.global_iter == self.nb_stored
+
+    def test_wraparound(self):
+        self.agent.is_training = False
+        self.agent._store_batch(self._batch(7))
+        self._check_database()
+        # more rows than the remaining ones: the first ones go at the end of the database, the others wrap around
+        self.agent._store_batch(self._batch(6))
+        self._check_database()
+        assert self.proxy.last_id == 3
+        # more rows than the size of the database: only the last ones are kept
+        self.agent._store_batch(self._batch(23))
+        self._check_database()
+        assert self.proxy.last_id == 6
+        assert not hasattr(self.proxy, "nb_train")
+
+    def test_nb_train(self):
+        # the proxy is trained once every "train_batch_size" rows, as if they were given one by one
+        self.agent._store_batch(self._batch(3))
+        assert not hasattr(self.proxy, "nb_train")
+        self.agent._store_batch(self._batch(6))
+        assert self.proxy.nb_train == 2
+        self.agent._store_batch(self._batch(13))
+        assert self.proxy.nb_train == 5
+        self._check_database()
+
+
+class TestParallelCollector(unittest.TestCase):
+    def setUp(self):
+        self.env_name = "l2rpn_case14_sandbox"
+        self.attr_names = ("prod_p", "line_status", "a_or")
+        self.chunk_size = 5
+        self.seed = 3
+
+    def _reference(self, worker_id, nb_chunk, extract_fun):
+        """the chunks of a worker, computed in this process"""
+        stop_event = threading.Event()
+        res_queue = _StopAfterQueue(stop_event, nb_chunk)
+        _collect_worker(worker_id, make_test_env, {"env_name": self.env_name}, RandomN1, {}, self.seed + worker_id,
+                        self.attr_names, self.chunk_size, np.float32, extract_fun, res_queue, stop_event)
+        return res_queue.chunks
+
+    def test_extract_fun(self):
+        assert IdentityProxy(name="test").get_extract_fun() is extract_attr
+        assert ScaledPicklableProxy(name="test").get_extract_fun() is extract_scaled
+        # the data would not be extracted the same way in the worker processes
+        with self.assertRaises(RuntimeError):
+            ScaledProxy(name="test").get_extract_fun()
+
+    def test_collect(self):
+        nb_chunk = 2
+        extract_fun = ScaledPicklableProxy(name="test").get_extract_fun()
+        with ParallelCollector(env_fun=make_test_env,
+                               env_kwargs={"env_name": self.env_name},
+                               actor_class=RandomN1,
+                               attr_names=self.attr_names,
+                               nb_process=2,
+                               seed=self.seed,
+                               chunk_size=self.chunk_size,
+                               extract_fun=extract_fun) as collector:
+            chunks = [collector.get() for _ in range(2 * nb_chunk)]
+        # the chunks are given in a round robin fashion: worker 0, worker 1, worker 0...
+        for worker_id in range(2):
+            ref_chunks = self._reference(worker_id, nb_chunk, extract_fun)
+            for chunk, ref_chunk in zip(chunks[worker_id::2], ref_chunks):
+                for attr_nm in self.attr_names:
+                    assert chunk[attr_nm].shape == (self.chunk_size, ref_chunk[attr_nm].shape[1])
+                    assert chunk[attr_nm].dtype == np.float32
+                    assert np.array_equal(chunk[attr_nm], ref_chunk[attr_nm])
+        # the workers are seeded differently
+        assert not all(np.array_equal(chunk_0["line_status"], chunk_1["line_status"])
+                       for chunk_0, chunk_1 in zip(chunks[0::2], chunks[1::2]))
+        # the data have been extracted with extract_fun
+        assert np.all(np.isin(chunks[0]["line_status"], [0., 2.]))
+
+
+if __name__ == "__main__":
+    unittest.main()
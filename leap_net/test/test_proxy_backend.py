@@ -0,0 +1,58 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.ProxyBackend import ProxyBackend
+from leap_net.proxy.benchmark_proxy_backend import gather_observations
+from leap_net.proxy.utils import get_parameters
+
+
+class TestProxyBackend(unittest.TestCase):
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            self.env = grid2op.make("l2rpn_case14_sandbox", test=True, param=get_parameters())
+        self.env.seed(0)
+        actor = RandomN1(self.env.action_space)
+        actor.seed(42)
+        self.obss = gather_observations(self.env, actor, 20)
+
+    def tearDown(self):
+        self.env.close()
+
+    def _get_state(self, proxy):
+        solver = proxy.solver
+        return [solver.get_topo_vect(), *solver.generators_info(), *solver.loads_info()]
+
+    def test_fast_set_same_state(self):
+        proxies = [ProxyBackend(self.env._init_grid_path, name=f"test_{fast_set}", fast_set=fast_set)
+                   for fast_set in [False, True]]
+        for proxy in proxies:
+            proxy.init([self.obss[0]])
+        for obs in self.obss:
+            preds = []
+            states = []
+            for proxy in proxies:
+                proxy.store_obs(obs)
+                preds.append(proxy.predict())
+                states.append(self._get_state(proxy))
+            # same state of the solver (injections and topology), and same results
+            for arr_action, arr_fast in zip(*states):
+                assert np.array_equal(arr_action, arr_fast, equal_nan=True)
+            for arr_action, arr_fast in zip(*preds):
+                assert np.array_equal(arr_action, arr_fast, equal_nan=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
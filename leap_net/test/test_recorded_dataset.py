@@ -0,0 +1,108 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import grid2op
+from grid2op.Rules import AlwaysLegal
+
+from leap_net.agents import RandomN1
+from leap_net.proxy.AgentWithProxy import AgentWithProxy
+from leap_net.proxy.RecordedDataset import RecordedDataset
+from leap_net.proxy.evaluate_proxy_case_14 import get_recorded_data
+from leap_net.proxy.utils import reproducible_exp, DEFAULT_METRICS
+from leap_net.test.utils import IdentityProxy, ScaledProxy
+
+
+class TestRecordedDataset(unittest.TestCase):
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore")
+            self.env = grid2op.make("l2rpn_case14_sandbox", test=True, gamerules_class=AlwaysLegal)
+        self.nb_rows = 20
+        self.dir = tempfile.TemporaryDirectory()
+        self.load_path = os.path.join(self.dir.name, "model")
+        agent = self._get_agent()
+        reproducible_exp(self.env, agent.actor, env_seed=0, agent_seed=1)
+        agent.init(self.env)
+        agent.save(self.dir.name)
+
+    def tearDown(self):
+        self.env.close()
+        self.dir.cleanup()
+
+    def _get_agent(self, proxy_class=IdentityProxy):
+        proxy = proxy_class(name="model", eval_batch_size=8, max_row_training_set=64,
+                            attr_x=("p_or",), attr_y=("a_or",))
+        return AgentWithProxy(RandomN1(self.env.action_space), proxy, nb_obs_init=4, async_save=False,
+                              async_tensorboard=False)
+
+    def _seed(self, agent):
+        reproducible_exp(self.env, agent.actor, env_seed=1, agent_seed=2, chron_id_start=0)
+
+    def _record(self, nb_rows, proxy_class=IdentityProxy):
+        agent = self._get_agent(proxy_class)
+        self._seed(agent)
+        path = os.path.join(self.dir.name, f"data_{proxy_class.__name__}")
+        return agent.record(self.env, nb_rows, path, load_path=self.load_path)
+
+    def test_same_as_evaluate(self):
+        agent = self._get_agent()
+        self._seed(agent)
+        res_live = agent.evaluate(self.env, self.nb_rows, self.load_path, metrics=DEFAULT_METRICS)
+        dataset = self._record(self.nb_rows)
+        assert dataset.nb_rows == self.nb_rows
+        assert RecordedDataset.exists(dataset.path, nb_rows=self.nb_rows, attr_names=("p_or", "a_or"))
+        res_recorded = self._get_agent().evaluate_recorded(dataset, self.load_path, metrics=DEFAULT_METRICS)
+        assert res_recorded["predict_step"] == res_live["predict_step"]
+        for metric_name in DEFAULT_METRICS:
+            # (the pearson_r of the disconnected lines is nan)
+            assert np.array_equal(res_recorded[metric_name]["a_or"], res_live[metric_name]["a_or"], equal_nan=True)
+
+    def test_extract_obs(self):
+        # the data are extracted as the proxy does
+        dataset = self._record(3)
+        dataset_scaled = self._record(3, proxy_class=ScaledProxy)
+        assert np.array_equal(dataset_scaled.get("a_or"), 2. * dataset.get("a_or"))
+
+    def test_get_recorded_data(self):
+        # the metadata are read from the last checkpoint of the saved model
+        dataset = get_recorded_data(self.env, self._get_agent(), os.path.join(self.dir.name, "recorded"),
+                                    env_name="case_14", nb_rows=3, load_path=self.load_path, env_seed=1,
+                                    agent_seed=2, chron_id_val=0, verbose=0)
+        assert dataset.nb_rows == 3
+        assert np.array_equal(dataset.get("a_or"), self._record(3).get("a_or"))
+
+    def test_fused_metrics(self):
+        np.random.seed(0)
+        true_val = [np.random.normal(size=(100, 5)).astype(np.float32)]
+        pred_val = [(true_val[0] + 0.1 * np.random.normal(size=(100, 5))).astype(np.float32)]
+        # by default the metric functions are used: same values, same types
+        res = self._get_agent()._compute_metrics(DEFAULT_METRICS, pred_val, true_val)
+        agent_fused = self._get_agent()
+        agent_fused.fused_metrics = True
+        res_fused = agent_fused._compute_metrics(DEFAULT_METRICS, pred_val, true_val)
+        for metric_name, metric_fun in DEFAULT_METRICS.items():
+            ref = metric_fun(true_val[0], pred_val[0])
+            assert type(res[metric_name][0]) is type(ref)
+            assert np.array_equal(res[metric_name][0], ref)
+            # the fused metrics are computed in float64
+            assert np.allclose(res_fused[metric_name][0], ref, rtol=1e-5)
+
+    def test_empty(self):
+        dataset = self._record(0)
+        assert dataset.nb_rows == 0
+        assert dataset.get("a_or").shape == (0, self.env.n_line)
+
+
+if __name__ == "__main__":
+    unittest.main()
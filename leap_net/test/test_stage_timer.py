@@ -0,0 +1,55 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import json
+import unittest
+
+from leap_net.proxy.StageTimer import StageTimer
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_disabled(self):
+        timer = StageTimer()
+        with timer.time("stage"):
+            pass
+        assert timer.get_stages() == []
+        assert timer.get_summary() == {}
+
+    def test_record(self):
+        timer = StageTimer(enabled=True)
+        with timer.time("a"):
+            pass
+        for duration in [1e-7, 3e-6, 3e-6, 3e-6, 0.5]:
+            timer.record("b", duration)
+        assert timer.get_stages() == ["a", "b"]
+        summary = timer.get_summary()
+        assert summary["a"]["count"] == 1
+        res = summary["b"]
+        assert res["count"] == 5
+        assert abs(res["total_s"] - 0.5000091) <= 1e-9
+        assert abs(res["min_ms"] - 1e-4) <= 1e-12
+        assert abs(res["max_ms"] - 500.) <= 1e-9
+        # 3 microseconds are in the bucket [2, 4)
+        assert res["histogram"] == {"1": 1, "4": 3, "524288": 1}
+        assert abs(res["p50_ms"] - 4e-3) <= 1e-12
+        # upper bound of the bucket is above the max
+        assert abs(res["p99_ms"] - 500.) <= 1e-9
+
+    def test_to_from_dict(self):
+        timer = StageTimer(enabled=True)
+        for duration in [1e-3, 2e-3, 1.]:
+            timer.record("a", duration)
+        timer2 = StageTimer()
+        timer2.from_dict(json.loads(json.dumps(timer.to_dict())))
+        assert timer2.get_summary() == timer.get_summary()
+        timer2.reset()
+        assert timer2.get_stages() == []
+
+
+if __name__ == "__main__":
+    unittest.main()
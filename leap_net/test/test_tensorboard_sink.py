@@ -0,0 +1,117 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+import contextlib
+import glob
+import os
+import tempfile
+import threading
+import unittest
+
+import tensorflow as tf
+
+from leap_net.proxy.TensorboardSink import TensorboardSink
+
+
+class FakeWriter:
+    """writer that waits for `event` (if not None) before "writing", and that can fail"""
+    def __init__(self, event=None, error=None):
+        self.event = event
+        self.error = error
+        self.nb_flush = 0
+
+    @contextlib.contextmanager
+    def as_default(self):
+        if self.event is not None:
+            self.event.wait()
+        yield self
+
+    def flush(self):
+        self.nb_flush += 1
+        if self.error is not None:
+            raise self.error
+
+
+def read_scalars(logdir):
+    """all the scalars written in `logdir`: {name: [(step, value), ...]}"""
+    res = {}
+    for path in sorted(glob.glob(os.path.join(logdir, "events.out.tfevents.*"))):
+        for event in tf.compat.v1.train.summary_iterator(path):
+            for value in event.summary.value:
+                res.setdefault(value.tag, []).append((event.step, float(tf.make_ndarray(value.tensor))))
+    return res
+
+
+class TestTensorboardSink(unittest.TestCase):
+    def test_aggregation(self):
+        with tempfile.TemporaryDirectory() as logdir:
+            writer = tf.summary.create_file_writer(logdir)
+            sink = TensorboardSink(writer)
+            assert sink.is_empty()
+            for value in [1., 4., -2., 5.]:
+                sink.add("loss", value, "the loss")
+            sink.add("other", 3.)
+            assert not sink.is_empty()
+            sink.flush(10, scalars=[("timing", 0.5, None)])
+            assert sink.is_empty()
+            # a new window is started
+            for value in [2., 6.]:
+                sink.add("loss", value)
+            sink.flush(20)
+            # nothing is written for an empty window
+            sink.flush(30)
+            sink.wait()
+            writer.close()
+            res = read_scalars(logdir)
+        assert res["loss"] == [(10, 2.), (20, 4.)]
+        assert res["loss_min"] == [(10, -2.), (20, 2.)]
+        assert res["loss_max"] == [(10, 5.), (20, 6.)]
+        assert res["other"] == [(10, 3.)]
+        assert res["other_min"] == res["other_max"] == [(10, 3.)]
+        assert res["timing"] == [(10, 0.5)]
+
+    def test_flush_wait(self):
+        event = threading.Event()
+        writer = FakeWriter(event)
+        sink = TensorboardSink(writer)
+        sink.add("loss", 1.)
+        sink.flush(1)
+        # the values are written in the background
+        assert sink._thread is not None and sink._thread.is_alive()
+        assert writer.nb_flush == 0
+        sink.add("loss", 2.)
+        event.set()
+        # the next flush waits for the previous one to be written
+        sink.flush(2)
+        assert writer.nb_flush >= 1
+        sink.wait()
+        assert sink._thread is None
+        assert writer.nb_flush == 2
+
+    def test_error(self):
+        writer = FakeWriter(error=ValueError("the disk is full"))
+        sink = TensorboardSink(writer)
+        sink.add("loss", 1.)
+        sink.flush(1)
+        # the error of the background thread is raised in the calling thread
+        with self.assertRaises(RuntimeError) as context:
+            sink.wait()
+        assert isinstance(context.exception.__cause__, ValueError)
+        # it is raised only once
+        sink.wait()
+        sink.add("loss", 1.)
+        sink.flush(2)
+        with self.assertRaises(RuntimeError):
+            # raised by the flush (that waits for the previous one)
+            sink.flush(3, scalars=[("timing", 1., None)])
+        sink.wait()
+        assert writer.nb_flush == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
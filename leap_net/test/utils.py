@@ -0,0 +1,45 @@
+# Copyright (c) 2019-2020, RTE (https://www.rte-france.com)
+# See AUTHORS.txt
+# This Source Code Form is subject to the terms of the Mozilla Public License, version 2.0.
+# If a copy of the Mozilla Public License, version 2.0 was not distributed with this file,
+# you can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+# This file is part of leap_net, leap_net a keras implementation of the LEAP Net model.
+
+# proxies (without neural network) shared by the tests
+
+from leap_net.proxy.BaseProxy import BaseProxy
+from leap_net.proxy.ProxyLeapNet import ProxyLeapNet
+
+
+def extract_scaled(obs, attr_nm):
+    """an extraction function different from the default one (it needs to be picklable)"""
+    return 2. * getattr(obs, attr_nm)
+
+
+class IdentityProxy(BaseProxy):
+    """"predicts" its input: the metrics are not trivial as long as attr_x is not attr_y"""
+    def build_model(self):
+        pass
+
+    def _make_predictions(self, data, training=False):
+        return data[0]
+
+    def train(self, tf_writer=None, force=False):
+        # training is a no op, it is counted only
+        self.nb_train = getattr(self, "nb_train", 0) + 1
+        return None
+
+
+class ScaledProxy(IdentityProxy):
+    def _extract_obs(self, obs, attr_nm):
+        return extract_scaled(obs, attr_nm)
+
+
+class NoModelLeapNet(ProxyLeapNet):
+    """stores the data and computes the scalers of a leap net, without its neural network"""
+    def build_model(self):
+        pass
+
+    def train(self, tf_writer=None, force=False):
+        return None
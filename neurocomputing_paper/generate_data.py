@@ -9,7 +9,12 @@ import os
 from leap_net import generate_dataset
 
 
-def main(p, data_dir):
+def _get_seed(seed, id_split):
+    """each split is generated with a different seed (otherwise splits with the same agent would be the same)"""
+    return None if seed is None else seed + id_split
+
+
+def main(p, data_dir, nb_process=1, seed=None):
     data_dir_abs = os.path.abspath(data_dir)
     if not os.path.exists(data_dir):
         os.mkdir(data_dir_abs)
@@ -19,26 +24,34 @@ def main(p, data_dir):
                      dir_out=os.path.join(data_dir_abs, "training_set_{:.3f}".format(p)),
                      nb_rows=1024*64,
                      agent_type="random_n_n1",
-                     p=p)
+                     p=p,
+                     nb_process=nb_process,
+                     seed=_get_seed(seed, 0))
     generate_dataset("l2rpn_case14_sandbox",
                      dir_out=os.path.join(data_dir_abs, "liketrain_set_{:.3f}".format(p)),
                      nb_rows=1024*16,
                      agent_type="random_n_n1",
-                     p=p)
+                     p=p,
+                     nb_process=nb_process,
+                     seed=_get_seed(seed, 1))
     if not os.path.exists(os.path.join(data_dir_abs, "test_set")):
         generate_dataset("l2rpn_case14_sandbox",
                          dir_out=os.path.join(data_dir_abs, "test_set"),
                          nb_rows=1024*16,
-                         agent_type="random_n1")
+                         agent_type="random_n1",
+                         nb_process=nb_process,
+                         seed=_get_seed(seed, 2))
     if not os.path.exists(os.path.join(data_dir_abs, "supertest_set")):
         generate_dataset("l2rpn_case14_sandbox",
                          dir_out=os.path.join(data_dir_abs, "supertest_set"),
                          nb_rows=1024*16,
-                         agent_type="random_n2")
+                         agent_type="random_n2",
+                         nb_process=nb_process,
+                         seed=_get_seed(seed, 3))
 
 
 if __name__ == "__main__":
     data_dir = "data"
     for p in [0.001, 0.003, 0.01, 0.03, 0.1, 0.5]:
-        main(p=p, data_dir=data_dir)
+        main(p=p, data_dir=data_dir, nb_process=os.cpu_count())
         
\ No newline at end of file
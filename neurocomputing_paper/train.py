@@ -11,8 +11,10 @@ import json
 import numpy as np
 from datetime import datetime
 
-from leap_net import Ltau, ResNetLayer
+from leap_net import Ltau, LtauLowRank, ResNetLayer, TopoEmbedding
 from leap_net.kerasutils import MultipleDasetCallBacks
+from leap_net.generate_data import DatasetReader
+from leap_net.metrics import MSEAccumulator
 
 import tensorflow as tf
 from tensorflow import keras
@@ -21,8 +23,6 @@ from tensorflow.keras.layers import Input, Activation
 from tensorflow.keras.models import Model
 
 from tensorflow.keras.layers import concatenate as k_concatenate
-from sklearn.metrics import mean_squared_error
-from sklearn import preprocessing
 
 
 def encode(inputs,
@@ -80,7 +80,10 @@ def get_model(n_gen,
               lr=1e-3,
               leap=True,
               act="relu",
-              builder=Dense):
+              builder=Dense,
+              leap_rank=None,
+              sub_info=None,
+              topo_embedding_dim=None):
     """
     Build a model from the parameters given as input.
 
@@ -119,6 +122,17 @@ def get_model(n_gen,
     builder: ``keras builder``
         Typically "keras.layers.Dense". Type of layer to make.
 
+    leap_rank: ``int``
+        If not ``None``, the Ltau layers are replaced by :class:`leap_net.LtauLowRank` layers of this rank (useful
+        when `dim_tau` is large).
+
+    sub_info: ``list``
+        Number of elements of each substation (only used if `topo_embedding_dim` is not ``None``)
+
+    topo_embedding_dim: ``int``
+        If not ``None``, tau is a topology (see :func:`leap_net.generate_dataset` with `expe_type="topo"`) that is
+        encoded with a :class:`leap_net.TopoEmbedding` (of this size) before being given to the Ltau layers.
+
     Returns
     -------
     model: ``keras model``
@@ -152,6 +166,11 @@ def get_model(n_gen,
 
     # modulator input tau
     tau_ = Input(shape=(dim_tau,), name="tau")
+    tau_leap = tau_
+    if topo_embedding_dim is not None:
+        if sub_info is None:
+            raise RuntimeError("\"sub_info\" should be given to encode the topology")
+        tau_leap = TopoEmbedding(sub_info, topo_embedding_dim, name="tau_embedding")(tau_)
 
     # encode regular inputs
     pp_e = encode(pp_, lss=[size_layer_enc_p for _ in range(nb_layer_enc)], builder=builder)
@@ -184,8 +203,10 @@ def get_model(n_gen,
     # now apply Ltau
     tmp = E
     for i in range(nb_leap):
-        if leap:
-            tmp = Ltau(name="Ltau_{}".format(i))((tmp, tau_))
+        if leap and leap_rank is not None:
+            tmp = LtauLowRank(leap_rank, name="Ltau_{}".format(i))((tmp, tau_leap))
+        elif leap:
+            tmp = Ltau(name="Ltau_{}".format(i))((tmp, tau_leap))
         else:
             tmp = ResNetLayer(dim_tau, name="RestBlock_{}".format(i))(tmp)
     E_modulated = tmp
@@ -208,33 +229,29 @@ def get_model(n_gen,
 def load_dataset(path, name):
     """
     Helper to load the datasets, that are now given as numpy arrays. But it might change.
+
+    The whole array is loaded in memory, see :class:`leap_net.generate_data.DatasetReader` to read it by chunks.
     """
     res = np.load(os.path.join(path, "{}.npy".format(name))).astype(np.float32)
     return res
 
 
-def compute_loss(dict_tmp, model, Xdatasets, Ydatasets):
+def compute_loss(dict_tmp, model, reader, batch_size=1024):
     """
-    Computes the loss on each outputs if `model` is evaluated on inputs `Xdatasets` and the real output ares `Ydatasets`.
+    Computes the loss on each outputs if `model` is evaluated on the dataset read by `reader` (a
+    :class:`leap_net.generate_data.DatasetReader`). The dataset is read (and the loss computed) batch by batch.
 
     `dict_tmp` is a dictionnary that is used to store the loss to be more easily extracted later.
     """
-    (prod_p_test, scaler_pp), (prod_v_test, scaler_pv), (load_p_test, scaler_cp), (load_q_test, scaler_cq), tau_test = Xdatasets
-    (flow_a_test, scaler_fa), (flow_p_test, scaler_fp), (line_v_test, scaler_fv) = Ydatasets
-    flow_a_hat, flow_p_hat, line_v_hat = model.predict([scaler_pp.transform(prod_p_test),
-                                                        scaler_pv.transform(prod_v_test),
-                                                        scaler_cp.transform(load_p_test),
-                                                        scaler_cq.transform(load_q_test),
-                                                        tau_test])
-    flow_a_hat = scaler_fa.inverse_transform(flow_a_hat)
-    flow_p_hat = scaler_fp.inverse_transform(flow_p_hat)
-    line_v_hat = scaler_fv.inverse_transform(line_v_hat)
-
-    for nm_arr, arr_hat, arr_true in zip(["flow_a", "flow_p", "line_v"],
-                                         [flow_a_hat, flow_p_hat, line_v_hat],
-                                         [flow_a_test, flow_p_test, line_v_test]):
+    accumulators = [MSEAccumulator() for _ in reader.attr_y]
+    for x, y in reader.iter_batches(batch_size, shuffle=False, scale_y=False):
+        y_hat = model.predict_on_batch(x)
+        for acc, nm_arr, arr_hat, arr_true in zip(accumulators, reader.attr_y, y_hat, y):
+            acc.update(arr_true, reader.inverse_transform(nm_arr, arr_hat))
+
+    for nm_arr, acc in zip(reader.attr_y, accumulators):
         nm = "{}_rmse".format(nm_arr)
-        rmse_ = float(np.sqrt(mean_squared_error(arr_true, arr_hat)))
+        rmse_ = float(np.sqrt(acc.result()))
         if nm in dict_tmp:
             dict_tmp[nm].append(rmse_)
         else:
@@ -246,7 +263,14 @@ def main(p,
          batch_size=32,
          lr=3e-4,
          logdir="logs/",
-         path_data="data"):
+         path_data="data",
+         leap_rank=None,
+         sub_info=None,
+         topo_embedding_dim=None,
+         seed=None,
+         eval_freq=1,
+         max_rows=None,
+         async_eval=False):
     """
     Main function to train the desired model (build using `get_model` and evaluate it on the 3 extra datasets:
     -  val dataset: generated with the exact same distribution as the training dataset
@@ -275,6 +299,30 @@ def main(p,
     path_data: ``str``
         Path where to look for the training / validation / test / supertest datasets
 
+    leap_rank: ``int``
+        Rank of the Ltau layers of the LEAP Net (``None`` for full rank layers), see :func:`get_model`
+
+    sub_info: ``list``
+        Number of elements of each substation, only used with `topo_embedding_dim`
+
+    topo_embedding_dim: ``int``
+        Size of the embedding of the topology (for datasets generated with `expe_type="topo"`), see
+        :func:`get_model`
+
+    seed: ``int``
+        Seed used to shuffle the training dataset (and to draw the subsamples of the other datasets)
+
+    eval_freq: ``int``
+        The val / test / supertest losses are computed every `eval_freq` epochs (and at the end of the training),
+        see :class:`leap_net.kerasutils.MultipleDasetCallBacks`
+
+    max_rows: ``int``
+        If not ``None``, these losses are computed on a random subsample (always the same) of at most `max_rows`
+        rows of each dataset. The final results (in "expe_summary.json") are always computed on the whole datasets.
+
+    async_eval: ``bool``
+        Whether these losses are computed in a background thread, while the training continues
+
     """
     if not os.path.exists(logdir):
         os.mkdir(logdir)
@@ -298,106 +346,36 @@ def main(p,
     path_data_supertest = os.path.join(path_data, "supertest_set")
     path_data_val = os.path.join(path_data, "liketrain_set_{:.3f}".format(p))
 
-    # load taining data
-    prod_p = load_dataset(path_data_train, "prod_p")
-    prod_v = load_dataset(path_data_train, "prod_v")
-    load_p = load_dataset(path_data_train, "load_p")
-    load_q = load_dataset(path_data_train, "load_q")
-    tau = load_dataset(path_data_train, "tau")
-    flow_a = load_dataset(path_data_train, "flow_a")
-    flow_p = load_dataset(path_data_train, "flow_p")
-    line_v = load_dataset(path_data_train, "line_v")
-
-    # scale the data to have variance 1 and mean 0 by column (easier learning)
-    scaler_pp = preprocessing.StandardScaler().fit(prod_p)
-    scaler_pv = preprocessing.StandardScaler().fit(prod_v)
-    scaler_cp = preprocessing.StandardScaler().fit(load_p)
-    scaler_cq = preprocessing.StandardScaler().fit(load_q)
-    scaler_fa = preprocessing.StandardScaler().fit(flow_a)
-    scaler_fp = preprocessing.StandardScaler().fit(flow_p)
-    scaler_fv = preprocessing.StandardScaler().fit(line_v)
-
-    # load validation data (same distribution as training dataset)
-    prod_p_val = load_dataset(path_data_val, "prod_p")
-    prod_v_val = load_dataset(path_data_val, "prod_v")
-    load_p_val = load_dataset(path_data_val, "load_p")
-    load_q_val = load_dataset(path_data_val, "load_q")
-    tau_val = load_dataset(path_data_val, "tau")
-    flow_a_val = load_dataset(path_data_val, "flow_a")
-    flow_p_val = load_dataset(path_data_val, "flow_p")
-    line_v_val = load_dataset(path_data_val, "line_v")
-
-    # load test data
-    prod_p_test = load_dataset(path_data_test, "prod_p")
-    prod_v_test = load_dataset(path_data_test, "prod_v")
-    load_p_test = load_dataset(path_data_test, "load_p")
-    load_q_test = load_dataset(path_data_test, "load_q")
-    tau_test = load_dataset(path_data_test, "tau")
-    flow_a_test = load_dataset(path_data_test, "flow_a")
-    flow_p_test = load_dataset(path_data_test, "flow_p")
-    line_v_test = load_dataset(path_data_test, "line_v")
-
-    # load supertest data
-    prod_p_supertest = load_dataset(path_data_supertest, "prod_p")
-    prod_v_supertest = load_dataset(path_data_supertest, "prod_v")
-    load_p_supertest = load_dataset(path_data_supertest, "load_p")
-    load_q_supertest = load_dataset(path_data_supertest, "load_q")
-    tau_supertest = load_dataset(path_data_supertest, "tau")
-    flow_a_supertest = load_dataset(path_data_supertest, "flow_a")
-    flow_p_supertest = load_dataset(path_data_supertest, "flow_p")
-    line_v_supertest = load_dataset(path_data_supertest, "line_v")
-
-    # define the values for the callbacks
-    for_call_backval = ("val",
-                         [scaler_pp.transform(prod_p_val),
-                                                        scaler_pv.transform(prod_v_val),
-                                                        scaler_cp.transform(load_p_val),
-                                                        scaler_cq.transform(load_q_val),
-                                                        tau_val],
-                        [scaler_fa.transform(flow_a_val),
-                                     scaler_fp.transform(flow_p_val),
-                                     scaler_fv.transform(line_v_val)]
-                         )
-    for_call_backtest = ("test",
-                         [scaler_pp.transform(prod_p_test),
-                                                        scaler_pv.transform(prod_v_test),
-                                                        scaler_cp.transform(load_p_test),
-                                                        scaler_cq.transform(load_q_test),
-                                                        tau_test],
-                        [scaler_fa.transform(flow_a_test),
-                                     scaler_fp.transform(flow_p_test),
-                                     scaler_fv.transform(line_v_test)]
-                         )
-    for_call_backsupertest = ("supertest",
-                         [scaler_pp.transform(prod_p_supertest),
-                                                        scaler_pv.transform(prod_v_supertest),
-                                                        scaler_cp.transform(load_p_supertest),
-                                                        scaler_cq.transform(load_q_supertest),
-                                                        tau_supertest],
-                        [scaler_fa.transform(flow_a_supertest),
-                                     scaler_fp.transform(flow_p_supertest),
-                                     scaler_fv.transform(line_v_supertest)]
-                         )
+    # the datasets are read by chunks (they are never completely loaded in memory). Inputs and outputs are scaled
+    # to have variance 1 and mean 0 by column (easier learning), with the statistics of the training dataset
+    reader_train = DatasetReader(path_data_train)
+    readers = {"val": DatasetReader(path_data_val, scaler_header=reader_train.header),
+               "test": DatasetReader(path_data_test, scaler_header=reader_train.header),
+               "supertest": DatasetReader(path_data_supertest, scaler_header=reader_train.header)}
+    n_gen = reader_train.get_size("prod_p")
+    n_load = reader_train.get_size("load_p")
+    n_line = reader_train.get_size("flow_a")
+    dim_tau = reader_train.get_size("tau")
+
+    # define the values for the callbacks: they are evaluated at multiple epochs, the batches are kept in memory
+    validation_sets = [(nm, reader.get_tf_dataset(batch_size, shuffle=False, seed=seed, cache=True,
+                                                  max_rows=max_rows))
+                       for nm, reader in readers.items()]
 
     # define and fit the LEAP model
     tf.keras.backend.clear_session()
-    model = get_model(prod_p.shape[1], load_p.shape[1], flow_a.shape[1], None, None, tau.shape[1], lr=lr)
+    model = get_model(n_gen, n_load, n_line, None, None, dim_tau, lr=lr,
+                      leap_rank=leap_rank, sub_info=sub_info, topo_embedding_dim=topo_embedding_dim)
     logdir_leap = os.path.join(logdir, "LEAPNet_{:.3f}_{}".format(p, datetime_start))
     tensorboard_callback = keras.callbacks.TensorBoard(log_dir=logdir_leap)
-    loss_callback = MultipleDasetCallBacks([for_call_backval, for_call_backtest, for_call_backsupertest],
-                                             log_dir=logdir_leap
-                                             )
-
-    model.fit(x=[scaler_pp.transform(prod_p),
-                 scaler_pv.transform(prod_v),
-                 scaler_cp.transform(load_p),
-                 scaler_cq.transform(load_q),
-                 tau],
-              y=[scaler_fa.transform(flow_a),
-                 scaler_fp.transform(flow_p),
-                 scaler_fv.transform(line_v)],
+    loss_callback = MultipleDasetCallBacks(validation_sets,
+                                           log_dir=logdir_leap,
+                                           eval_freq=eval_freq,
+                                           async_eval=async_eval
+                                           )
+
+    model.fit(reader_train.get_tf_dataset(batch_size, seed=seed),
               epochs=nb_epoch,
-              batch_size=batch_size,
               verbose=0,
               callbacks=[loss_callback, tensorboard_callback]
               )
@@ -408,47 +386,25 @@ def main(p,
     dict_previous["LEAP"]["nb_params"] = int(model.count_params())
 
     # and now make predictions and store results
-    if not "val" in dict_previous["LEAP"]:
-        dict_previous["LEAP"]["val"] = {}
-    dict_tmp = dict_previous["LEAP"]["val"]
-    Xdatasets = (prod_p_val, scaler_pp), (prod_v_val, scaler_pv), (load_p_val, scaler_cp), (load_q_val, scaler_cq), tau_val
-    Ydatasets = (flow_a_val, scaler_fa), (flow_p_val, scaler_fp), (line_v_val, scaler_fv)
-    compute_loss(dict_tmp, model, Xdatasets, Ydatasets)
-
-    if not "test" in dict_previous["LEAP"]:
-        dict_previous["LEAP"]["test"] = {}
-    dict_tmp = dict_previous["LEAP"]["test"]
-    Xdatasets = (prod_p_test, scaler_pp), (prod_v_test, scaler_pv), (load_p_test, scaler_cp), (load_q_test, scaler_cq), tau_test
-    Ydatasets = (flow_a_test, scaler_fa), (flow_p_test, scaler_fp), (line_v_test, scaler_fv)
-    compute_loss(dict_tmp, model, Xdatasets, Ydatasets)
-
-    if not "supertest" in dict_previous["LEAP"]:
-        dict_previous["LEAP"]["supertest"] = {}
-    dict_tmp = dict_previous["LEAP"]["supertest"]
-    Xdatasets = (prod_p_supertest, scaler_pp), (prod_v_supertest, scaler_pv), (load_p_supertest, scaler_cp), (load_q_supertest, scaler_cq), tau_supertest
-    Ydatasets = (flow_a_supertest, scaler_fa), (flow_p_supertest, scaler_fp), (line_v_supertest, scaler_fv)
-    compute_loss(dict_tmp, model, Xdatasets, Ydatasets)
+    for nm, reader in readers.items():
+        if not nm in dict_previous["LEAP"]:
+            dict_previous["LEAP"][nm] = {}
+        compute_loss(dict_previous["LEAP"][nm], model, reader)
 
     with open(expe_summary_path, "w", encoding="utf-8") as f:
         json.dump(obj=dict_previous_all, fp=f, sort_keys=True, indent=4)
 
     tf.keras.backend.clear_session()
-    model_resnet = get_model(prod_p.shape[1], load_p.shape[1], flow_a.shape[1], None, None, tau.shape[1], leap=False, lr=lr)
+    model_resnet = get_model(n_gen, n_load, n_line, None, None, dim_tau, leap=False, lr=lr)
     logdir_resnet = os.path.join(logdir, "ResNet_{:.3f}_{}".format(p, datetime_start))
     tensorboard_callback_resnet = keras.callbacks.TensorBoard(log_dir=logdir_resnet)
-    loss_callback_resnet = MultipleDasetCallBacks([for_call_backval, for_call_backtest, for_call_backsupertest],
-                                                  log_dir=logdir_resnet
-                                                    )
-    model_resnet.fit(x=[scaler_pp.transform(prod_p),
-                        scaler_pv.transform(prod_v),
-                        scaler_cp.transform(load_p),
-                        scaler_cq.transform(load_q),
-                        tau],
-                     y=[scaler_fa.transform(flow_a),
-                        scaler_fp.transform(flow_p),
-                        scaler_fv.transform(line_v)],
+    loss_callback_resnet = MultipleDasetCallBacks(validation_sets,
+                                                  log_dir=logdir_resnet,
+                                                  eval_freq=eval_freq,
+                                                  async_eval=async_eval
+                                                  )
+    model_resnet.fit(reader_train.get_tf_dataset(batch_size, seed=seed),
                      epochs=nb_epoch,
-                     batch_size=batch_size,
                      verbose=0,
                      callbacks=[loss_callback_resnet, tensorboard_callback_resnet]
                      )
@@ -460,26 +416,10 @@ def main(p,
     #print("LEAP Net model has {} parameters".format(model.count_params()))
 
     # and now make predictions and store results
-    if not "val" in dict_previous["ResNet"]:
-        dict_previous["ResNet"]["val"] = {}
-    dict_tmp = dict_previous["ResNet"]["val"]
-    Xdatasets = (prod_p_val, scaler_pp), (prod_v_val, scaler_pv), (load_p_val, scaler_cp), (load_q_val, scaler_cq), tau_val
-    Ydatasets = (flow_a_val, scaler_fa), (flow_p_val, scaler_fp), (line_v_val, scaler_fv)
-    compute_loss(dict_tmp, model_resnet, Xdatasets, Ydatasets)
-
-    if not "test" in dict_previous["ResNet"]:
-        dict_previous["ResNet"]["test"] = {}
-    dict_tmp = dict_previous["ResNet"]["test"]
-    Xdatasets = (prod_p_test, scaler_pp), (prod_v_test, scaler_pv), (load_p_test, scaler_cp), (load_q_test, scaler_cq), tau_test
-    Ydatasets = (flow_a_test, scaler_fa), (flow_p_test, scaler_fp), (line_v_test, scaler_fv)
-    compute_loss(dict_tmp, model_resnet, Xdatasets, Ydatasets)
-
-    if not "supertest" in dict_previous["ResNet"]:
-        dict_previous["ResNet"]["supertest"] = {}
-    dict_tmp = dict_previous["ResNet"]["supertest"]
-    Xdatasets = (prod_p_supertest, scaler_pp), (prod_v_supertest, scaler_pv), (load_p_supertest, scaler_cp), (load_q_supertest, scaler_cq), tau_supertest
-    Ydatasets = (flow_a_supertest, scaler_fa), (flow_p_supertest, scaler_fp), (line_v_supertest, scaler_fv)
-    compute_loss(dict_tmp, model_resnet, Xdatasets, Ydatasets)
+    for nm, reader in readers.items():
+        if not nm in dict_previous["ResNet"]:
+            dict_previous["ResNet"][nm] = {}
+        compute_loss(dict_previous["ResNet"][nm], model_resnet, reader)
 
     with open(expe_summary_path, "w", encoding="utf-8") as f:
         json.dump(obj=dict_previous_all, fp=f, sort_keys=True, indent=4)